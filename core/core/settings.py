@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import sys
 load_dotenv()  # reads variables from a .env file and sets them in os.environ
 
 
@@ -46,28 +47,67 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.roles.RoleProfileMiddleware',
+    'main.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request query counts and time in the database (Server-Timing and X-DB-Queries
+# headers), with a warning logged when one request repeats the same SQL more than
+# QUERY_REPEAT_THRESHOLD times
+
+QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', str(DEBUG)).lower() in ('1', 'true', 'yes')
+QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', 3))
+
+# Staff can profile a single request by adding ?profile=1 (sampling) or
+# ?profile=cprofile to its URL. Captures go to MEDIA_ROOT/PROFILE_DIR, the newest
+# PROFILE_KEEP are kept, and they are listed at /profiles/
+
+PROFILING = os.getenv('PROFILING', 'true').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = 'profiles'
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 50))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+
 ROOT_URLCONF = 'core.urls'
 
+# Serve the dashboard, contact, payment and payment status pages from the async
+# views in main/async_views.py. Off by default, ASGI included: benchmark_asgi
+# measures lower throughput with them, so turn it on only for an ASGI server
+# (uvicorn core.asgi:application) where that benchmark shows a gain.
+# With it on, a payment status poll is held open for up to PAYMENT_STATUS_WAIT seconds.
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() in ('1', 'true', 'yes')
+PAYMENT_STATUS_WAIT = float(os.getenv('PAYMENT_STATUS_WAIT', 20))
+
+# Templates are compiled once per process and kept in memory by the cached
+# loader; runserver's autoreloader still clears it when a template changes.
+# TEMPLATE_CACHE=false re-reads and re-parses templates on every render.
+
+TEMPLATE_CACHE = os.getenv('TEMPLATE_CACHE', 'true').lower() in ('1', 'true', 'yes')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.context_processors.fragment_cache',
             ],
+            'loaders': [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)] if TEMPLATE_CACHE else TEMPLATE_LOADERS,
         },
     },
 ]
@@ -77,14 +117,156 @@ WSGI_APPLICATION = 'core.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DB_ENGINE picks the profile: sqlite (development, default) or postgres (production).
+
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+# Seconds a connection is kept open between requests (0 closes it after every request)
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+
+if DB_ENGINE == 'postgres':
+    # Needs psycopg 3; the pool also needs its extra: pip install "psycopg[binary,pool]"
+    # With DB_POOL set, each process borrows connections from a psycopg pool.
+    # Django's pool replaces persistent connections, so CONN_MAX_AGE is 0 then.
+    DB_POOL = os.getenv('DB_POOL', 'true').lower() in ('1', 'true', 'yes')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'industrylink'),
+            'USER': os.getenv('DB_USER', 'industrylink'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                    'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    # WAL lets readers carry on while a write is in progress, and
+    # synchronous=NORMAL is safe with WAL. Writers wait up to `timeout`
+    # seconds for the lock. IMMEDIATE transactions take the write lock at
+    # BEGIN: a DEFERRED one that reads and then writes fails at once with
+    # "database is locked" when another writer got there first.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+                'timeout': int(os.getenv('DB_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
 
-DATABASES = {
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# CACHE_BACKEND picks the backend: locmem (development), file or redis (production).
+# The redis backend works with any Redis-compatible server (Redis, Valkey, KeyDB).
+
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
+# Django's default of 300 entries would not hold one page of cached cards (redis ignores this)
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 20000))
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'industrylink',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+# Tests always run against the in-process cache, whatever the environment says
+CACHE_BACKEND = 'locmem' if TESTING else os.getenv('CACHE_BACKEND', 'locmem')
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 300)),
+        'KEY_PREFIX': 'industrylink',
+    },
+}
+
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+# SESSION_PROFILE picks where sessions are kept: db (default), cached_db (read from the
+# cache, written through to the database) or cache (the cache alone: flushing it logs
+# everyone out, and locmem is per process, so use redis with more than one worker).
+# They live in their own cache, SESSION_CACHE_BACKEND, so culling cached pages and
+# cards never drops a session. `python manage.py clear_expired_sessions` deletes
+# expired rows from the database in batches.
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+}
+SESSION_PROFILE = os.getenv('SESSION_PROFILE', 'db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_PROFILE]
+SESSION_CACHE_ALIAS = 'sessions'
+
+SESSION_CACHE_BACKEND = 'locmem' if TESTING else os.getenv('SESSION_CACHE_BACKEND', CACHE_BACKEND)
+SESSION_CACHE_LOCATIONS = {
+    'locmem': 'industrylink-sessions',
+    'file': BASE_DIR / 'session-cache',
+    'redis': CACHE_BACKENDS['redis']['LOCATION'],
+}
+
+CACHES['sessions'] = {
+    **CACHE_BACKENDS[SESSION_CACHE_BACKEND],
+    'LOCATION': os.getenv('SESSION_CACHE_LOCATION', SESSION_CACHE_LOCATIONS[SESSION_CACHE_BACKEND]),
+    'OPTIONS': {'MAX_ENTRIES': int(os.getenv('SESSION_CACHE_MAX_ENTRIES', 100000))}
+    if SESSION_CACHE_BACKEND != 'redis' else {},
+    'KEY_PREFIX': 'industrylink-session',
+}
+
+# Flash messages travel in a signed cookie rather than in the session, so showing
+# one never makes the request write its session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Rate limits on form posts (main.ratelimit), per view: {key: (requests, seconds)}. A key is
+# what requests are counted by: ip, the posted username or the posted phone number. Counts
+# are sliding windows kept in the RATE_LIMIT_CACHE cache, so every process shares them; if
+# it is unreachable, each process counts in its own memory. Behind a proxy, set
+# RATE_LIMIT_IP_HEADER to the header it puts the client address in (HTTP_X_FORWARDED_FOR).
+
+RATE_LIMITS_ENABLED = os.getenv('RATE_LIMITS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_CACHE = 'default'
+RATE_LIMIT_IP_HEADER = os.getenv('RATE_LIMIT_IP_HEADER', '')
+RATE_LIMITS = {
+    'login': {'ip': (20, 60), 'username': (10, 300)},
+    'register': {'ip': (5, 3600)},
+    'contact': {'ip': (5, 600)},
+    'payment': {'ip': (10, 600), 'phone': (3, 600)},
 }
 
+# Seconds anonymous visitors are served a cached copy of the public pages
+PUBLIC_PAGE_CACHE_SECONDS = int(os.getenv('PUBLIC_PAGE_CACHE_SECONDS', 60))
+
+# Rendered project and mentor cards ({% cache %} fragments). Keys include the object's
+# updated_at, so an edit shows at once; the timeout only bounds how long stale ones linger.
+CARD_CACHE_SECONDS = int(os.getenv('CARD_CACHE_SECONDS', 24 * 3600))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,6 +318,15 @@ import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Profile pictures are stored under MEDIA_ROOT/AVATAR_DIR with content-hashed names, and
+# background workers resize each into AVATAR_SIZES-pixel squares as WebP and JPEG. A name
+# never points at different bytes, so /media/avatars/ is served with a year-long immutable
+# Cache-Control (AVATAR_CACHE_SECONDS). Uploads over AVATAR_MAX_BYTES are rejected.
+AVATAR_DIR = 'avatars'
+AVATAR_SIZES = (48, 96, 192)
+AVATAR_MAX_BYTES = int(os.getenv('AVATAR_MAX_BYTES', 5 * 1024 * 1024))
+AVATAR_CACHE_SECONDS = int(os.getenv('AVATAR_CACHE_SECONDS', 365 * 24 * 3600))
+
 LOGIN_URL ='login'
 LOGIN_Redirect_URL = 'dashboard'
 
@@ -179,3 +370,51 @@ MPESA_INITIATOR_USERNAME = 'initiator_username'
 # Plaintext password for initiator (to be used in B2C, B2B, AccountBalance and TransactionStatusQuery Transactions)
 
 MPESA_INITIATOR_SECURITY_CREDENTIAL = 'initiator_security_credential'
+
+# Where Daraja posts STK push results: the in-app callback (main:mpesa_callback).
+# In production SITE_URL must be the public https address of the site.
+# MPESA_CALLBACK_TOKEN is a secret path segment the callback must carry. Without
+# it every callback is refused, unless DEBUG is on, so nobody can forge results.
+
+SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')
+MPESA_CALLBACK_TOKEN = os.getenv('MPESA_CALLBACK_TOKEN', '')
+MPESA_CALLBACK_URL = os.getenv('MPESA_CALLBACK_URL') or (
+    SITE_URL.rstrip('/') + '/payment/callback/' + (MPESA_CALLBACK_TOKEN + '/' if MPESA_CALLBACK_TOKEN else '')
+)
+
+# Callback results are buffered and written in batches of up to this many,
+# at most this many seconds after the first one arrives
+
+MPESA_RESULT_BATCH_SIZE = int(os.getenv('MPESA_RESULT_BATCH_SIZE', 200))
+MPESA_RESULT_FLUSH_SECONDS = float(os.getenv('MPESA_RESULT_FLUSH_SECONDS', 1.0))
+
+# Overrides the Daraja host picked from MPESA_ENVIRONMENT, e.g. a local
+# fake server started with `python manage.py fake_daraja`
+
+MPESA_API_BASE_URL = os.getenv('MPESA_API_BASE_URL')
+
+# STK pushes are retried with exponential backoff (1s, 2s, ...) only when Daraja
+# cannot have received them: connection failures and 429. After a timeout or 5xx
+# the payment waits as 'pending' for reconcile_payments instead of being pushed again
+
+MPESA_MAX_ATTEMPTS = int(os.getenv('MPESA_MAX_ATTEMPTS', 3))
+MPESA_RETRY_BACKOFF = float(os.getenv('MPESA_RETRY_BACKOFF', 1.0))
+MPESA_TIMEOUT = 10
+
+# A worker's claim on a payment ('processing') expires after this many seconds
+# without an attempt. process_payments sends the push if the crashed worker never
+# tried it; otherwise reconcile_payments marks the payment 'pending'
+
+MPESA_PROCESSING_LEASE = int(os.getenv('MPESA_PROCESSING_LEASE', 300))
+
+# reconcile_payments fails 'pending' payments that no callback has answered after this many seconds
+
+MPESA_PENDING_TIMEOUT = int(os.getenv('MPESA_PENDING_TIMEOUT', 1800))
+
+
+# Background work queue (main.tasks)
+# Threads per process that send STK pushes and other slow work off the request path.
+# Tests run tasks inline.
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 4))
+BACKGROUND_TASKS_EAGER = TESTING
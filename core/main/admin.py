@@ -1,12 +1,12 @@
 from django.contrib import admin
 from .models import (
     StudentProfile, Mentor, Organization, 
-    Freelancer, Project
+    Freelancer, Project, SkillTag, PaymentRequest, PaymentResult
 )
 
 @admin.register(StudentProfile)
 class StudentProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'course', 'institution', 'year_of_study', 'created_at']
+    list_display = ['user', 'course', 'institution', 'year_of_study', 'project_count', 'created_at']
     list_filter = ['year_of_study', 'institution']
     search_fields = ['user__username', 'course', 'institution']
 
@@ -33,4 +33,21 @@ class ProjectAdmin(admin.ModelAdmin):
     list_display = ['title', 'student', 'status', 'start_date', 'created_at']
     list_filter = ['status', 'start_date']
     search_fields = ['title', 'description', 'student__user__username']
-    date_hierarchy = 'created_at'
\ No newline at end of file
+    date_hierarchy = 'created_at'
+
+@admin.register(SkillTag)
+class SkillTagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'normalized', 'created_at']
+    search_fields = ['normalized']
+
+@admin.register(PaymentRequest)
+class PaymentRequestAdmin(admin.ModelAdmin):
+    list_display = ['reference', 'payment_type', 'amount', 'phone_number', 'status', 'attempts', 'created_at']
+    list_filter = ['status', 'payment_type']
+    search_fields = ['reference', 'checkout_request_id', 'phone_number']
+    readonly_fields = ['reference', 'merchant_request_id', 'checkout_request_id', 'response_description', 'last_error']
+@admin.register(PaymentResult)
+class PaymentResultAdmin(admin.ModelAdmin):
+    list_display = ['checkout_request_id', 'result_code', 'result_desc', 'amount', 'mpesa_receipt_number', 'source', 'received_at']
+    list_filter = ['source', 'result_code']
+    search_fields = ['checkout_request_id', 'mpesa_receipt_number', 'phone_number']
@@ -0,0 +1,226 @@
+"""
+Read-only JSON API (v1) for the mobile client: projects, mentors,
+freelancers and organizations.
+
+Every collection is cursor-paginated (?cursor=, ?limit=) and takes
+?fields=a,b to return only some fields. Responses carry a strong ETag and
+Last-Modified computed from the (id, updated_at) pairs of the rows on the
+page, read with one narrow query. A client polling with If-None-Match or
+If-Modified-Since gets 304 Not Modified before any row is loaded or
+serialized.
+
+The ETag covers the rows themselves, not related rows: renaming a
+project's owner does not change the project's ETag until the project is
+next saved.
+"""
+import hashlib
+
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .avatars import avatar_urls
+from .forms import MentorFilterForm
+from .mentors import MENTOR_ORDERING, filter_mentors, get_mentor_facets
+from .models import Freelancer, Mentor, Organization, Project
+from .pagination import PAGE_SIZE, encode_cursor, seek
+from .skills import with_skill
+
+
+API_VERSION = 'v1'
+MAX_LIMIT = 100
+
+
+class APIError(Exception):
+    """A bad request; the message is returned to the client with a 400."""
+
+
+def _skills(obj):
+    return [tag.name for tag in obj.skill_tags.all()]
+
+
+def _project_owner(project):
+    if project.freelancer_id:
+        return {'type': 'freelancer', 'name': project.freelancer.user.username}
+    if project.organization_id:
+        return {'type': 'organization', 'name': project.organization.organization_name}
+    return {'type': 'student', 'name': project.student.user.username}
+
+
+def _avatar(obj):
+    return avatar_urls(obj.user)
+
+
+def _attrs(*names):
+    return {name: (lambda obj, name=name: getattr(obj, name)) for name in names}
+
+
+class Resource:
+    """One API collection: its rows, their order, the fields a client can ask for and its filters."""
+    model = None
+    ordering = ('id',)
+    # Field name -> function returning its JSON value
+    fields = {}
+    # Field name -> related lookups it needs (select_related, prefetch_related)
+    related = {}
+
+    def get_queryset(self, params):
+        return self.model._default_manager.all()
+
+    def load(self, queryset, fields):
+        for name in fields:
+            select, prefetch = self.related.get(name, ((), ()))
+            # select_related() with no arguments would follow every foreign key instead
+            if select:
+                queryset = queryset.select_related(*select)
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class ProjectResource(Resource):
+    model = Project
+    ordering = ('-created_at', '-id')
+    fields = {
+        **_attrs('id', 'title', 'description', 'status'),
+        'skills': _skills,
+        **_attrs('github_link', 'start_date', 'end_date'),
+        'owner': _project_owner,
+        **_attrs('created_at', 'updated_at'),
+    }
+    related = {
+        'skills': ((), ('skill_tags',)),
+        'owner': (('student__user', 'freelancer__user', 'organization'), ()),
+    }
+
+    def get_queryset(self, params):
+        projects = Project.objects.all()
+        status = params.get('status')
+        if status:
+            if status not in dict(Project.STATUS_CHOICES):
+                raise APIError(f"Unknown status {status!r}")
+            projects = projects.filter(status=status)
+        if params.get('skill'):
+            projects = with_skill(projects, params['skill'])
+        return projects
+
+
+class MentorResource(Resource):
+    model = Mentor
+    ordering = MENTOR_ORDERING
+    fields = {
+        **_attrs(
+            'id', 'full_name', 'job_title', 'company', 'bio', 'expertise_area', 'years_of_experience',
+            'availability', 'hourly_rate', 'linkedin',
+        ),
+        'avatar': _avatar,
+        **_attrs('created_at', 'updated_at'),
+    }
+    related = {'avatar': (('user__profile',), ())}
+
+    def get_queryset(self, params):
+        # The directory's filters (expertise, availability, min/max_years, min/max_rate)
+        form = MentorFilterForm(params, facets=get_mentor_facets())
+        if not form.is_valid():
+            raise APIError('; '.join(f"{field}: {' '.join(errors)}" for field, errors in form.errors.items()))
+        return filter_mentors(Mentor.objects.all(), form.cleaned_data)
+
+
+class FreelancerResource(Resource):
+    model = Freelancer
+    fields = {
+        **_attrs('id', 'full_name', 'profession', 'specialization', 'years_of_experience', 'hourly_rate', 'bio'),
+        'skills': _skills,
+        'avatar': _avatar,
+        **_attrs('created_at', 'updated_at'),
+    }
+    related = {'skills': ((), ('skill_tags',)), 'avatar': (('user__profile',), ())}
+
+    def get_queryset(self, params):
+        freelancers = Freelancer.objects.all()
+        if params.get('skill'):
+            freelancers = with_skill(freelancers, params['skill'])
+        return freelancers
+
+
+class OrganizationResource(Resource):
+    model = Organization
+    fields = _attrs(
+        'id', 'organization_name', 'organization_type', 'industry', 'website', 'bio', 'created_at', 'updated_at',
+    )
+
+    def get_queryset(self, params):
+        organizations = Organization.objects.all()
+        if params.get('industry'):
+            organizations = organizations.filter(industry__iexact=params['industry'])
+        return organizations
+
+
+RESOURCES = {
+    'projects': ProjectResource(),
+    'mentors': MentorResource(),
+    'freelancers': FreelancerResource(),
+    'organizations': OrganizationResource(),
+}
+
+
+def _parse(request, resource):
+    fields = request.GET.get('fields')
+    if fields:
+        fields = list(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+        unknown = [name for name in fields if name not in resource.fields]
+        if unknown:
+            raise APIError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(resource.fields)}")
+    else:
+        fields = list(resource.fields)
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise APIError("limit must be an integer")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise APIError(f"limit must be between 1 and {MAX_LIMIT}")
+    return fields, limit
+
+
+def _etag(name, request, versions):
+    digest = hashlib.sha256()
+    digest.update(f'{API_VERSION}:{name}:'.encode())
+    # Field selection, filters and limit all change the body
+    digest.update(repr(sorted((key, request.GET.getlist(key)) for key in request.GET)).encode())
+    for pk, updated_at in versions:
+        digest.update(f'{pk}@{updated_at.isoformat()};'.encode())
+    return f'"{digest.hexdigest()[:40]}"'
+
+
+def list_resource(request, name):
+    """One page of the named collection as JSON, or 304 if the client's copy is current."""
+    resource = RESOURCES[name]
+    try:
+        fields, limit = _parse(request, resource)
+        queryset = resource.get_queryset(request.GET)
+    except APIError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    queryset, _ = seek(queryset, resource.ordering, request.GET.get('cursor'))
+    # The validator: just enough to know whether anything on this page changed
+    versions = list(queryset.values_list('pk', 'updated_at')[:limit + 1])
+    etag = _etag(name, request, versions)
+    last_modified = max((updated_at for _, updated_at in versions), default=None)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        rows = list(resource.load(queryset, fields)[:limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([getattr(rows[-1], field.lstrip('-')) for field in resource.ordering])
+        response = JsonResponse({
+            'results': [{field: resource.fields[field](row) for field in fields} for row in rows],
+            'next_cursor': next_cursor,
+        })
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    # Clients may keep a copy but must revalidate it before every use
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,182 @@
+"""
+Async versions of the I/O-bound views, served instead of the ones in
+views.py when ASYNC_VIEWS is on (core/asgi.py turns it on, so running
+under an ASGI server such as `uvicorn core.asgi:application` is all it
+takes).
+
+Queries go through Django's async ORM. Templates are still rendered on
+a worker thread, because the navbar and flash messages read the session
+and the user. The STK push was already sent by the background workers,
+so MpesaPayment only awaits saving the PaymentRequest; payment_status can
+hold a poll open until the payment moves on, which costs a coroutine
+rather than a thread.
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+
+from .models import Mentor, PaymentRequest, Project, StudentProfile
+from .payments import queue_payment, read_payment_form
+from .ratelimit import rate_limit
+from .recommendations import group_by_kind
+from .stats import get_dashboard_stats
+
+
+# Statuses a payment leaves without anyone touching the page
+PENDING_PAYMENT = ('queued', 'processing', 'pending', 'sent')
+STATUS_POLL_INTERVAL = 0.5
+
+arender = sync_to_async(render)
+
+
+async def _user(request):
+    # Resolved once here; otherwise the template would look the user up again
+    request.user = await request.auser()
+    return request.user
+
+
+def _role_profile(request):
+    return request.role_profile.profile
+
+
+@login_required(login_url='main:login')
+async def dashboard(request):
+    user = await _user(request)
+    if user.is_staff or user.is_superuser:
+        context = dict(await sync_to_async(get_dashboard_stats)())
+        context.update({
+            'recent_logins': [
+                login async for login in User.objects.filter(last_login__isnull=False).order_by('-last_login')[:5]
+            ],
+            'recent_projects': [
+                project async for project in Project.objects.select_related('student__user').order_by('-created_at')[:5]
+            ],
+        })
+        return await arender(request, 'main/admin_dashboard.html', context)
+
+    # The session and, if it is not known yet, the profile are read synchronously
+    profile = await sync_to_async(_role_profile)(request)
+    user_role = request.role_profile.role or 'student'
+    context = {'user_role': user_role}
+
+    if user_role == 'student':
+        student = profile
+        if student:
+            context.update({
+                'student': student,
+                'projects': [project async for project in student.projects.all()],
+                'skills': [name async for name in student.skill_tags.values_list('name', flat=True)],
+                'project_count': student.project_count,
+                'completed_projects': student.completed_project_count,
+                'recommendations': group_by_kind([
+                    recommendation async for recommendation in student.recommendations.all()
+                ]),
+            })
+
+    elif user_role == 'mentor':
+        mentor = profile
+        if mentor:
+            context.update({
+                'mentor': mentor,
+                'total_students': await StudentProfile.objects.acount(),
+                'total_projects': await Project.objects.acount(),
+            })
+
+    elif user_role in ['freelancer', 'organization']:
+        if profile:
+            context.update({
+                'profile': profile,
+                'available_projects': [
+                    project async for project in Project.objects.select_related('student__user')[:10]
+                ],
+                'total_students': await StudentProfile.objects.acount(),
+            })
+
+    return await arender(request, 'main/dashboard.html', context)
+
+
+# Not cached: the form's CSRF token must match each visitor's own cookie
+@rate_limit('contact')
+async def contact(request):
+    if request.method == 'POST':
+        name = request.POST.get('name')
+        messages.success(request, f'Thanks {name}! Your message has been received.')
+        return redirect('main:contact')
+
+    await _user(request)
+    return await arender(request, 'main/contact.html')
+
+
+@rate_limit('payment')
+async def MpesaPayment(request):
+    user = await _user(request)
+
+    if request.method == 'POST':
+        form = read_payment_form(request.POST)
+        if form is None:
+            messages.error(request, 'Please choose a payment type and enter a valid amount and phone number.')
+            return redirect('main:payment')
+        payment_type, phone_number, amount = form
+
+        mentor = None
+        if payment_type == 'mentor_session':
+            try:
+                mentor = await Mentor.objects.aget(id=request.POST.get('mentor_id'))
+            except (Mentor.DoesNotExist, ValueError):
+                messages.error(request, 'Mentor not found.')
+                return redirect('main:payment')
+            transaction_desc = f'Mentorship with {mentor.full_name}'
+        elif payment_type == 'tip_student':
+            transaction_desc = 'Student Tip'
+        else:
+            transaction_desc = 'Donation'
+
+        # Saves the request and queues the STK push for the background workers
+        payment = await sync_to_async(queue_payment)(
+            user=user if user.is_authenticated else None,
+            mentor=mentor,
+            payment_type=payment_type,
+            phone_number=phone_number,
+            amount=amount,
+            description=transaction_desc[:100],
+        )
+        messages.success(request, 'Payment initiated! Check your phone.')
+        return redirect(f"{reverse('main:payment')}?ref={payment.reference}")
+
+    return await arender(request, 'main/payment.html', {
+        'mentors': [mentor async for mentor in Mentor.objects.only('id', 'full_name', 'hourly_rate')],
+        'payment_ref': request.GET.get('ref', ''),
+    })
+
+
+async def payment_status(request, reference):
+    """
+    Polled by the payment page. With ?wait=<status> the response is held
+    until the payment leaves that status or PAYMENT_STATUS_WAIT seconds pass.
+    """
+    waiting_for = request.GET.get('wait')
+    deadline = time.monotonic() + settings.PAYMENT_STATUS_WAIT
+    while True:
+        try:
+            payment = await PaymentRequest.objects.aget(reference=reference)
+        except PaymentRequest.DoesNotExist:
+            raise Http404
+        if (payment.status != waiting_for or payment.status not in PENDING_PAYMENT
+                or time.monotonic() >= deadline):
+            break
+        await asyncio.sleep(STATUS_POLL_INTERVAL)
+
+    return JsonResponse({
+        'reference': str(payment.reference),
+        'status': payment.status,
+        'status_display': payment.get_status_display(),
+        'message': payment.response_description or payment.last_error,
+    })
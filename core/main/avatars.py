@@ -0,0 +1,158 @@
+"""
+Profile pictures.
+
+An upload is stored once under MEDIA_ROOT/AVATAR_DIR, named after the
+SHA-256 of its bytes, and a background worker resizes it into square
+WebP and JPEG thumbnails (AVATAR_SIZES) named after the same hash. The
+thumbnail URLs are saved on the UserProfile, so any page that joins in
+user__profile for its cards has them without another query. Since a
+name never points at different bytes, avatar_file serves them with a
+long, immutable Cache-Control.
+
+Until the thumbnails exist the cards show the placeholder icon; once
+they do, the owner's role profiles get a new updated_at so cached cards
+and API validators change with them. A job lost when the process stops
+is redone by the make_thumbnails command.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Freelancer, Mentor, Organization, StudentProfile, UserProfile
+from .tasks import enqueue
+
+
+# Larger images are refused rather than decoded
+MAX_DIMENSION = 6000
+
+# thumbnail format -> (Pillow format, file extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+# Pillow format of an upload -> the extension its original is stored with
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+ROLE_MODELS = [StudentProfile, Mentor, Freelancer, Organization]
+
+
+def avatar_urls(user):
+    """{format: {size: url}} of a user's thumbnails, or None. Join in user__profile first."""
+    profile = getattr(user, 'profile', None)
+    return (profile.avatar_thumbnails or None) if profile else None
+
+
+def validate_avatar(upload):
+    """Validator for an uploaded avatar that forms.ImageField has already opened with Pillow."""
+    if upload.size > settings.AVATAR_MAX_BYTES:
+        raise ValidationError(f"Images must be smaller than {settings.AVATAR_MAX_BYTES // (1024 * 1024)} MB.")
+    if upload.image.format not in EXTENSIONS:
+        raise ValidationError("Upload a JPEG, PNG, WebP or GIF image.")
+    if max(upload.image.size) > MAX_DIMENSION:
+        raise ValidationError(f"Images must be at most {MAX_DIMENSION} pixels wide and high.")
+
+
+def thumbnail_names(name):
+    """{format: {size: storage name}} of the thumbnails made from the original `name`."""
+    stem = os.path.splitext(name)[0]
+    return {
+        key: {str(size): f'{stem}-{size}.{extension}' for size in settings.AVATAR_SIZES}
+        for key, (_, extension, _) in FORMATS.items()
+    }
+
+
+def store_avatar(profile, upload):
+    """
+    Saves an upload as `profile`'s avatar and queues its thumbnails.
+    The profile is updated in the database and in memory.
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    name = f'{settings.AVATAR_DIR}/{digest.hexdigest()[:32]}.{EXTENSIONS[upload.image.format]}'
+    # Identical uploads share one file
+    if not default_storage.exists(name):
+        upload.seek(0)
+        name = default_storage.save(name, upload)
+
+    replaced = profile.avatar.name
+    profile.avatar = name
+    profile.avatar_thumbnails = {}
+    UserProfile.objects.filter(pk=profile.pk).update(avatar=name, avatar_thumbnails={})
+    enqueue(make_thumbnails, profile.pk, name, replaced=replaced)
+
+
+def make_thumbnails(profile_id, name, replaced=''):
+    """Resizes the original `name` into every size and format, then points the profile at them."""
+    names = thumbnail_names(name)
+    if not all(default_storage.exists(path) for sizes in names.values() for path in sizes.values()):
+        with default_storage.open(name) as f:
+            image = Image.open(f)
+            # JPEGs can decode straight to a fraction of their size
+            largest = max(settings.AVATAR_SIZES)
+            image.draft('RGB', (largest * 2, largest * 2))
+            image = _flatten(ImageOps.exif_transpose(image))
+        # Largest first; each smaller size is scaled down from the one before
+        for size in sorted(settings.AVATAR_SIZES, reverse=True):
+            image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            for key, (image_format, _, options) in FORMATS.items():
+                path = names[key][str(size)]
+                if not default_storage.exists(path):
+                    data = BytesIO()
+                    image.save(data, image_format, **options)
+                    default_storage.save(path, ContentFile(data.getvalue()))
+
+    urls = {key: {size: default_storage.url(path) for size, path in sizes.items()} for key, sizes in names.items()}
+    # A newer upload may have replaced this one while it was being resized
+    updated = UserProfile.objects.filter(pk=profile_id, avatar=name).update(avatar_thumbnails=urls)
+    if updated:
+        user_id = UserProfile.objects.filter(pk=profile_id).values_list('user_id', flat=True).first()
+        now = timezone.now()
+        for model in ROLE_MODELS:
+            model.objects.filter(user_id=user_id).update(updated_at=now)
+    if replaced and replaced != name:
+        remove_unused(replaced)
+
+
+def make_missing_thumbnails():
+    """
+    Makes the thumbnails of every avatar that has none, e.g. because the
+    process stopped before its background job ran. Returns (profiles fixed,
+    [(profile id, error)] for originals that could not be read).
+    """
+    fixed, errors = 0, []
+    missing = UserProfile.objects.exclude(avatar='').filter(avatar_thumbnails={}).order_by('pk')
+    for profile_id, name in missing.values_list('pk', 'avatar').iterator():
+        try:
+            make_thumbnails(profile_id, name)
+        except (OSError, Image.DecompressionBombError) as e:
+            errors.append((profile_id, f"{name}: {e}"))
+        else:
+            fixed += 1
+    return fixed, errors
+
+
+def remove_unused(name):
+    """Deletes an original and its thumbnails unless another profile still uses them."""
+    if UserProfile.objects.filter(avatar=name).exists():
+        return
+    for path in [name] + [path for sizes in thumbnail_names(name).values() for path in sizes.values()]:
+        default_storage.delete(path)
+
+
+def _flatten(image):
+    # Transparent areas become white instead of JPEG's black
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
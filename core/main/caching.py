@@ -0,0 +1,50 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.cache import cache_page
+
+
+def cache_public_page(view):
+    """
+    Caches a public page for anonymous visitors only.
+
+    Signed-in users (whose navbar shows their name) and requests carrying a
+    flash message always get a fresh render. Never use it on a page that
+    renders {% csrf_token %}: the copy is stored before CsrfViewMiddleware
+    sets the cookie, so other visitors would get a token that matches no
+    cookie of theirs and their posts would be refused. Works on async views
+    too.
+    """
+    cached_view = cache_page(settings.PUBLIC_PAGE_CACHE_SECONDS, key_prefix='public')(view)
+
+    def mark_shared(response):
+        # Browsers must not reuse the anonymous copy after the visitor logs in
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            # Messages may live in the session, which is read synchronously
+            if user.is_authenticated or await sync_to_async(_has_messages)(request):
+                return await view(request, *args, **kwargs)
+            return mark_shared(await cached_view(request, *args, **kwargs))
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.user.is_authenticated or _has_messages(request):
+            return view(request, *args, **kwargs)
+        return mark_shared(cached_view(request, *args, **kwargs))
+
+    return wrapper
+
+
+def _has_messages(request):
+    return bool(get_messages(request))
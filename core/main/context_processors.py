@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def fragment_cache(request):
+    """Timeout for the {% cache %} fragments around project and mentor cards."""
+    return {'CARD_CACHE_SECONDS': settings.CARD_CACHE_SECONDS}
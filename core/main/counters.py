@@ -0,0 +1,90 @@
+"""
+Per-student project counters stored on StudentProfile, so the student
+dashboard reads four columns instead of counting projects on every load.
+
+Signals adjust them with F() expressions, which the database applies
+atomically however many requests save projects at once. Bulk loads skip
+signals, so seed_data and import_data finish with recount_project_counts(),
+and the recount_projects command repairs any drift.
+"""
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Project, StudentProfile
+
+
+# Project status -> its counter on StudentProfile
+STATUS_COUNTERS = {
+    'ongoing': 'ongoing_project_count',
+    'completed': 'completed_project_count',
+    'paused': 'paused_project_count',
+}
+COUNTERS = ['project_count', *STATUS_COUNTERS.values()]
+
+
+def _change(field, delta):
+    # Never below zero, even when the counters have drifted
+    return F(field) + delta if delta > 0 else Greatest(F(field) + delta, Value(0))
+
+
+def adjust_project_counts(student_id, status, delta):
+    """Adds `delta` to a student's total and to the counter for `status`."""
+    changes = {'project_count': _change('project_count', delta)}
+    if status in STATUS_COUNTERS:
+        changes[STATUS_COUNTERS[status]] = _change(STATUS_COUNTERS[status], delta)
+    StudentProfile.objects.filter(pk=student_id).update(**changes)
+
+
+def move_project_count(student_id, old_status, new_status):
+    """Moves one project from one status counter to another."""
+    changes = {}
+    if old_status in STATUS_COUNTERS:
+        changes[STATUS_COUNTERS[old_status]] = _change(STATUS_COUNTERS[old_status], -1)
+    if new_status in STATUS_COUNTERS:
+        changes[STATUS_COUNTERS[new_status]] = _change(STATUS_COUNTERS[new_status], 1)
+    if changes:
+        StudentProfile.objects.filter(pk=student_id).update(**changes)
+
+
+def _counted(status=None):
+    projects = Project.objects.filter(student=OuterRef('pk'))
+    if status:
+        projects = projects.filter(status=status)
+    counts = projects.order_by().values('student').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts), 0)
+
+
+def actual_project_counts():
+    """{counter field: expression counting the student's projects}, for annotate() or update()."""
+    return {
+        'project_count': _counted(),
+        **{field: _counted(status) for status, field in STATUS_COUNTERS.items()},
+    }
+
+
+def recount_project_counts(batch_size=5000):
+    """
+    Recomputes every student's counters from the projects table, one batch
+    of students at a time. Returns how many students were wrong.
+    """
+    actual = actual_project_counts()
+    drifted = Q()
+    for field in COUNTERS:
+        drifted |= ~Q(**{field: F(f'actual_{field}')})
+
+    fixed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            StudentProfile.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return fixed
+        last_id = ids[-1]
+        stale = list(
+            StudentProfile.objects.filter(pk__in=ids)
+            .annotate(**{f'actual_{field}': expression for field, expression in actual.items()})
+            .filter(drifted).values_list('pk', flat=True)
+        )
+        if stale:
+            fixed += StudentProfile.objects.filter(pk__in=stale).update(**actual)
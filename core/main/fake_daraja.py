@@ -0,0 +1,192 @@
+"""
+A local stand-in for the Daraja API, for tests and offline development.
+
+    with FakeDaraja() as daraja:
+        client = DarajaClient(base_url=daraja.url)
+        client.stk_push(...)
+        assert daraja.requests[-1]['path'] == '/mpesa/stkpush/v1/processrequest'
+
+`fail_next` makes the next N API calls return HTTP 429 to exercise retries.
+`results` maps a CheckoutRequestID to the (ResultCode, ResultDesc) the
+status query reports; ids in `unanswered` still look pending. With
+`callback_delay` set, every accepted push is followed by a callback to its
+CallBackURL after that many seconds, like the real thing.
+"""
+import json
+import threading
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+SUCCESS = (0, 'The service request is processed successfully.')
+
+
+def callback_payload(checkout_request_id, result_code=0, result_desc=None, amount=1,
+                     phone_number=254708374149, merchant_request_id='fake-merchant'):
+    """The JSON body Daraja posts to the CallBackURL once the customer answers the prompt."""
+    callback = {
+        'MerchantRequestID': merchant_request_id,
+        'CheckoutRequestID': checkout_request_id,
+        'ResultCode': result_code,
+        'ResultDesc': result_desc or (SUCCESS[1] if result_code == 0 else 'Request cancelled by user'),
+    }
+    if result_code == 0:
+        callback['CallbackMetadata'] = {'Item': [
+            {'Name': 'Amount', 'Value': amount},
+            {'Name': 'MpesaReceiptNumber', 'Value': 'FAKE' + uuid.uuid4().hex[:6].upper()},
+            {'Name': 'TransactionDate', 'Value': int(datetime.now().strftime('%Y%m%d%H%M%S'))},
+            {'Name': 'PhoneNumber', 'Value': phone_number},
+        ]}
+    return {'Body': {'stkCallback': callback}}
+
+
+def _send_callback(url, payload):
+    try:
+        requests.post(url, json=payload, timeout=10)
+    except requests.RequestException:
+        pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _record(self, payload=None):
+        server = self.server
+        with server.lock:
+            server.requests.append({'method': self.command, 'path': self.path.split('?')[0], 'json': payload})
+            if server.fail_next > 0:
+                server.fail_next -= 1
+                return False
+        return True
+
+    def do_GET(self):
+        if not self._record():
+            return self._reply(429, {'errorMessage': 'Too many requests'})
+        if self.path.startswith('/oauth/v1/generate'):
+            return self._reply(200, {'access_token': self.server.token, 'expires_in': '3599'})
+        self._reply(404, {'errorMessage': 'Not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if not self._record(payload):
+            return self._reply(429, {'errorMessage': 'Too many requests'})
+        if self.headers.get('Authorization') != f'Bearer {self.server.token}':
+            return self._reply(401, {'errorCode': '404.001.03', 'errorMessage': 'Invalid Access Token'})
+
+        path = self.path.split('?')[0]
+        if path == '/mpesa/stkpush/v1/processrequest':
+            return self._stk_push(payload)
+        if path == '/mpesa/stkpushquery/v1/query':
+            return self._stk_query(payload)
+        self._reply(404, {'errorMessage': 'Not found'})
+
+    def _stk_push(self, payload):
+        server = self.server
+        merchant_request_id = f'fake-{uuid.uuid4().hex[:12]}'
+        checkout_request_id = f'ws_CO_{uuid.uuid4().hex[:16]}'
+        server.checkouts.append(checkout_request_id)
+        if server.callback_delay is not None and payload.get('CallBackURL'):
+            body = callback_payload(
+                checkout_request_id, amount=payload.get('Amount', 1),
+                merchant_request_id=merchant_request_id,
+            )
+            timer = threading.Timer(server.callback_delay, _send_callback, (payload['CallBackURL'], body))
+            timer.daemon = True
+            timer.start()
+        self._reply(200, {
+            'MerchantRequestID': merchant_request_id,
+            'CheckoutRequestID': checkout_request_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        })
+
+    def _stk_query(self, payload):
+        checkout_request_id = payload.get('CheckoutRequestID')
+        if checkout_request_id in self.server.unanswered:
+            return self._reply(500, {'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'})
+        result_code, result_desc = self.server.results.get(checkout_request_id, SUCCESS)
+        self._reply(200, {
+            'ResponseCode': '0',
+            'ResponseDescription': 'The service request has been accepted successsfully',
+            'MerchantRequestID': 'fake-merchant',
+            'CheckoutRequestID': checkout_request_id,
+            'ResultCode': str(result_code),
+            'ResultDesc': result_desc,
+        })
+
+
+class FakeDaraja:
+    """Runs the fake API on a background thread, on `port` (0 picks a free one)."""
+
+    def __init__(self, host='127.0.0.1', port=0, callback_delay=None):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.fail_next = 0
+        self.server.token = 'fake-access-token'
+        self.server.checkouts = []
+        self.server.results = {}
+        self.server.unanswered = set()
+        self.server.callback_delay = callback_delay
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    @property
+    def checkouts(self):
+        """CheckoutRequestIDs handed out, oldest first."""
+        return self.server.checkouts
+
+    @property
+    def results(self):
+        return self.server.results
+
+    @property
+    def unanswered(self):
+        return self.server.unanswered
+
+    @property
+    def fail_next(self):
+        return self.server.fail_next
+
+    @fail_next.setter
+    def fail_next(self, count):
+        self.server.fail_next = count
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,8 +1,20 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from .avatars import store_avatar, validate_avatar
 from .models import StudentProfile, Project, Mentor, Organization, Freelancer
 
+
+def avatar_field():
+    # Resized into thumbnails in the background by main.avatars
+    return forms.ImageField(
+        required=False,
+        label='Profile picture',
+        validators=[validate_avatar],
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': 'image/jpeg,image/png,image/webp,image/gif'}),
+    )
+
+
 class RegisterForm(UserCreationForm):
     email = forms.EmailField(
         required=True,
@@ -190,6 +202,7 @@ class ProfileEditForm(forms.ModelForm):
             'placeholder': '+254 7XX XXX XXX'
         })
     )
+    avatar = avatar_field()
 
     class Meta:
         model = StudentProfile
@@ -240,12 +253,15 @@ class ProfileEditForm(forms.ModelForm):
         phone = self.cleaned_data.get('phone')
         if hasattr(student.user, 'profile'):
             student.user.profile.phone = phone
+            if self.cleaned_data.get('avatar'):
+                store_avatar(student.user.profile, self.cleaned_data['avatar'])
             student.user.profile.save()
             
         return student
 
 class MentorProfileEditForm(forms.ModelForm):
     phone = forms.CharField(max_length=15, required=True, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    avatar = avatar_field()
 
     class Meta:
         model = Mentor
@@ -272,12 +288,15 @@ class MentorProfileEditForm(forms.ModelForm):
         phone = self.cleaned_data.get('phone')
         if hasattr(mentor.user, 'profile'):
             mentor.user.profile.phone = phone
+            if self.cleaned_data.get('avatar'):
+                store_avatar(mentor.user.profile, self.cleaned_data['avatar'])
             mentor.user.profile.save()
         return mentor
 
 
 class FreelancerProfileEditForm(forms.ModelForm):
     phone = forms.CharField(max_length=15, required=True, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    avatar = avatar_field()
 
     class Meta:
         model = Freelancer
@@ -303,12 +322,15 @@ class FreelancerProfileEditForm(forms.ModelForm):
         phone = self.cleaned_data.get('phone')
         if hasattr(freelancer.user, 'profile'):
             freelancer.user.profile.phone = phone
+            if self.cleaned_data.get('avatar'):
+                store_avatar(freelancer.user.profile, self.cleaned_data['avatar'])
             freelancer.user.profile.save()
         return freelancer
 
 
 class OrganizationProfileEditForm(forms.ModelForm):
     phone = forms.CharField(max_length=15, required=True, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    avatar = avatar_field()
 
     class Meta:
         model = Organization
@@ -334,6 +356,8 @@ class OrganizationProfileEditForm(forms.ModelForm):
         phone = self.cleaned_data.get('phone')
         if hasattr(org.user, 'profile'):
             org.user.profile.phone = phone
+            if self.cleaned_data.get('avatar'):
+                store_avatar(org.user.profile, self.cleaned_data['avatar'])
             org.user.profile.save()
         return org
 
@@ -382,4 +406,30 @@ class ProjectForm(forms.ModelForm):
         if start_date and end_date and end_date < start_date:
             raise forms.ValidationError('End date cannot be before start date!')
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+class MentorFilterForm(forms.Form):
+    """Mentor directory filters. Every field is optional; the menus show how many mentors each option has."""
+    expertise = forms.ChoiceField(required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+    availability = forms.ChoiceField(required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+    min_years = forms.IntegerField(required=False, min_value=0, widget=forms.NumberInput(attrs={
+        'class': 'form-control', 'placeholder': 'Min years'
+    }))
+    max_years = forms.IntegerField(required=False, min_value=0, widget=forms.NumberInput(attrs={
+        'class': 'form-control', 'placeholder': 'Max years'
+    }))
+    min_rate = forms.DecimalField(required=False, min_value=0, max_digits=8, decimal_places=2, widget=forms.NumberInput(attrs={
+        'class': 'form-control', 'placeholder': 'Min KES/hour'
+    }))
+    max_rate = forms.DecimalField(required=False, min_value=0, max_digits=8, decimal_places=2, widget=forms.NumberInput(attrs={
+        'class': 'form-control', 'placeholder': 'Max KES/hour'
+    }))
+
+    def __init__(self, *args, facets, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['expertise'].choices = [('', f"All areas ({facets['total']})")] + [
+            (value, f"{label} ({facets['expertise'].get(value, 0)})") for value, label in Mentor.EXPERTISE_CHOICES
+        ]
+        self.fields['availability'].choices = [('', 'Any availability')] + [
+            (value, f"{value} ({count})") for value, count in sorted(facets['availability'].items())
+        ]
@@ -0,0 +1,127 @@
+"""
+Database instrumentation: how many queries a request makes, how long it
+spends in the database and which SQL it repeats.
+
+The same statement run over and over with different parameters is the
+signature of an N+1 (a related object fetched inside a loop). Exact
+repeats (same parameters too) are pure waste.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    """
+    Records every query run on the database connections of the current
+    thread while the block is active. Works with DEBUG off.
+
+        with QueryRecorder() as recorder:
+            client.get('/projects/')
+        recorder.count, recorder.duration, recorder.repeated()
+    """
+
+    def __init__(self, using=None):
+        self.aliases = [using] if using else list(connections)
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in self.aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        """Seconds spent in the database."""
+        return sum(duration for _, _, duration in self.queries)
+
+    def repeated(self, threshold=1):
+        """{sql: times run} for statements run more than `threshold` times, whatever their parameters."""
+        counts = Counter(sql for sql, _, _ in self.queries)
+        return {sql: n for sql, n in counts.most_common() if n > threshold}
+
+    def duplicates(self):
+        """{sql: times run} for statements run more than once with the same parameters."""
+        counts = Counter((sql, repr(params)) for sql, params, _ in self.queries)
+        return {sql: n for (sql, _), n in counts.most_common() if n > 1}
+
+    def summary(self):
+        lines = [f"{self.count} queries, {self.duration * 1000:.1f} ms in the database"]
+        for sql, n in self.repeated().items():
+            lines.append(f"  {n}x {sql[:300]}")
+        return '\n'.join(lines)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Reports each request's database work in a Server-Timing header (shown
+    by browser dev tools) plus X-DB-Queries, and logs a warning when the
+    same SQL runs more than QUERY_REPEAT_THRESHOLD times in one request.
+
+    Switched on by QUERY_INSTRUMENTATION, which defaults to DEBUG.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        # The async ORM runs a request's queries on its one sync thread, so the recorder goes there
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        response['X-DB-Queries'] = str(recorder.count)
+        response['Server-Timing'] = f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+        repeated = recorder.repeated(self.threshold)
+        if repeated:
+            sql, n = next(iter(repeated.items()))
+            logger.warning(
+                "Possible N+1 on %s %s: %s queries, the same SQL %s times: %s",
+                request.method, request.path, recorder.count, n, sql[:300],
+            )
+        return response
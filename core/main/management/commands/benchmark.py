@@ -0,0 +1,326 @@
+import json
+import math
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from main import urls as main_urls
+from main.instrumentation import QueryRecorder
+from main.models import PaymentRequest, Project, StudentProfile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Routes that would change what the rest of the run measures
+SKIPPED_ROUTES = {
+    'logout': "ends the benchmark user's session",
+    'mpesa_callback': "writes payment results",
+}
+STAFF_ROUTES = {'skill_gap_report'}
+ROUTE_PARAMS = {'search': {'q': 'python'}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives every route in main/urls.py through the test client and reports requests/second, "
+        "p50/p95/p99 latency, queries per request and peak RSS for the configured database. "
+        "--output saves the results as JSON; --compare diffs them against an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route (default 200).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Client threads (default 8).")
+        parser.add_argument('--writers', type=int, default=0,
+                            help="Threads writing to the database while routes are measured (default 0).")
+        parser.add_argument('--route', action='append', dest='routes', metavar='NAME',
+                            help="Only benchmark this route name (repeatable). Default: every route.")
+        parser.add_argument('--username', help="User to log in as (default: the first student with a project).")
+        parser.add_argument('--staff-username', help="User for staff-only routes (default: the first superuser).")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="Compare against the results in this JSON file.")
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help="Percent p95 slowdown reported as a regression when comparing (default 10).")
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help="Exit with an error when --compare finds a regression.")
+
+    def handle(self, *args, **options):
+        user = self._get_user(options['username'])
+        staff = self._get_staff(options['staff_username'])
+        routes = self._routes(options['routes'], user, staff)
+        database = _describe_database()
+        self.stdout.write(f"Database: {database}")
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING("DEBUG is on: timings include Django's query logging."))
+        connection.close()
+
+        self.stdout.write(
+            f"{'route':<18}{'reqs':>6}{'errs':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}{'queries':>9}{'w.errs':>8}"
+        )
+        results = {}
+        for name, url, params, as_user in routes:
+            result = self._benchmark_route(url, params, as_user, options)
+            results[name] = result
+            self.stdout.write(
+                f"{name:<18}{result['requests']:>6}{result['errors']:>6}{result['rps']:>9.1f}"
+                f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                f"{result['queries']:>9.1f}{result['write_errors']:>8}"
+            )
+            for error in result['error_samples']:
+                self.stdout.write(self.style.ERROR(f"  {error}"))
+
+        peak_rss = _peak_rss_mb()
+        if peak_rss is not None:
+            self.stdout.write(f"Peak RSS: {peak_rss:.1f} MB")
+
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'created': timezone.now().isoformat(),
+                'database': database,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'writers': options['writers'],
+                'peak_rss_mb': peak_rss,
+            },
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['compare']:
+            regressions = self._compare(report, options['compare'], options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{regressions} route(s) regressed")
+
+    def _get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user called {username!r}")
+        profile = (
+            StudentProfile.objects.filter(projects__isnull=False).select_related('user').order_by('id').first()
+            or StudentProfile.objects.select_related('user').order_by('id').first()
+        )
+        if profile is None:
+            raise CommandError("No students to log in as; run seed_data or pass --username")
+        return profile.user
+
+    def _get_staff(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username, is_staff=True)
+            except User.DoesNotExist:
+                raise CommandError(f"No staff user called {username!r}")
+        return User.objects.filter(is_superuser=True).order_by('id').first()
+
+    def _routes(self, only, user, staff):
+        """(name, url, GET params, user) for each route to benchmark."""
+        project = Project.objects.filter(student__user=user).order_by('id').first()
+        payment = PaymentRequest.objects.order_by('-id').first()
+        names = [pattern.name for pattern in main_urls.urlpatterns]
+        if only:
+            unknown = set(only) - set(names)
+            if unknown:
+                raise CommandError(f"Unknown route(s): {', '.join(sorted(unknown))}")
+            names = [name for name in names if name in only]
+
+        routes = []
+        for name in dict.fromkeys(names):
+            if name in SKIPPED_ROUTES:
+                self.stdout.write(f"Skipping {name}: {SKIPPED_ROUTES[name]}")
+                continue
+            as_user = staff if name in STAFF_ROUTES else user
+            if as_user is None:
+                self.stdout.write(f"Skipping {name}: no staff user")
+                continue
+            pattern = next(p for p in main_urls.urlpatterns if p.name == name).pattern
+            kwargs = {}
+            if 'project_id' in pattern.converters:
+                if project is None:
+                    self.stdout.write(f"Skipping {name}: the benchmark user has no projects")
+                    continue
+                kwargs['project_id'] = project.id
+            if 'reference' in pattern.converters:
+                if payment is None:
+                    self.stdout.write(f"Skipping {name}: no payments")
+                    continue
+                kwargs['reference'] = payment.reference
+            routes.append((name, reverse(f'main:{name}', kwargs=kwargs), ROUTE_PARAMS.get(name), as_user))
+        return routes
+
+    def _benchmark_route(self, url, params, user, options):
+        stop = threading.Event()
+        write_errors = []
+        writers = [
+            threading.Thread(target=_write_loop, args=(user.pk, stop, write_errors))
+            for _ in range(options['writers'])
+        ]
+        for writer in writers:
+            writer.start()
+        try:
+            timings, queries, errors, elapsed = _measure(
+                url, params, user, options['requests'], options['concurrency'],
+            )
+        finally:
+            stop.set()
+            for writer in writers:
+                writer.join()
+
+        timings.sort()
+        return {
+            'url': url,
+            'requests': len(timings),
+            'errors': len(errors),
+            'rps': len(timings) / elapsed if elapsed else 0,
+            'mean_ms': sum(timings) / len(timings) * 1000 if timings else 0,
+            'p50_ms': _percentile(timings, 50) * 1000,
+            'p95_ms': _percentile(timings, 95) * 1000,
+            'p99_ms': _percentile(timings, 99) * 1000,
+            'queries': sum(queries) / len(queries) if queries else 0,
+            'write_errors': len(write_errors),
+            'error_samples': sorted(set(errors + write_errors))[:5],
+        }
+
+    def _compare(self, report, path, threshold):
+        try:
+            with open(path) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+        self.stdout.write(f"\nCompared with {path} (commit {baseline['meta'].get('commit') or 'unknown'}):")
+        self.stdout.write(f"{'route':<18}{'p95 before':>12}{'p95 now':>10}{'change':>9}{'queries':>14}")
+        regressions = 0
+        for name, now in report['routes'].items():
+            before = baseline['routes'].get(name)
+            if before is None:
+                self.stdout.write(f"{name:<18}{'(new)':>12}")
+                continue
+            change = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            regressed = change > threshold or now['queries'] > before['queries'] + 0.5
+            regressions += regressed
+            line = (
+                f"{name:<18}{before['p95_ms']:>12.1f}{now['p95_ms']:>10.1f}{change:>+8.0f}%"
+                f"{before['queries']:>7.1f} -> {now['queries']:<5.1f}"
+            )
+            self.stdout.write(self.style.ERROR(line + ' regressed') if regressed else line)
+        return regressions
+
+
+def _measure(url, params, user, total, concurrency):
+    timings = []
+    queries = []
+    errors = []
+    per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    ready = threading.Barrier(concurrency + 1)
+    workers = [
+        threading.Thread(target=_request_loop, args=(url, params, user, count, ready, timings, queries, errors))
+        for count in per_worker
+    ]
+    for worker in workers:
+        worker.start()
+    # Every worker is logged in and warmed up before the clock starts
+    ready.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return timings, queries, errors, time.perf_counter() - start
+
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _describe_database():
+    settings_dict = connection.settings_dict
+    parts = [connection.vendor, f"CONN_MAX_AGE={settings_dict.get('CONN_MAX_AGE', 0)}"]
+    if settings_dict.get('OPTIONS', {}).get('pool'):
+        parts.append('pooled')
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            parts.append(f"journal_mode={cursor.fetchone()[0]}")
+            cursor.execute('PRAGMA synchronous')
+            parts.append(f"synchronous={cursor.fetchone()[0]}")
+    return ', '.join(parts)
+
+
+def _client_host():
+    # The test client's default "testserver" host is only allowed under the test runner
+    return next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+
+
+def _request_loop(url, params, user, count, ready, timings, queries, errors):
+    try:
+        client = Client(HTTP_HOST=_client_host())
+        client.force_login(user)
+        client.get(url, params)
+    finally:
+        ready.wait()
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                with QueryRecorder() as recorder:
+                    response = client.get(url, params)
+            except DatabaseError as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            if response.status_code >= 400:
+                errors.append(f"HTTP {response.status_code}")
+                continue
+            timings.append(time.perf_counter() - start)
+            queries.append(recorder.count)
+    finally:
+        connection.close()
+
+
+def _write_loop(user_id, stop, errors):
+    # Read then write in one transaction, the pattern that trips "database is locked" on SQLite
+    try:
+        while not stop.is_set():
+            try:
+                with transaction.atomic():
+                    User.objects.filter(pk=user_id).values_list('last_login', flat=True).first()
+                    User.objects.filter(pk=user_id).update(last_login=timezone.now())
+            except DatabaseError as e:
+                errors.append(f"{type(e).__name__}: {e}")
+            time.sleep(0.01)
+    finally:
+        connection.close()
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from main.models import PaymentRequest, StudentProfile
+from main.management.commands.benchmark import _describe_database, _percentile
+
+
+# The views main/async_views.py serves under ASGI; payment_status is polled without ?wait=
+ROUTES = ['dashboard', 'contact', 'payment', 'payment_status']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares concurrent-request throughput of the dashboard, contact, payment and payment status "
+        "pages under WSGI (sync views, --threads worker threads) and ASGI (async views on one event "
+        "loop). Each mode runs in its own process, with --concurrency clients sending --requests "
+        "requests per route."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help="Requests per route (default 400).")
+        parser.add_argument('--concurrency', type=int, default=32, help="Clients at once (default 32).")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="WSGI worker threads, like gunicorn --threads (default 8).")
+        parser.add_argument('--route', action='append', dest='routes', choices=ROUTES, metavar='NAME',
+                            help=f"Only benchmark this route (repeatable): {', '.join(ROUTES)}.")
+        parser.add_argument('--serve', choices=['wsgi', 'asgi'], help="Internal: measure one mode and print JSON.")
+
+    def handle(self, *args, **options):
+        routes = options['routes'] or ROUTES
+        if options['serve']:
+            self.stdout.write(json.dumps(self._measure_mode(options['serve'], routes, options)))
+            return
+
+        self.stdout.write(f"Database: {_describe_database()}")
+        results = {mode: self._run_mode(mode, options) for mode in ('wsgi', 'asgi')}
+        self.stdout.write(
+            f"{'route':<16}{'WSGI req/s':>12}{'p95 ms':>9}{'ASGI req/s':>12}{'p95 ms':>9}{'ASGI/WSGI':>11}{'errs':>6}"
+        )
+        for name in routes:
+            if name not in results['wsgi']:
+                self.stdout.write(f"{name:<16}skipped: no payments to poll")
+                continue
+            wsgi, asgi = results['wsgi'][name], results['asgi'][name]
+            ratio = asgi['rps'] / wsgi['rps'] if wsgi['rps'] else 0
+            self.stdout.write(
+                f"{name:<16}{wsgi['rps']:>12.1f}{wsgi['p95_ms']:>9.1f}{asgi['rps']:>12.1f}"
+                f"{asgi['p95_ms']:>9.1f}{ratio:>10.2f}x{wsgi['errors'] + asgi['errors']:>6}"
+            )
+        self.stdout.write(
+            f"{options['concurrency']} clients; WSGI had {options['threads']} worker threads, "
+            "ASGI one event loop. Latency includes waiting for a free worker."
+        )
+
+    def _run_mode(self, mode, options):
+        """Runs this command with --serve in a fresh process, so each mode gets its own URLconf."""
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_asgi', '--serve', mode,
+            '--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+            '--threads', str(options['threads']),
+        ]
+        for name in options['routes'] or []:
+            command += ['--route', name]
+        env = {**os.environ, 'ASYNC_VIEWS': 'true' if mode == 'asgi' else 'false'}
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"The {mode} run failed:\n{result.stderr}")
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def _measure_mode(self, mode, routes, options):
+        profile = StudentProfile.objects.select_related('user').order_by('id').first()
+        if profile is None:
+            raise CommandError("No students to log in as; run seed_data first")
+        payment = PaymentRequest.objects.order_by('-id').first()
+
+        results = {}
+        for name in routes:
+            if name == 'payment_status' and payment is None:
+                continue
+            kwargs = {'reference': payment.reference} if name == 'payment_status' else {}
+            url = reverse(f'main:{name}', kwargs=kwargs)
+            measure = _measure_asgi if mode == 'asgi' else _measure_wsgi
+            # The test clients always send Host: testserver
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                timings, errors, elapsed = measure(url, profile.user, options)
+            timings.sort()
+            results[name] = {
+                'requests': len(timings),
+                'errors': errors,
+                'rps': len(timings) / elapsed if elapsed else 0,
+                'p50_ms': _percentile(timings, 50) * 1000,
+                'p95_ms': _percentile(timings, 95) * 1000,
+            }
+        connection.close()
+        return results
+
+
+def _shares(total, clients):
+    return [total // clients + (1 if i < total % clients else 0) for i in range(clients)]
+
+
+def _measure_wsgi(url, user, options):
+    # Clients beyond --threads queue for a worker, as they would at a gthread server
+    workers = threading.BoundedSemaphore(options['threads'])
+    timings = []
+    errors = []
+    ready = threading.Barrier(options['concurrency'] + 1)
+
+    def client_loop(count):
+        try:
+            client = Client()
+            client.force_login(user)
+            client.get(url)
+        finally:
+            ready.wait()
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                with workers:
+                    response = client.get(url)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+                else:
+                    timings.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=client_loop, args=(count,))
+        for count in _shares(options['requests'], options['concurrency'])
+    ]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return timings, len(errors), time.perf_counter() - start
+
+
+def _measure_asgi(url, user, options):
+    timings = []
+    errors = []
+    clients = []
+    for _ in range(options['concurrency']):
+        client = AsyncClient()
+        client.force_login(user)
+        clients.append(client)
+
+    async def get(client):
+        # Each request gets its own sync thread, as under Django's ASGIHandler
+        async with ThreadSensitiveContext():
+            return await client.get(url)
+
+    async def client_loop(client, count):
+        for _ in range(count):
+            start = time.perf_counter()
+            response = await get(client)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+            else:
+                timings.append(time.perf_counter() - start)
+
+    async def run():
+        await asyncio.gather(*(get(client) for client in clients))
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, count) for client, count in zip(clients, _shares(options['requests'], len(clients)))
+        ))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    return timings, len(errors), elapsed
@@ -0,0 +1,94 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.signals import user_login_failed
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from main.management.commands.benchmark import _percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulates a credential-stuffing burst against the login page, with and without the rate "
+        "limits in settings.RATE_LIMITS['login']: --concurrency clients post --requests wrong "
+        "passwords for made-up usernames from --ips addresses. Reports the CPU time the server "
+        "process spent, how many attempts reached the password hasher, and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help="Login attempts per run (default 300).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Attacking clients at once (default 8).")
+        parser.add_argument('--ips', type=int, default=4, help="Addresses the attack comes from (default 4).")
+        parser.add_argument('--usernames', type=int, default=100,
+                            help="Distinct usernames tried, round robin (default 100).")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['requests']} attempts from {options['ips']} addresses against "
+            f"{options['usernames']} usernames, {options['concurrency']} at a time"
+        )
+        self.stdout.write(
+            f"{'limits':<8}{'req/s':>9}{'CPU s':>8}{'CPU ms/req':>12}{'hashed':>8}{'429s':>7}{'p95 ms':>9}"
+        )
+        results = {}
+        for run, enabled in enumerate((False, True)):
+            with override_settings(RATE_LIMITS_ENABLED=enabled, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                result = results[enabled] = _attack(run, options)
+            self.stdout.write(
+                f"{'on' if enabled else 'off':<8}{result['rps']:>9.1f}{result['cpu']:>8.2f}"
+                f"{result['cpu'] / options['requests'] * 1000:>12.2f}{result['hashed']:>8}"
+                f"{result['refused']:>7}{result['p95_ms']:>9.1f}"
+            )
+        if results[False]['cpu']:
+            saved = 1 - results[True]['cpu'] / results[False]['cpu']
+            self.stdout.write(f"The limits saved {saved:.0%} of the CPU time spent on the attack.")
+
+
+def _attack(run, options):
+    url = reverse('main:login')
+    timings = []
+    refused = []
+    hashed = []
+
+    def count_failure(sender, **kwargs):
+        hashed.append(1)
+
+    def client_loop(worker):
+        # Addresses and usernames differ between runs so the second starts with empty counters
+        client = Client(REMOTE_ADDR=f'198.51.{run}.{worker % options["ips"] + 1}')
+        try:
+            for i in range(worker, options['requests'], options['concurrency']):
+                start = time.perf_counter()
+                response = client.post(url, {
+                    'username': f'stuffed-{run}-{i % options["usernames"]}', 'password': f'guess-{i}',
+                })
+                timings.append(time.perf_counter() - start)
+                if response.status_code == 429:
+                    refused.append(1)
+        finally:
+            connection.close()
+
+    user_login_failed.connect(count_failure)
+    threads = [threading.Thread(target=client_loop, args=(worker,)) for worker in range(options['concurrency'])]
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    user_login_failed.disconnect(count_failure)
+
+    timings.sort()
+    return {
+        'rps': len(timings) / elapsed if elapsed else 0,
+        'cpu': cpu,
+        'hashed': len(hashed),
+        'refused': len(refused),
+        'p95_ms': _percentile(timings, 95) * 1000,
+    }
@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.models import StudentProfile
+from main.management.commands.benchmark import _describe_database, _percentile
+from main.management.commands.benchmark_asgi import _measure_wsgi
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares authenticated dashboard throughput with sessions in the database (db), the cache in "
+        "front of the database (cached_db) and the cache alone (cache). Each profile runs in its own "
+        "process, with --concurrency logged-in clients sending --requests requests between them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Dashboard requests per profile (default 2000).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Clients at once (default 8).")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="Worker threads, like gunicorn --threads (default 8).")
+        parser.add_argument('--profile', action='append', dest='profiles', choices=settings.SESSION_ENGINES,
+                            help="Only benchmark this session profile (repeatable).")
+        parser.add_argument('--serve', action='store_true', help="Internal: measure the configured profile as JSON.")
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            self.stdout.write(json.dumps(self._measure(options)))
+            return
+
+        self.stdout.write(f"Database: {_describe_database()}; session cache: {settings.SESSION_CACHE_BACKEND}")
+        self.stdout.write(
+            f"{'profile':<12}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'session q':>11}{'errs':>6}"
+        )
+        for profile in options['profiles'] or settings.SESSION_ENGINES:
+            result = self._run_profile(profile, options)
+            self.stdout.write(
+                f"{profile:<12}{result['rps']:>9.1f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                f"{result['queries']:>9}{result['session_queries']:>11}{result['errors']:>6}"
+            )
+        self.stdout.write("queries and session q are per dashboard request, after the first.")
+
+    def _run_profile(self, profile, options):
+        """Runs this command with --serve in a fresh process, so the profile's settings apply from the start."""
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_sessions', '--serve',
+            '--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+            '--threads', str(options['threads']),
+        ]
+        result = subprocess.run(command, env={**os.environ, 'SESSION_PROFILE': profile}, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"The {profile} run failed:\n{result.stderr}")
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def _measure(self, options):
+        profile = StudentProfile.objects.select_related('user').order_by('id').first()
+        if profile is None:
+            raise CommandError("No students to log in as; run seed_data first")
+        url = reverse('main:dashboard')
+
+        # The test clients always send Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            client = Client()
+            client.force_login(profile.user)
+            client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url)
+            timings, errors, elapsed = _measure_wsgi(url, profile.user, options)
+        timings.sort()
+        connection.close()
+        return {
+            'requests': len(timings),
+            'errors': errors,
+            'rps': len(timings) / elapsed if elapsed else 0,
+            'p50_ms': _percentile(timings, 50) * 1000,
+            'p95_ms': _percentile(timings, 95) * 1000,
+            'queries': len(queries),
+            'session_queries': sum('django_session' in query['sql'] for query in queries),
+        }
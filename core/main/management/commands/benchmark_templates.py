@@ -0,0 +1,83 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Engine, RequestContext, engines
+from django.test import RequestFactory, override_settings
+
+from main.models import Mentor, Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Times rendering the projects and mentors pages with --cards cards each: as before (templates "
+        "parsed on every render, no fragment caching), then with the cached template loader while every "
+        "card fragment misses (cold) and once they are all cached (warm)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=1000, help="Cards per page (default 1000).")
+        parser.add_argument('--rounds', type=int, default=20, help="Renders per measurement (default 20).")
+
+    def handle(self, *args, **options):
+        cards = options['cards']
+        pages = [
+            ('main/projects.html', 'projects', list(
+                Project.objects.select_related('student__user', 'freelancer__user', 'organization')
+                .prefetch_related('skill_tags').order_by('-created_at', '-id')[:cards]
+            )),
+            ('main/mentor.html', 'mentors', list(
+                Mentor.objects.select_related('user__profile').order_by('full_name', 'id')[:cards]
+            )),
+        ]
+        if not pages[0][2]:
+            raise CommandError("No projects to render; run seed_data first")
+
+        cached = engines['django'].engine
+        # The same engine without the cached loader
+        uncached = Engine(
+            dirs=cached.dirs,
+            loaders=settings.TEMPLATE_LOADERS,
+            context_processors=cached.context_processors,
+            libraries=cached.libraries,
+        )
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        # {% cache %} uses the template_fragments cache when there is one; a dummy one disables it
+        no_fragments = override_settings(CACHES={
+            **settings.CACHES,
+            'template_fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        })
+
+        self.stdout.write(f"{'page':<22}{'cards':>6}{'before':>10}{'cold':>10}{'warm':>10}{'speedup':>9}")
+        for name, key, objects in pages:
+            context = {key: objects, 'page': None, 'skill': '', 'is_mentor': False}
+
+            def render(engine, clear):
+                if clear:
+                    cache.clear()
+                return engine.get_template(name).render(RequestContext(request, context))
+
+            with no_fragments:
+                before = self._time(options['rounds'], render, uncached, False)
+            cold = self._time(options['rounds'], render, cached, True)
+            render(cached, False)
+            warm = self._time(options['rounds'], render, cached, False)
+            self.stdout.write(
+                f"{name:<22}{len(objects):>6}{before:>8.1f}ms{cold:>8.1f}ms{warm:>8.1f}ms{before / warm:>8.1f}x"
+            )
+        self.stdout.write("Times are the median of each set of renders; queries are not included.")
+        cache.clear()
+
+    def _time(self, rounds, render, *args):
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            render(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2]
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.sessions import BATCH_SIZE, clear_expired_sessions, uses_session_table
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired sessions from the database in batches. Run it from cron; "
+        "with SESSION_PROFILE=cache there is nothing to delete."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f"Sessions per DELETE (default {BATCH_SIZE}).")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to wait between batches (default 0).")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+        if options['pause'] < 0:
+            raise CommandError("--pause cannot be negative")
+        if not uses_session_table():
+            self.stdout.write("Sessions are kept in the cache, which expires them itself")
+            return
+        deleted = clear_expired_sessions(options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired sessions"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main.transfer import export_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams users and all platform data to NDJSON chunk files in a directory. "
+        "Re-run the same command to resume an interrupted export."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--chunk-size', type=int, default=100000, help="Rows per file (default 100000).")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows fetched per query (default 2000).")
+        parser.add_argument('--gzip', action='store_true', help="Compress the chunk files.")
+
+    def handle(self, *args, **options):
+        manifest = export_data(
+            options['directory'], chunk_size=options['chunk_size'], compress=options['gzip'],
+            batch_size=options['batch_size'], progress=self.stdout.write,
+        )
+        total = sum(entry['rows'] for entry in manifest['models'])
+        self.stdout.write(self.style.SUCCESS(f"Exported {total} rows to {options['directory']}"))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.fake_daraja import FakeDaraja
+
+
+class Command(BaseCommand):
+    help = "Runs a local fake Daraja API. Point MPESA_API_BASE_URL at it to test payments offline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--callback-delay', type=float, default=None,
+                            help="Post a successful result to each push's CallBackURL after this many seconds.")
+
+    def handle(self, *args, **options):
+        with FakeDaraja(port=options['port'], callback_delay=options['callback_delay']) as daraja:
+            self.stdout.write(self.style.SUCCESS(f"Fake Daraja listening on {daraja.url} (Ctrl+C to stop)"))
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
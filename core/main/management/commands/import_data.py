@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.counters import recount_project_counts
+from main.recommendations import rebuild_recommendations
+from main.search import rebuild_index
+from main.skills import invalidate_skill_gap_summary
+from main.stats import invalidate_dashboard_stats
+from main.transfer import IMPORT_STATE, TransferError, import_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports a directory written by export_data, giving rows new ids and remapping foreign keys. "
+        "Re-run the same command to resume an interrupted import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows per INSERT (default 500).")
+        parser.add_argument('--state', help=f"Id map and checkpoint file (default: DIRECTORY/{IMPORT_STATE}).")
+        parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of an earlier run.")
+        parser.add_argument('--no-search-index', action='store_true', help="Skip rebuilding the search index.")
+        parser.add_argument('--no-recommendations', action='store_true', help="Skip recomputing recommendations.")
+
+    def handle(self, *args, **options):
+        state_path = options['state'] or os.path.join(options['directory'], IMPORT_STATE)
+        if options['restart'] and os.path.exists(state_path):
+            os.remove(state_path)
+        try:
+            inserted = import_data(
+                options['directory'], batch_size=options['batch_size'], state_path=state_path,
+                progress=self.stdout.write,
+            )
+        except TransferError as e:
+            raise CommandError(str(e))
+
+        # bulk_create skips the signals that keep these up to date
+        self.stdout.write("Counting projects per student...")
+        recount_project_counts()
+        if not options['no_search_index']:
+            self.stdout.write("Rebuilding the search index...")
+            rebuild_index()
+        if not options['no_recommendations']:
+            self.stdout.write("Recomputing recommendations...")
+            rebuild_recommendations()
+        invalidate_dashboard_stats()
+        invalidate_skill_gap_summary()
+        self.stdout.write(self.style.SUCCESS(f"Imported {sum(inserted.values())} new rows"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main.avatars import make_missing_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        "Makes the thumbnails of avatars that have none, e.g. when the process stopped "
+        "before their background job ran. Safe to run at any time."
+    )
+
+    def handle(self, *args, **options):
+        fixed, errors = make_missing_thumbnails()
+        for profile_id, error in errors:
+            self.stderr.write(f"Profile {profile_id}: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Made thumbnails for {fixed} avatars"))
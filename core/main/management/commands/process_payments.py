@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import PaymentRequest
+from main.payments import claimable, send_stk_push
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends STK pushes still queued, e.g. ones left behind when a web worker restarted, "
+        "and ones whose worker crashed before trying them (see MPESA_PROCESSING_LEASE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=30,
+                            help="Only pick up payments queued at least this many seconds ago (default 30).")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting once drained.")
+        parser.add_argument('--interval', type=int, default=10, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            cutoff = timezone.now() - timedelta(seconds=options['older_than'])
+            ids = list(
+                PaymentRequest.objects.filter(claimable(), created_at__lte=cutoff)
+                .order_by('created_at')
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            for payment_id in ids:
+                send_stk_push(payment_id)
+            if ids:
+                self.stdout.write(f"Processed {len(ids)} payments")
+            if not options['loop']:
+                break
+            if not ids:
+                time.sleep(options['interval'])
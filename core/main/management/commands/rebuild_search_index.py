@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index for projects, mentors and freelancers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} documents"))
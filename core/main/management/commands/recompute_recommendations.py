@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.recommendations import BATCH_SIZE, rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = "Recomputes every student's recommended mentors, projects and freelancers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Students scored per batch.")
+
+    def handle(self, *args, **options):
+        total = rebuild_recommendations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Stored {total} recommendations"))
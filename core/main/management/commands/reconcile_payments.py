@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.payments import reconcile_payments
+
+
+class Command(BaseCommand):
+    help = "Settles STK pushes still waiting on a result, querying Daraja for the ones with no callback yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=60,
+                            help="Only query payments sent at least this many seconds ago (default 60).")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep reconciling instead of exiting after one pass.")
+        parser.add_argument('--interval', type=int, default=60, help="Seconds between passes with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            settled, queried = reconcile_payments(options['older_than'], options['batch_size'])
+            if settled or queried:
+                self.stdout.write(f"Queried {queried} pending payments, settled {settled}")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
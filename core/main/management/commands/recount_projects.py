@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.counters import recount_project_counts
+
+
+class Command(BaseCommand):
+    help = "Recomputes the project counters on every StudentProfile from the projects table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Students per UPDATE (default 5000).")
+
+    def handle(self, *args, **options):
+        fixed = recount_project_counts(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Corrected the counters of {fixed} students"))
@@ -0,0 +1,248 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from main.counters import recount_project_counts
+from main.models import Freelancer, Mentor, Organization, Project, StudentProfile, UserProfile
+from main.recommendations import rebuild_recommendations
+from main.search import rebuild_index
+from main.skills import ROLE_SKILLS, get_or_create_tags, invalidate_skill_gap_summary, normalize_skill
+from main.stats import invalidate_dashboard_stats
+
+
+# Share of generated users per role
+ROLE_WEIGHTS = {'student': 70, 'freelancer': 15, 'organization': 10, 'mentor': 5}
+
+# Projects per student: most have one or two, a few are prolific
+PROJECT_COUNTS = [0, 1, 2, 3, 4, 6, 10]
+PROJECT_COUNT_WEIGHTS = [15, 35, 25, 12, 7, 4, 2]
+
+PROJECT_STATUS_WEIGHTS = {'ongoing': 55, 'completed': 35, 'paused': 10}
+EXPERTISE_WEIGHTS = {'technology': 55, 'business': 20, 'design': 15, 'other': 10}
+
+INSTITUTIONS = [
+    'University of Nairobi', 'Kenyatta University', 'Strathmore University', 'JKUAT',
+    'Moi University', 'Egerton University', 'Maseno University', 'Technical University of Kenya',
+    'USIU-Africa', 'Multimedia University',
+]
+COURSES = [
+    'Computer Science', 'Information Technology', 'Software Engineering', 'Statistics',
+    'Economics', 'Finance', 'Electrical Engineering', 'Graphic Design', 'Business IT',
+]
+PROFESSIONS = ['Web Developer', 'Data Analyst', 'Designer', 'Mobile Developer', 'DevOps Engineer', 'Copywriter']
+ORGANIZATION_TYPES = ['Startup', 'NGO', 'Corporation', 'SME', 'Government']
+INDUSTRIES = ['Technology', 'Finance', 'Agriculture', 'Health', 'Education', 'Logistics']
+PROJECT_NOUNS = ['Portal', 'Dashboard', 'Tracker', 'Marketplace', 'Chatbot', 'API', 'Analyser', 'App']
+PROJECT_TOPICS = ['Farm', 'Matatu', 'Clinic', 'School', 'Savings', 'Rental', 'Market', 'Weather', 'Library']
+
+# Every skill the skill gap analyser knows about, plus a long tail
+SKILLS = list(dict.fromkeys(
+    [skill for skills in ROLE_SKILLS.values() for skill in skills]
+    + ['Flask', 'Node.js', 'TypeScript', 'PostgreSQL', 'MongoDB', 'Power BI', 'Tableau', 'Go',
+       'Rust', 'C++', 'Flutter', 'Swift', 'Photoshop', 'Illustrator', 'Copywriting', 'SEO']
+))
+# Zipf-like popularity: the first skills are far more common than the tail
+SKILL_WEIGHTS = [1 / (rank + 1) for rank in range(len(SKILLS))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates synthetic users, role profiles, skills and projects with bulk_create, for load testing. "
+        "Signals do not fire, so skill tags are linked here and the project counters, search index "
+        "and recommendations are rebuilt at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help="Users to create (default 10000).")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Users per transaction (default 2000).")
+        parser.add_argument('--prefix', default='seed', help="Username prefix (default 'seed').")
+        parser.add_argument('--password', help="Password for every generated user (default: unusable).")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed, for repeatable datasets.")
+        parser.add_argument('--no-search-index', action='store_true', help="Skip rebuilding the search index.")
+        parser.add_argument('--no-recommendations', action='store_true', help="Skip recomputing recommendations.")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--users and --batch-size must be positive")
+        self.random = random.Random(options['seed'])
+        # Hashed once and shared: hashing per user would take longer than all the inserts
+        self.password = make_password(options['password'])
+        self.now = timezone.now()
+        self.prefix = options['prefix']
+        self.next_number = User.objects.filter(username__startswith=self.prefix).count()
+        tags = {tag.normalized: tag.id for tag in get_or_create_tags(SKILLS)}
+        self.tag_ids = {name: tags[normalize_skill(name)] for name in SKILLS}
+
+        started = time.monotonic()
+        totals = {'users': 0, 'projects': 0}
+        remaining = options['users']
+        while remaining:
+            size = min(remaining, options['batch_size'])
+            with transaction.atomic():
+                created = self.create_batch(size)
+            for key in totals:
+                totals[key] += created[key]
+            remaining -= size
+            rate = totals['users'] / (time.monotonic() - started)
+            self.stdout.write(f"{totals['users']} users, {totals['projects']} projects ({rate:.0f} users/s)")
+
+        self.stdout.write("Counting projects per student...")
+        recount_project_counts()
+        if not options['no_search_index']:
+            self.stdout.write("Rebuilding the search index...")
+            rebuild_index()
+        if not options['no_recommendations']:
+            self.stdout.write("Recomputing recommendations...")
+            rebuild_recommendations()
+        invalidate_dashboard_stats()
+        invalidate_skill_gap_summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {totals['users']} users and {totals['projects']} projects "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
+
+    def create_batch(self, size):
+        rng = self.random
+        roles = rng.choices(list(ROLE_WEIGHTS), weights=list(ROLE_WEIGHTS.values()), k=size)
+        users = []
+        for role in roles:
+            number = self.next_number
+            self.next_number += 1
+            joined = self.now - timedelta(days=rng.randint(0, 3 * 365), seconds=rng.randint(0, 86400))
+            users.append(User(
+                username=f'{self.prefix}{role[:3]}{number}',
+                email=f'{self.prefix}{number}@example.com',
+                first_name=role.title(),
+                last_name=str(number),
+                password=self.password,
+                date_joined=joined,
+                # About two thirds have been active in the last three months
+                last_login=self.now - timedelta(minutes=rng.randint(0, 90 * 1440)) if rng.random() < 0.65 else None,
+            ))
+        users = User.objects.bulk_create(users)
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, role=role, phone=f'2547{rng.randint(0, 99999999):08d}')
+            for user, role in zip(users, roles)
+        ])
+
+        by_role = {role: [] for role in ROLE_WEIGHTS}
+        for user, role in zip(users, roles):
+            by_role[role].append(user)
+
+        students = self.create_students(by_role['student'])
+        projects = self.create_projects(students)
+        self.create_freelancers(by_role['freelancer'])
+        self.create_mentors(by_role['mentor'])
+        self.create_organizations(by_role['organization'])
+        return {'users': len(users), 'projects': projects}
+
+    def pick_skills(self, low, high):
+        count = self.random.randint(low, high)
+        return list(dict.fromkeys(self.random.choices(SKILLS, weights=SKILL_WEIGHTS, k=count)))
+
+    def create_students(self, users):
+        rng = self.random
+        skills = [self.pick_skills(2, 8) for _ in users]
+        students = StudentProfile.objects.bulk_create([
+            StudentProfile(
+                user=user,
+                year_of_study=rng.randint(1, 4),
+                course=rng.choice(COURSES),
+                institution=rng.choice(INSTITUTIONS),
+                email=user.email,
+                skills=', '.join(names),
+            )
+            for user, names in zip(users, skills)
+        ])
+        Through = StudentProfile.skill_tags.through
+        Through.objects.bulk_create([
+            Through(studentprofile_id=student.id, skilltag_id=self.tag_ids[name])
+            for student, names in zip(students, skills) for name in names
+        ])
+        return list(zip(students, skills))
+
+    def create_projects(self, students):
+        rng = self.random
+        projects = []
+        project_skills = []
+        for student, skills in students:
+            count = rng.choices(PROJECT_COUNTS, weights=PROJECT_COUNT_WEIGHTS)[0]
+            for _ in range(count):
+                names = rng.sample(skills, min(len(skills), rng.randint(1, 4)))
+                start = date.today() - timedelta(days=rng.randint(0, 2 * 365))
+                status = rng.choices(list(PROJECT_STATUS_WEIGHTS), weights=list(PROJECT_STATUS_WEIGHTS.values()))[0]
+                projects.append(Project(
+                    student=student,
+                    title=f'{rng.choice(PROJECT_TOPICS)} {rng.choice(PROJECT_NOUNS)}',
+                    description=f'A {", ".join(names)} project built by a {student.course} student.',
+                    skills_used=', '.join(names),
+                    status=status,
+                    start_date=start,
+                    end_date=start + timedelta(days=rng.randint(14, 180)) if status == 'completed' else None,
+                ))
+                project_skills.append(names)
+        projects = Project.objects.bulk_create(projects)
+        Through = Project.skill_tags.through
+        Through.objects.bulk_create([
+            Through(project_id=project.id, skilltag_id=self.tag_ids[name])
+            for project, names in zip(projects, project_skills) for name in names
+        ])
+        return len(projects)
+
+    def create_freelancers(self, users):
+        rng = self.random
+        skills = [self.pick_skills(3, 10) for _ in users]
+        freelancers = Freelancer.objects.bulk_create([
+            Freelancer(
+                user=user,
+                full_name=f'{user.first_name} {user.last_name}',
+                profession=rng.choice(PROFESSIONS),
+                specialization=names[0],
+                years_of_experience=rng.randint(0, 15),
+                hourly_rate=rng.randrange(500, 5000, 100),
+                email=user.email,
+                skills=', '.join(names),
+            )
+            for user, names in zip(users, skills)
+        ])
+        Through = Freelancer.skill_tags.through
+        Through.objects.bulk_create([
+            Through(freelancer_id=freelancer.id, skilltag_id=self.tag_ids[name])
+            for freelancer, names in zip(freelancers, skills) for name in names
+        ])
+
+    def create_mentors(self, users):
+        rng = self.random
+        Mentor.objects.bulk_create([
+            Mentor(
+                user=user,
+                full_name=f'{user.first_name} {user.last_name}',
+                job_title=rng.choice(PROFESSIONS),
+                company=f'{rng.choice(INDUSTRIES)} Ltd',
+                expertise_area=rng.choices(list(EXPERTISE_WEIGHTS), weights=list(EXPERTISE_WEIGHTS.values()))[0],
+                years_of_experience=rng.randint(3, 25),
+                availability=rng.choice(['Available', 'Weekends', 'Evenings', 'Busy']),
+                hourly_rate=rng.randrange(1000, 10000, 500),
+                email=user.email,
+            )
+            for user in users
+        ])
+
+    def create_organizations(self, users):
+        rng = self.random
+        Organization.objects.bulk_create([
+            Organization(
+                user=user,
+                organization_name=f'{rng.choice(PROJECT_TOPICS)} {rng.choice(["Labs", "Group", "Foundation", "Hub"])} {user.last_name}',
+                organization_type=rng.choice(ORGANIZATION_TYPES),
+                industry=rng.choice(INDUSTRIES),
+                email=user.email,
+            )
+            for user in users
+        ])
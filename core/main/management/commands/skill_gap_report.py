@@ -0,0 +1,77 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import StudentProfile
+from main.skills import ROLE_SKILLS, SkillGapMatrix
+
+
+class Command(BaseCommand):
+    help = "Scores every student against every target role and writes a skill gap report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--role', action='append', dest='roles', choices=list(ROLE_SKILLS),
+                            help="Limit the report to this role (repeatable). Defaults to all roles.")
+        parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+        parser.add_argument('--summary', action='store_true',
+                            help="Only write per-role cohort statistics, not one row per student.")
+        parser.add_argument('--output', help="File to write to. Defaults to stdout.")
+
+    def handle(self, *args, **options):
+        roles = options['roles'] or list(ROLE_SKILLS)
+        matrix = SkillGapMatrix({role: ROLE_SKILLS[role] for role in roles})
+        masks = matrix.student_masks()
+
+        out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            if options['summary']:
+                self.write_summary(out, matrix.summary(masks), options['format'])
+            else:
+                self.write_students(out, matrix, masks, options['format'])
+        except BrokenPipeError:
+            raise CommandError("Output closed early")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Scored {len(masks)} students against {len(roles)} roles -> {options['output']}"
+            ))
+
+    def write_summary(self, out, summary, fmt):
+        if fmt == 'json':
+            json.dump(summary, out, indent=2)
+            out.write('\n')
+            return
+        writer = csv.writer(out)
+        writer.writerow(['role', 'students', 'average_progress', 'ready', 'most_missing'])
+        for role, stats in summary.items():
+            most_missing = '; '.join(f'{skill} ({n})' for skill, n in stats['most_missing'][:5])
+            writer.writerow([role, stats['students'], stats['average_progress'], stats['ready'], most_missing])
+
+    def write_students(self, out, matrix, masks, fmt):
+        usernames = StudentProfile.objects.order_by('id').values_list('id', 'user__username')
+        if fmt == 'csv':
+            writer = csv.writer(out)
+            writer.writerow(['student_id', 'username', 'role', 'progress_percentage', 'matching', 'missing'])
+        for student_id, username in usernames.iterator(chunk_size=5000):
+            scores = matrix.score(masks.get(student_id, 0))
+            if fmt == 'json':
+                # One JSON object per line so large cohorts can be streamed
+                out.write(json.dumps({
+                    'student_id': student_id,
+                    'username': username,
+                    'roles': {role: {
+                        'progress_percentage': r['progress_percentage'],
+                        'missing_skills': r['missing_skills'],
+                    } for role, r in scores.items()},
+                }) + '\n')
+                continue
+            for role, result in scores.items():
+                writer.writerow([
+                    student_id, username, role, result['progress_percentage'],
+                    '; '.join(result['matching_skills']), '; '.join(result['missing_skills']),
+                ])
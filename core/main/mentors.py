@@ -0,0 +1,74 @@
+"""
+The mentor directory: filters, keyset pagination in name order and
+cached facet counts.
+
+Every filter narrows an indexed walk in (full_name, id) order, so a page
+costs about the same however many mentors there are. The facet counts
+behind the filter menus are the same for every visitor and change only
+when a mentor does, so they are cached and dropped by the mentor signals.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+
+from .avatars import avatar_urls
+from .models import Mentor
+
+
+MENTOR_ORDERING = ('full_name', 'id')
+MENTOR_FACETS_KEY = 'main:mentor_facets'
+MENTOR_FACETS_TTL = 600
+
+
+def filter_mentors(queryset, filters):
+    """Applies the cleaned fields of a MentorFilterForm; empty fields are ignored."""
+    lookups = {
+        'expertise': 'expertise_area',
+        'availability': 'availability',
+        'min_years': 'years_of_experience__gte',
+        'max_years': 'years_of_experience__lte',
+        'min_rate': 'hourly_rate__gte',
+        'max_rate': 'hourly_rate__lte',
+    }
+    conditions = {
+        lookup: filters[name] for name, lookup in lookups.items()
+        if filters.get(name) not in (None, '')
+    }
+    return queryset.filter(**conditions)
+
+
+def get_mentor_facets():
+    """
+    {'expertise': {area: mentors}, 'availability': {value: mentors}, 'total': mentors},
+    counted in one GROUP BY and cached for MENTOR_FACETS_TTL seconds.
+    """
+    facets = cache.get(MENTOR_FACETS_KEY)
+    if facets is None:
+        facets = {'expertise': {}, 'availability': {}, 'total': 0}
+        rows = (
+            Mentor.objects.order_by().values_list('expertise_area', 'availability')
+            .annotate(n=Count('id'))
+        )
+        for area, availability, n in rows:
+            facets['expertise'][area] = facets['expertise'].get(area, 0) + n
+            facets['availability'][availability] = facets['availability'].get(availability, 0) + n
+            facets['total'] += n
+        cache.set(MENTOR_FACETS_KEY, facets, MENTOR_FACETS_TTL)
+    return facets
+
+
+def invalidate_mentor_facets():
+    cache.delete(MENTOR_FACETS_KEY)
+
+
+def mentor_json(mentor):
+    return {
+        'id': mentor.id,
+        'full_name': mentor.full_name,
+        'job_title': mentor.job_title,
+        'company': mentor.company,
+        'expertise_area': mentor.expertise_area,
+        'years_of_experience': mentor.years_of_experience,
+        'availability': mentor.availability,
+        'hourly_rate': str(mentor.hourly_rate) if mentor.hourly_rate is not None else None,
+        'avatar': avatar_urls(mentor.user),
+    }
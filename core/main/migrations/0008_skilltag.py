@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_project_freelancer_project_organization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkillTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('normalized', models.CharField(help_text='Case-folded name used for lookups', max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='freelancer',
+            name='skill_tags',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='freelancers', to='main.skilltag'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='skill_tags',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='projects', to='main.skilltag'),
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='skill_tags',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='students', to='main.skilltag'),
+        ),
+    ]
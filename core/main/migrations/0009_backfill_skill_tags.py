@@ -0,0 +1,67 @@
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+# (model, comma-separated text field)
+SOURCES = [
+    ('StudentProfile', 'skills'),
+    ('Freelancer', 'skills'),
+    ('Project', 'skills_used'),
+]
+
+
+def parse_skills(text):
+    # Mirrors main.skills.parse_skills as of this migration
+    names = {}
+    for part in (text or '').split(','):
+        name = ' '.join(part.split())
+        # Casefolded before truncating, like normalize_skill(name)[:100]
+        key = name.casefold()[:100]
+        if key and key not in names:
+            names[key] = name[:100]
+    return names
+
+
+def backfill_skill_tags(apps, schema_editor):
+    SkillTag = apps.get_model('main', 'SkillTag')
+
+    parsed = {}
+    vocabulary = {}
+    for model_name, field in SOURCES:
+        Model = apps.get_model('main', model_name)
+        rows = Model.objects.exclude(**{field: ''}).values_list('id', field)
+        parsed[model_name] = []
+        for pk, text in rows.iterator(chunk_size=BATCH_SIZE):
+            names = parse_skills(text)
+            for key, name in names.items():
+                vocabulary.setdefault(key, name)
+            parsed[model_name].append((pk, list(names)))
+
+    SkillTag.objects.bulk_create(
+        [SkillTag(name=name, normalized=key) for key, name in vocabulary.items()],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    tag_ids = dict(SkillTag.objects.values_list('normalized', 'id'))
+
+    for model_name, _ in SOURCES:
+        Through = apps.get_model('main', model_name).skill_tags.through
+        owner = f'{model_name.lower()}_id'
+        links = [
+            Through(**{owner: pk, 'skilltag_id': tag_ids[key]})
+            for pk, keys in parsed[model_name]
+            for key in keys
+        ]
+        Through.objects.bulk_create(links, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_skilltag'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_skill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,107 @@
+from django.db import OperationalError, migrations, transaction
+
+
+SQLITE_FORWARDS = [
+    """CREATE VIRTUAL TABLE main_searchdocument_fts USING fts5(
+        title, body,
+        content='main_searchdocument', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER main_searchdocument_ai AFTER INSERT ON main_searchdocument BEGIN
+        INSERT INTO main_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER main_searchdocument_ad AFTER DELETE ON main_searchdocument BEGIN
+        INSERT INTO main_searchdocument_fts(main_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER main_searchdocument_au AFTER UPDATE ON main_searchdocument BEGIN
+        INSERT INTO main_searchdocument_fts(main_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO main_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS main_searchdocument_au",
+    "DROP TRIGGER IF EXISTS main_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS main_searchdocument_ai",
+    "DROP TABLE IF EXISTS main_searchdocument_fts",
+]
+
+POSTGRES_FORWARDS = [
+    """ALTER TABLE main_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(body, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX main_searchdocument_vector_idx ON main_searchdocument USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARDS = [
+    "DROP INDEX IF EXISTS main_searchdocument_vector_idx",
+    "ALTER TABLE main_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def _sqlite_has_fts5(connection):
+    # Some SQLite builds ship without FTS5; main.search then falls back to LIKE
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute("CREATE VIRTUAL TABLE temp.main_fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.main_fts5_probe")
+    except OperationalError:
+        return False
+    return True
+
+
+def create_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and not _sqlite_has_fts5(connection):
+        return
+    _run(schema_editor, {'sqlite': SQLITE_FORWARDS, 'postgresql': POSTGRES_FORWARDS})
+
+
+def drop_fulltext_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_BACKWARDS, 'postgresql': POSTGRES_BACKWARDS})
+
+
+def backfill_documents(apps, schema_editor):
+    # Mirrors main.search.build_document as of this migration
+    SearchDocument = apps.get_model('main', 'SearchDocument')
+    Project = apps.get_model('main', 'Project')
+    Mentor = apps.get_model('main', 'Mentor')
+    Freelancer = apps.get_model('main', 'Freelancer')
+
+    documents = []
+    for p in Project.objects.iterator():
+        documents.append(SearchDocument(
+            kind='project', object_id=p.pk, title=p.title[:255],
+            body=f"{p.description}\n{p.skills_used}", category=p.status,
+        ))
+    for m in Mentor.objects.iterator():
+        documents.append(SearchDocument(
+            kind='mentor', object_id=m.pk, title=f"{m.full_name} - {m.job_title}"[:255],
+            body=f"{m.job_title}\n{m.company}\n{m.bio}", category=m.expertise_area,
+        ))
+    for f in Freelancer.objects.iterator():
+        documents.append(SearchDocument(
+            kind='freelancer', object_id=f.pk, title=f"{f.full_name} - {f.profession}"[:255],
+            body=f"{f.profession}\n{f.specialization}\n{f.skills}",
+        ))
+    SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_searchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_paymentrequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checkout_request_id', models.CharField(max_length=100, unique=True)),
+                ('merchant_request_id', models.CharField(blank=True, max_length=100)),
+                ('result_code', models.IntegerField()),
+                ('result_desc', models.CharField(blank=True, max_length=255)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('mpesa_receipt_number', models.CharField(blank=True, max_length=30)),
+                ('phone_number', models.CharField(blank=True, max_length=15)),
+                ('transaction_date', models.DateTimeField(blank=True, null=True)),
+                ('source', models.CharField(choices=[('callback', 'Callback'), ('query', 'Status query')], default='callback', max_length=10)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-received_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='paymentrequest',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('sent', 'Sent to phone'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# User lives in django.contrib.auth, so its index is added here. Partial
+# (SQLite and Postgres both support it): only users who have logged in
+# appear in the admin dashboard's recent logins.
+LAST_LOGIN_INDEX = (
+    "CREATE INDEX IF NOT EXISTS auth_user_last_login_idx "
+    "ON auth_user (last_login DESC) WHERE last_login IS NOT NULL"
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_paymentresult'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mentor',
+            index=models.Index(fields=['expertise_area', 'full_name'], name='mentor_expertise_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['-created_at', '-id'], name='project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['student', 'status'], name='project_student_status_idx'),
+        ),
+        migrations.RunSQL(LAST_LOGIN_INDEX, "DROP INDEX IF EXISTS auth_user_last_login_idx"),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:57
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_projects(apps, schema_editor):
+    StudentProfile = apps.get_model('main', 'StudentProfile')
+    Project = apps.get_model('main', 'Project')
+
+    def counted(status=None):
+        projects = Project.objects.filter(student=OuterRef('pk'))
+        if status:
+            projects = projects.filter(status=status)
+        return Coalesce(Subquery(projects.order_by().values('student').annotate(n=Count('pk')).values('n')), 0)
+
+    StudentProfile.objects.update(
+        project_count=counted(),
+        ongoing_project_count=counted('ongoing'),
+        completed_project_count=counted('completed'),
+        paused_project_count=counted('paused'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentprofile',
+            name='completed_project_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='ongoing_project_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='paused_project_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='project_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_projects, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_student_project_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='mentor',
+            name='mentor_expertise_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='mentor',
+            index=models.Index(fields=['full_name', 'id'], name='mentor_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mentor',
+            index=models.Index(fields=['expertise_area', 'full_name', 'id'], name='mentor_expertise_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mentor',
+            index=models.Index(fields=['availability', 'full_name', 'id'], name='mentor_availability_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mentor',
+            index=models.Index(fields=['years_of_experience'], name='mentor_experience_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mentor',
+            index=models.Index(fields=['hourly_rate'], name='mentor_rate_idx'),
+        ),
+    ]
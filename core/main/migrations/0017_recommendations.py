@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_mentor_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('mentor', 'Mentor'), ('project', 'Project'), ('freelancer', 'Freelancer')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('label', models.CharField(max_length=255)),
+                ('score', models.FloatField(help_text='Cosine similarity of the two skill vectors')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='main.studentprofile')),
+            ],
+            options={
+                'ordering': ['student_id', 'kind', 'rank'],
+                'indexes': [models.Index(fields=['student', 'kind', 'rank'], name='recommendation_student_idx'), models.Index(fields=['kind', 'object_id'], name='recommendation_object_idx')],
+            },
+        ),
+    ]
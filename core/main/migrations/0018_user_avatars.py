@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar',
+            field=models.ImageField(blank=True, editable=False, upload_to='avatars'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,3 +1,6 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -11,6 +14,10 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     phone = models.CharField(max_length=15, blank=True)
+    # Set by main.avatars: a content-hashed original under MEDIA_ROOT/AVATAR_DIR, and once
+    # a worker has resized it, {format: {size: url}} of its thumbnails
+    avatar = models.ImageField(upload_to=settings.AVATAR_DIR, blank=True, editable=False)
+    avatar_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     
     def __str__(self):
@@ -24,6 +31,12 @@ class StudentProfile(models.Model):
     email = models.EmailField()
     bio = models.TextField(blank=True)
     skills = models.TextField(help_text="Comma-separated skills") 
+    skill_tags = models.ManyToManyField('SkillTag', related_name='students', blank=True, editable=False)
+    # Kept up to date by signals (main.counters); recount_projects repairs them
+    project_count = models.PositiveIntegerField(default=0, editable=False)
+    ongoing_project_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_project_count = models.PositiveIntegerField(default=0, editable=False)
+    paused_project_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -56,6 +69,19 @@ class Skill(models.Model):
     
     def __str__(self):
         return self.name
+
+
+class SkillTag(models.Model):
+    """Canonical skill vocabulary, linked from students, freelancers and projects."""
+    name = models.CharField(max_length=100)
+    normalized = models.CharField(max_length=100, unique=True, help_text="Case-folded name used for lookups")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
     
 class Project(models.Model):
      
@@ -70,6 +96,7 @@ class Project(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     skills_used = models.TextField()
+    skill_tags = models.ManyToManyField('SkillTag', related_name='projects', blank=True, editable=False)
     github_link = models.URLField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ongoing')
     start_date = models.DateField()
@@ -79,6 +106,12 @@ class Project(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # The projects feed and admin dashboard: newest first, id breaks ties
+            models.Index(fields=['-created_at', '-id'], name='project_created_idx'),
+            # A student's projects by status (dashboard completed count)
+            models.Index(fields=['student', 'status'], name='project_student_status_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -106,6 +139,15 @@ class Mentor(models.Model):
 
     class Meta:
         ordering = ['full_name']
+        indexes = [
+            # The mentor directory walks these in (full_name, id) order, filtered or not
+            models.Index(fields=['full_name', 'id'], name='mentor_name_idx'),
+            models.Index(fields=['expertise_area', 'full_name', 'id'], name='mentor_expertise_name_idx'),
+            models.Index(fields=['availability', 'full_name', 'id'], name='mentor_availability_name_idx'),
+            # Narrow experience and rate ranges
+            models.Index(fields=['years_of_experience'], name='mentor_experience_idx'),
+            models.Index(fields=['hourly_rate'], name='mentor_rate_idx'),
+        ]
     
     def __str__(self):
         return f"{self.full_name} - {self.job_title}"
@@ -138,6 +180,7 @@ class Freelancer(models.Model):
 
     bio = models.TextField(blank=True)
     skills = models.TextField(blank=True, help_text="Comma-separated skills")
+    skill_tags = models.ManyToManyField('SkillTag', related_name='freelancers', blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -145,4 +188,138 @@ class Freelancer(models.Model):
         ordering = ['full_name']
     
     def __str__(self):
-        return f"{self.full_name} - {self.profession}"
\ No newline at end of file
+        return f"{self.full_name} - {self.profession}"
+
+class SearchDocument(models.Model):
+    """
+    One searchable row per project, mentor and freelancer.
+
+    The full-text index over title/body lives outside the ORM: an FTS5 table
+    on SQLite, a generated tsvector column on Postgres (see main.search).
+    """
+    KIND_CHOICES = [
+        ('project', 'Project'),
+        ('mentor', 'Mentor'),
+        ('freelancer', 'Freelancer'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    category = models.CharField(max_length=50, blank=True, help_text="Project status or mentor expertise area, for filtering")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'category'], name='search_kind_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.title}"
+
+
+class Recommendation(models.Model):
+    """
+    A mentor, project or freelancer whose skills match a student's,
+    precomputed by main.recommendations. Rank 0 is the best match.
+    """
+    KIND_CHOICES = [
+        ('mentor', 'Mentor'),
+        ('project', 'Project'),
+        ('freelancer', 'Freelancer'),
+    ]
+    # recommendation_student_idx covers lookups by student
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='recommendations', db_index=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    # The mentor's or freelancer's name or the project's title, so the dashboard needs no join
+    label = models.CharField(max_length=255)
+    score = models.FloatField(help_text="Cosine similarity of the two skill vectors")
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['student_id', 'kind', 'rank']
+        indexes = [
+            # A student's dashboard reads all of their rows in this order
+            models.Index(fields=['student', 'kind', 'rank'], name='recommendation_student_idx'),
+            # Who lists a mentor, project or freelancer that just changed
+            models.Index(fields=['kind', 'object_id'], name='recommendation_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} -> {self.kind}: {self.label}"
+
+
+
+class PaymentRequest(models.Model):
+    """An M-Pesa STK push, queued by the payment page and sent by a background worker."""
+    PAYMENT_TYPE_CHOICES = [
+        ('mentor_session', 'Mentor Session'),
+        ('tip_student', 'Student Tip'),
+        ('donation', 'Donation'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        # The push may have gone out, but Daraja never said; reconcile_payments settles it
+        ('pending', 'Awaiting confirmation'),
+        ('sent', 'Sent to phone'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+        ('failed', 'Failed'),
+    ]
+    reference = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='payment_requests', null=True, blank=True)
+    mentor = models.ForeignKey(Mentor, on_delete=models.SET_NULL, related_name='payment_requests', null=True, blank=True)
+    payment_type = models.CharField(max_length=20, choices=PAYMENT_TYPE_CHOICES)
+    phone_number = models.CharField(max_length=15)
+    amount = models.PositiveIntegerField()
+    description = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    merchant_request_id = models.CharField(max_length=100, blank=True)
+    checkout_request_id = models.CharField(max_length=100, blank=True, db_index=True)
+    response_description = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='payment_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_payment_type_display()} - KES {self.amount} ({self.status})"
+
+class PaymentResult(models.Model):
+    """
+    The outcome of an STK push, from Daraja's callback or a status query.
+
+    Keyed by CheckoutRequestID, so a callback delivered twice (or a query
+    racing the callback) only ever stores one row.
+    """
+    SOURCE_CHOICES = [
+        ('callback', 'Callback'),
+        ('query', 'Status query'),
+    ]
+    checkout_request_id = models.CharField(max_length=100, unique=True)
+    merchant_request_id = models.CharField(max_length=100, blank=True)
+    result_code = models.IntegerField()
+    result_desc = models.CharField(max_length=255, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    mpesa_receipt_number = models.CharField(max_length=30, blank=True)
+    phone_number = models.CharField(max_length=15, blank=True)
+    transaction_date = models.DateTimeField(null=True, blank=True)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='callback')
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-received_at']
+
+    def __str__(self):
+        return f"{self.checkout_request_id} ({self.result_code})"
@@ -0,0 +1,181 @@
+import base64
+import threading
+import time
+from datetime import datetime
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django_daraja.mpesa.exceptions import MpesaConnectionError, MpesaError
+from django_daraja.mpesa.utils import api_base_url, format_phone_number, mpesa_config
+from urllib3.exceptions import NewConnectionError
+
+
+ACCESS_TOKEN_KEY = 'main:mpesa_access_token'
+# Daraja tokens live for 3599 seconds; refresh a little early
+ACCESS_TOKEN_TTL = 50 * 60
+
+# Responses to a request Daraja turned away without acting on it: throttling
+RETRYABLE_STATUS = {429}
+
+# Gateway/server errors: Daraja may still have acted on the request
+UNCERTAIN_STATUS = {500, 502, 503, 504}
+
+
+class MpesaRetryableError(MpesaConnectionError):
+    """A request Daraja never acted on (no connection, 429, rejected token). Sending it again is safe."""
+
+
+class MpesaTokenRejected(MpesaRetryableError):
+    """Daraja rejected the cached access token (HTTP 401)."""
+
+
+class MpesaUncertainError(MpesaConnectionError):
+    """
+    A request Daraja may or may not have acted on: the connection dropped
+    after it was sent, the response timed out, or Daraja answered 5xx.
+    Sending an STK push again could prompt (and charge) the customer twice.
+    """
+
+
+def _never_sent(error):
+    """True when `error` happened before the request could reach Daraja (no connection was made)."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class DarajaClient:
+    """
+    Thin Daraja client shared by every payment worker.
+
+    Unlike django_daraja's MpesaClient it keeps one pooled HTTP session and
+    caches the OAuth token (in the Django cache and in memory), so an STK
+    push costs a single HTTP round trip. The base URL can be pointed at a
+    local fake server with MPESA_API_BASE_URL.
+    """
+
+    def __init__(self, base_url=None, timeout=None):
+        self.base_url = (base_url or getattr(settings, 'MPESA_API_BASE_URL', None) or api_base_url()).rstrip('/') + '/'
+        self.timeout = timeout or getattr(settings, 'MPESA_TIMEOUT', 10)
+        self.session = requests.Session()
+        self._token = None
+        self._token_expires = 0
+        self._lock = threading.Lock()
+
+    def access_token(self):
+        if self._token and time.monotonic() < self._token_expires:
+            return self._token
+        with self._lock:
+            if self._token and time.monotonic() < self._token_expires:
+                return self._token
+            token = cache.get(ACCESS_TOKEN_KEY)
+            if token is None:
+                token = self._fetch_token()
+                cache.set(ACCESS_TOKEN_KEY, token, ACCESS_TOKEN_TTL)
+            self._token = token
+            self._token_expires = time.monotonic() + ACCESS_TOKEN_TTL
+            return token
+
+    def _fetch_token(self):
+        try:
+            response = self._request(
+                'get', 'oauth/v1/generate?grant_type=client_credentials',
+                auth=(mpesa_config('MPESA_CONSUMER_KEY'), mpesa_config('MPESA_CONSUMER_SECRET')),
+            )
+        except MpesaUncertainError as e:
+            # Asking for a token changes nothing at Daraja, so it can always be asked again
+            raise MpesaRetryableError(str(e))
+        return response['access_token']
+
+    def _forget_token(self):
+        self._token = None
+        cache.delete(ACCESS_TOKEN_KEY)
+
+    def _request(self, method, path, **kwargs):
+        try:
+            r = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            if _never_sent(e):
+                raise MpesaRetryableError(str(e))
+            raise MpesaUncertainError(str(e))
+        if r.status_code in RETRYABLE_STATUS:
+            raise MpesaRetryableError(f'Daraja returned HTTP {r.status_code}')
+        if r.status_code in UNCERTAIN_STATUS:
+            raise MpesaUncertainError(f'Daraja returned HTTP {r.status_code}')
+        if r.status_code == 401 and 'headers' in kwargs:
+            raise MpesaTokenRejected('Daraja rejected the access token')
+        try:
+            data = r.json()
+        except ValueError:
+            raise MpesaError(f'Daraja returned HTTP {r.status_code} with a non-JSON body')
+        if r.status_code >= 400:
+            raise MpesaError(data.get('errorMessage') or f'Daraja returned HTTP {r.status_code}')
+        return data
+
+    def _post(self, path, payload):
+        headers = {'Authorization': 'Bearer ' + self.access_token()}
+        try:
+            return self._request('post', path, json=payload, headers=headers)
+        except MpesaTokenRejected:
+            # Revoked or expired early: fetch a new token on the next attempt
+            self._forget_token()
+            raise
+
+    def _password(self, timestamp):
+        if mpesa_config('MPESA_ENVIRONMENT') == 'sandbox':
+            short_code = mpesa_config('MPESA_EXPRESS_SHORTCODE')
+        else:
+            short_code = mpesa_config('MPESA_SHORTCODE')
+        password = base64.b64encode((short_code + mpesa_config('MPESA_PASSKEY') + timestamp).encode('ascii')).decode()
+        return short_code, password
+
+    def stk_push(self, phone_number, amount, account_reference, transaction_desc, callback_url):
+        """Sends the STK prompt. Returns Daraja's JSON response (MerchantRequestID, CheckoutRequestID, ...)."""
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        short_code, password = self._password(timestamp)
+        phone_number = format_phone_number(phone_number)
+        return self._post('mpesa/stkpush/v1/processrequest', {
+            'BusinessShortCode': short_code,
+            'Password': password,
+            'Timestamp': timestamp,
+            'TransactionType': 'CustomerPayBillOnline',
+            'Amount': amount,
+            'PartyA': phone_number,
+            'PartyB': short_code,
+            'PhoneNumber': phone_number,
+            'CallBackURL': callback_url,
+            'AccountReference': account_reference,
+            'TransactionDesc': transaction_desc,
+        })
+
+    def stk_query(self, checkout_request_id):
+        """
+        Asks Daraja how an STK push ended. Returns its JSON response (ResultCode, ResultDesc, ...).
+
+        While the customer has not answered the prompt yet Daraja replies
+        with HTTP 500, which surfaces here as MpesaUncertainError.
+        """
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        short_code, password = self._password(timestamp)
+        return self._post('mpesa/stkpushquery/v1/query', {
+            'BusinessShortCode': short_code,
+            'Password': password,
+            'Timestamp': timestamp,
+            'CheckoutRequestID': checkout_request_id,
+        })
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide DarajaClient."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DarajaClient()
+    return _client
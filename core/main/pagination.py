@@ -0,0 +1,120 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+PAGE_SIZE = 24
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset."""
+
+    def __init__(self, object_list, next_cursor, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return self.cursor is None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _encode_value(value):
+    # isoformat() keeps microseconds, which the (created_at, id) comparison needs
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Returns the list of values in the cursor or raises ValueError."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (TypeError, UnicodeError, json.JSONDecodeError, binascii.Error) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def _after(ordering, values):
+    """
+    Builds the "comes after this row" filter for a keyset ordering,
+    e.g. ('-created_at', '-id') ->
+    created_at <= v0 AND (created_at < v0 OR (created_at = v0 AND id < v1))
+
+    The leading range is redundant, but it lets the database seek straight
+    to the cursor in the ordering's index instead of walking it from the top.
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for previous, value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    first = ordering[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+    return bound & condition
+
+
+def seek(queryset, ordering, cursor=None):
+    """
+    Returns (`queryset` ordered by `ordering` and starting after `cursor`,
+    the cursor used). An invalid cursor falls back to the first page, and
+    None is returned in its place.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        try:
+            values = decode_cursor(cursor, len(ordering))
+            queryset = queryset.filter(_after(ordering, values))
+        except (ValueError, TypeError, ValidationError):
+            cursor = None
+    return queryset, cursor
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=PAGE_SIZE):
+    """
+    Returns a KeysetPage of `queryset` ordered by `ordering`.
+
+    The last field of `ordering` must be unique (normally the primary key)
+    so every row has a stable position. Seeking with a WHERE clause instead
+    of OFFSET keeps every page as cheap as the first one. An invalid cursor
+    falls back to the first page.
+    """
+    queryset, cursor = seek(queryset, ordering, cursor)
+
+    # Fetches one extra row to know whether there is a next page
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, f.lstrip('-')) for f in ordering])
+
+    return KeysetPage(rows, next_cursor, cursor)
@@ -0,0 +1,419 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from django_daraja.mpesa.exceptions import (
+    IllegalPhoneNumberException, MpesaConfigurationException, MpesaError,
+)
+
+from .models import PaymentRequest, PaymentResult
+from .mpesa import MpesaRetryableError, MpesaUncertainError, get_client
+from .tasks import enqueue, run_in_background
+
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_REFERENCE = 'IndustryLink'
+
+# Retrying cannot fix these; the payment fails straight away
+PERMANENT_ERRORS = (MpesaError, IllegalPhoneNumberException, MpesaConfigurationException)
+
+# Daraja ResultCodes that are not plain failures
+RESULT_SUCCESS = 0
+RESULT_CANCELLED = 1032
+
+# Daraja reports transaction times in Kenyan local time
+DARAJA_TIMEZONE = ZoneInfo('Africa/Nairobi')
+
+# Ids per IN (...) clause, well under SQLite's bound-variable limit
+SETTLE_CHUNK = 500
+
+
+def read_payment_form(data):
+    """
+    (payment_type, phone_number, amount) from the payment page's POST data,
+    or None when one is missing or invalid. Phone numbers become 254...
+    """
+    payment_type = data.get('payment_type')
+    phone_number = data.get('phone_number', '').strip()
+    try:
+        amount = int(float(data.get('amount', '')))
+    except (TypeError, ValueError, OverflowError):
+        amount = 0
+
+    if payment_type not in dict(PaymentRequest.PAYMENT_TYPE_CHOICES) or amount < 1 or not phone_number:
+        return None
+
+    if phone_number.startswith('0'):
+        phone_number = '+254' + phone_number[1:]
+    elif phone_number.startswith('+254'):
+        phone_number = phone_number[1:]
+    return payment_type, phone_number, amount
+
+
+def queue_payment(**fields):
+    """Saves a PaymentRequest and hands it to the background workers once the transaction commits."""
+    payment = PaymentRequest.objects.create(**fields)
+    enqueue(send_stk_push, payment.pk)
+    return payment
+
+
+def _lease_expired():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'MPESA_PROCESSING_LEASE', 300))
+
+
+def claimable():
+    """
+    Payments a worker may claim: queued ones, and ones claimed more than
+    MPESA_PROCESSING_LEASE seconds ago by a worker that died before its
+    first attempt, so their push was never sent.
+    """
+    return Q(status='queued') | Q(status='processing', attempts=0, updated_at__lte=_lease_expired())
+
+
+def send_stk_push(payment_id):
+    """
+    Sends one queued STK push, retrying with exponential backoff only the
+    failures that prove Daraja never acted on it (no connection, 429).
+
+    The update to 'processing' claims the row, so a payment that is
+    enqueued twice (e.g. by process_payments after a restart) is only
+    pushed to the customer's phone once. Each attempt renews the claim.
+    When Daraja may have sent the prompt after all (a timeout, a dropped
+    connection, 5xx) the payment becomes 'pending' and is never pushed
+    again; reconcile_payments settles it.
+    """
+    claimed = PaymentRequest.objects.filter(claimable(), pk=payment_id).update(
+        status='processing', updated_at=timezone.now(),
+    )
+    if not claimed:
+        return
+    payment = PaymentRequest.objects.get(pk=payment_id)
+
+    max_attempts = getattr(settings, 'MPESA_MAX_ATTEMPTS', 3)
+    backoff = getattr(settings, 'MPESA_RETRY_BACKOFF', 1.0)
+    client = get_client()
+
+    for attempt in range(1, max_attempts + 1):
+        PaymentRequest.objects.filter(pk=payment_id).update(attempts=F('attempts') + 1, updated_at=timezone.now())
+        try:
+            response = client.stk_push(
+                payment.phone_number, payment.amount, ACCOUNT_REFERENCE,
+                payment.description, settings.MPESA_CALLBACK_URL,
+            )
+        except MpesaRetryableError as e:
+            logger.warning("STK push %s attempt %s failed: %s", payment.reference, attempt, e)
+            if attempt == max_attempts:
+                _mark_failed(payment_id, str(e))
+                return
+            time.sleep(backoff * 2 ** (attempt - 1))
+        except MpesaUncertainError as e:
+            logger.warning("STK push %s attempt %s may have been sent: %s", payment.reference, attempt, e)
+            _mark_pending(payment_id, str(e))
+            return
+        except PERMANENT_ERRORS as e:
+            _mark_failed(payment_id, str(e))
+            return
+        except Exception as e:
+            _mark_failed(payment_id, repr(e))
+            raise
+        else:
+            break
+
+    accepted = str(response.get('ResponseCode')) == '0'
+    checkout_request_id = response.get('CheckoutRequestID', '')
+    PaymentRequest.objects.filter(pk=payment_id).update(
+        status='sent' if accepted else 'failed',
+        merchant_request_id=response.get('MerchantRequestID', ''),
+        checkout_request_id=checkout_request_id,
+        response_description=response.get('ResponseDescription') or response.get('errorMessage', ''),
+        updated_at=timezone.now(),
+    )
+    if accepted and checkout_request_id:
+        # The callback can beat this update; apply its result if it already landed
+        settle_payments([checkout_request_id])
+
+
+def _mark_failed(payment_id, error):
+    PaymentRequest.objects.filter(pk=payment_id).update(status='failed', last_error=error, updated_at=timezone.now())
+
+
+def _mark_pending(payment_id, error):
+    PaymentRequest.objects.filter(pk=payment_id).update(status='pending', last_error=error, updated_at=timezone.now())
+
+
+def expire_claims():
+    """
+    Marks payments whose worker died after it started pushing them as
+    'pending': the push may have reached Daraja, so it is not sent again.
+    Returns how many there were.
+    """
+    return PaymentRequest.objects.filter(
+        status='processing', attempts__gt=0, updated_at__lte=_lease_expired(),
+    ).update(status='pending', last_error='The worker sending this payment stopped', updated_at=timezone.now())
+
+
+def resolve_pending():
+    """
+    Settles 'pending' payments, whose push may have reached Daraja without
+    us learning its CheckoutRequestID, so there is nothing to query.
+
+    A successful callback names the phone number and amount, though: a
+    stored success that no payment claims, for the same phone number and
+    amount and received after the payment was made, is taken to be its
+    answer. Payments still unmatched MPESA_PENDING_TIMEOUT seconds later
+    are failed; the prompt has long expired and no money moved.
+    Returns the number settled.
+    """
+    now = timezone.now()
+    timed_out = now - timedelta(seconds=getattr(settings, 'MPESA_PENDING_TIMEOUT', 1800))
+    claimed = PaymentRequest.objects.exclude(checkout_request_id='').values('checkout_request_id')
+    matched = []
+    failed = 0
+    for payment in PaymentRequest.objects.filter(status='pending').order_by('created_at'):
+        result = (
+            PaymentResult.objects.filter(
+                result_code=RESULT_SUCCESS, amount=payment.amount, received_at__gte=payment.created_at,
+                phone_number__endswith=payment.phone_number[-9:],
+            )
+            .exclude(checkout_request_id__in=claimed)
+            .order_by('received_at')
+            .first()
+        )
+        if result is not None:
+            PaymentRequest.objects.filter(pk=payment.pk, status='pending').update(
+                status='sent', checkout_request_id=result.checkout_request_id,
+                merchant_request_id=result.merchant_request_id, updated_at=now,
+            )
+            matched.append(result.checkout_request_id)
+        elif payment.updated_at <= timed_out:
+            failed += PaymentRequest.objects.filter(pk=payment.pk, status='pending').update(
+                status='failed', response_description='M-Pesa never confirmed this payment', updated_at=now,
+            )
+    return settle_payments(matched) + failed
+
+
+def result_status(result_code):
+    """The PaymentRequest status a Daraja ResultCode settles to."""
+    if result_code == RESULT_SUCCESS:
+        return 'completed'
+    if result_code == RESULT_CANCELLED:
+        return 'cancelled'
+    return 'failed'
+
+
+def parse_callback(payload):
+    """Builds an unsaved PaymentResult from the JSON body Daraja posts to the callback URL."""
+    try:
+        callback = payload['Body']['stkCallback']
+        checkout_request_id = str(callback['CheckoutRequestID'])
+        result_code = int(callback['ResultCode'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Not an STK push callback')
+    if not checkout_request_id:
+        raise ValueError('Callback has no CheckoutRequestID')
+
+    metadata = callback.get('CallbackMetadata') or {}
+    items = {
+        item.get('Name'): item.get('Value')
+        for item in metadata.get('Item', []) if isinstance(item, dict)
+    }
+    return PaymentResult(
+        checkout_request_id=checkout_request_id[:100],
+        merchant_request_id=str(callback.get('MerchantRequestID') or '')[:100],
+        result_code=result_code,
+        result_desc=str(callback.get('ResultDesc') or '')[:255],
+        amount=_decimal(items.get('Amount')),
+        mpesa_receipt_number=str(items.get('MpesaReceiptNumber') or '')[:30],
+        phone_number=str(items.get('PhoneNumber') or '')[:15],
+        transaction_date=_transaction_date(items.get('TransactionDate')),
+        source='callback',
+    )
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value)) if value is not None else None
+    except InvalidOperation:
+        return None
+
+
+def _transaction_date(value):
+    # e.g. 20191219102115
+    try:
+        return datetime.strptime(str(value), '%Y%m%d%H%M%S').replace(tzinfo=DARAJA_TIMEZONE)
+    except (TypeError, ValueError):
+        return None
+
+
+def record_results(results):
+    """
+    Stores a batch of PaymentResults and settles their payments.
+
+    A batch costs one bulk INSERT plus one UPDATE per distinct outcome, no
+    matter how many callbacks it holds. Results already stored (duplicate
+    deliveries) are skipped by the unique CheckoutRequestID. Returns the
+    number of payments settled.
+    """
+    if not results:
+        return 0
+    PaymentResult.objects.bulk_create(results, ignore_conflicts=True, batch_size=SETTLE_CHUNK)
+    return settle_payments([result.checkout_request_id for result in results])
+
+
+def settle_payments(checkout_request_ids):
+    """
+    Moves payments still waiting on the customer ('sent') to the status of
+    their stored result. Payments that are already settled are left alone,
+    so this is safe to repeat.
+    """
+    checkout_request_ids = list(dict.fromkeys(checkout_request_ids))
+    settled = 0
+    for start in range(0, len(checkout_request_ids), SETTLE_CHUNK):
+        chunk = checkout_request_ids[start:start + SETTLE_CHUNK]
+        outcomes = defaultdict(list)
+        stored = PaymentResult.objects.filter(checkout_request_id__in=chunk).values_list(
+            'checkout_request_id', 'result_code', 'result_desc',
+        )
+        for checkout_request_id, result_code, result_desc in stored:
+            outcomes[result_status(result_code), result_desc].append(checkout_request_id)
+        for (status, description), ids in outcomes.items():
+            settled += PaymentRequest.objects.filter(checkout_request_id__in=ids, status='sent').update(
+                status=status, response_description=description, updated_at=timezone.now(),
+            )
+    return settled
+
+
+class ResultWriter:
+    """
+    Buffers callback results in memory and writes them with record_results.
+
+    A batch is written once it reaches MPESA_RESULT_BATCH_SIZE results, or
+    MPESA_RESULT_FLUSH_SECONDS after its first one arrived, on the
+    background workers. Duplicate deliveries inside a batch collapse to one
+    result. If the process dies with results still buffered, the
+    reconcile_payments command recovers them by querying Daraja.
+    """
+
+    def __init__(self):
+        self._buffer = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, result):
+        if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+            record_results([result])
+            return
+        with self._lock:
+            self._buffer.setdefault(result.checkout_request_id, result)
+            if len(self._buffer) >= getattr(settings, 'MPESA_RESULT_BATCH_SIZE', 200):
+                batch = self._take()
+            else:
+                batch = None
+                if self._timer is None:
+                    self._timer = threading.Timer(getattr(settings, 'MPESA_RESULT_FLUSH_SECONDS', 1.0), self._flush_later)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch:
+            run_in_background(record_results, batch)
+
+    def _take(self):
+        # Callers hold self._lock
+        batch = list(self._buffer.values())
+        self._buffer = {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush_later(self):
+        with self._lock:
+            self._timer = None
+            batch = self._take()
+        if batch:
+            run_in_background(record_results, batch)
+
+    def flush(self):
+        """Writes whatever is buffered, on the calling thread."""
+        with self._lock:
+            batch = self._take()
+        return record_results(batch)
+
+
+result_writer = ResultWriter()
+atexit.register(result_writer.flush)
+
+
+def result_from_query(checkout_request_id, response):
+    """Builds an unsaved PaymentResult from a stk_query response, or None if it has no result yet."""
+    try:
+        result_code = int(response['ResultCode'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return PaymentResult(
+        checkout_request_id=checkout_request_id,
+        merchant_request_id=str(response.get('MerchantRequestID') or '')[:100],
+        result_code=result_code,
+        result_desc=str(response.get('ResultDesc') or '')[:255],
+        source='query',
+    )
+
+
+def reconcile_payments(older_than=60, batch_size=100):
+    """
+    Settles payments still waiting on the customer ('sent') or on word of
+    whether their push went out at all ('pending').
+
+    Claims left by crashed workers become 'pending' first, and pending
+    payments go through resolve_pending. Results that are already stored
+    are applied next (say, a callback that landed before its
+    CheckoutRequestID was saved). Then Daraja is queried, batch_size
+    payments at a time, for those still unanswered after older_than
+    seconds. Each batch of answers goes through record_results.
+    Returns (settled, queried).
+    """
+    expire_claims()
+    settled = resolve_pending()
+    pending = PaymentRequest.objects.filter(status='sent').exclude(checkout_request_id='')
+    stored = PaymentResult.objects.filter(
+        checkout_request_id__in=pending.values('checkout_request_id'),
+    ).values_list('checkout_request_id', flat=True)
+    settled += settle_payments(stored)
+
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    client = get_client()
+    queried = 0
+    last_id = 0
+    while True:
+        batch = list(
+            pending.filter(updated_at__lte=cutoff, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'checkout_request_id')[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        results = []
+        for _, checkout_request_id in batch:
+            try:
+                response = client.stk_query(checkout_request_id)
+            except (MpesaRetryableError, MpesaUncertainError):
+                # Still waiting on the customer, or Daraja is busy; try next run
+                continue
+            except PERMANENT_ERRORS as e:
+                logger.warning("STK query for %s failed: %s", checkout_request_id, e)
+                continue
+            queried += 1
+            result = result_from_query(checkout_request_id, response)
+            if result is not None:
+                results.append(result)
+        settled += record_results(results)
+    return settled, queried
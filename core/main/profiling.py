@@ -0,0 +1,262 @@
+"""
+On-demand profiling of single requests, for pages that are slow in
+production.
+
+A staff user adds ?profile=1 to a URL (or sends an X-Profile: 1 header)
+and that one request is profiled: a sampling profile of the thread
+serving it, time spent rendering each template and every SQL query.
+?profile=cprofile uses cProfile instead of sampling, which is exact
+but slows the request down.
+
+Samples are saved under MEDIA_ROOT/PROFILE_DIR in the collapsed-stack
+format read by flamegraph.pl, speedscope and inferno; cProfile output
+is a .prof file for snakeviz or pstats. A .json file next to each one
+holds the template and SQL timings. Staff browse them at /profiles/.
+
+Requests without the flag only pay for a dict lookup, and nothing at
+all is installed when PROFILING is off.
+"""
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.base import Template
+from django.urls import reverse
+from django.utils import timezone
+
+from .instrumentation import QueryRecorder
+
+
+MODES = {'sample': '.folded', 'cprofile': '.prof'}
+CAPTURE_NAME = re.compile(r'^[\w-]+\.(folded|prof|json)$')
+
+# The capture of the request being rendered on this thread, if it is being profiled
+_capture = ContextVar('profile_capture', default=None)
+
+
+def profile_dir():
+    return os.path.join(settings.MEDIA_ROOT, settings.PROFILE_DIR)
+
+
+def capture_path(filename):
+    """Absolute path of a saved capture file, or None if there is no such file."""
+    if not CAPTURE_NAME.match(filename):
+        return None
+    path = os.path.join(profile_dir(), filename)
+    return path if os.path.isfile(path) else None
+
+
+def recent_captures():
+    """Metadata of the saved captures, newest first."""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    captures = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                captures.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+
+class StackSampler(threading.Thread):
+    """
+    Records the call stack of one thread every `interval` seconds. Wall
+    clock, so time blocked on the database or the network shows up too.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.finished = threading.Event()
+        # Longest first, so files are named relative to the innermost sys.path entry
+        self.prefixes = sorted((os.path.join(p, '') for p in sys.path if p), key=len, reverse=True)
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def _label(self, code):
+        filename = code.co_filename
+        for prefix in self.prefixes:
+            if filename.startswith(prefix):
+                filename = filename[len(prefix):]
+                break
+        return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+    def collapsed(self):
+        """The samples in collapsed-stack format: one 'frame;frame;frame count' line per stack."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class Capture:
+    """Template timings gathered while one request renders."""
+
+    def __init__(self):
+        self.templates = {}
+        # Time spent in nested templates, one entry per template being rendered
+        self.children = []
+
+    def add_template(self, name, total, own):
+        entry = self.templates.setdefault(name, {'name': name, 'count': 0, 'total_ms': 0.0, 'self_ms': 0.0})
+        entry['count'] += 1
+        entry['total_ms'] += total * 1000
+        entry['self_ms'] += own * 1000
+
+
+def _install_template_timer():
+    # Template._render also runs for {% extends %} parents, which Template.render does not
+    if getattr(Template._render, 'profiled', False):
+        return
+    original = Template._render
+
+    def _render(self, context):
+        capture = _capture.get()
+        if capture is None:
+            return original(self, context)
+        capture.children.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = capture.children.pop()
+            if capture.children:
+                capture.children[-1] += elapsed
+            capture.add_template(self.name or '<string>', elapsed, elapsed - nested)
+
+    _render.profiled = True
+    Template._render = _render
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests from staff users that ask for it with ?profile=1
+    or an X-Profile header. Must come after AuthenticationMiddleware.
+    The response carries an X-Profile header with the capture's download URL.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        _install_template_timer()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        flag = request.GET.get('profile') or request.META.get('HTTP_X_PROFILE')
+        if not flag or not request.user.is_staff:
+            return self.get_response(request)
+        return self.profile(request, flag if flag in MODES else 'sample')
+
+    async def __acall__(self, request):
+        flag = request.GET.get('profile') or request.META.get('HTTP_X_PROFILE')
+        if not flag or not (await request.auser()).is_staff:
+            return await self.get_response(request)
+        # Profiled from a sync thread, which the view's ORM calls and template rendering then run on
+        return await sync_to_async(self.profile)(request, flag if flag in MODES else 'sample')
+
+    def profile(self, request, mode):
+        get_response = async_to_sync(self.get_response) if self.async_mode else self.get_response
+        capture = Capture()
+        token = _capture.set(capture)
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+        else:
+            profiler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+            profiler.start()
+        start = time.perf_counter()
+        try:
+            with QueryRecorder() as recorder:
+                if mode == 'cprofile':
+                    response = profiler.runcall(get_response, request)
+                else:
+                    response = get_response(request)
+                # Lazy template responses render here, inside the profile
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+        finally:
+            duration = time.perf_counter() - start
+            if mode == 'sample':
+                profiler.stop()
+            _capture.reset(token)
+
+        # Sorts by time; the suffix keeps simultaneous captures apart
+        name = f'{timezone.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:4]}'
+        data_file = name + MODES[mode]
+        os.makedirs(profile_dir(), exist_ok=True)
+        if mode == 'cprofile':
+            profiler.dump_stats(os.path.join(profile_dir(), data_file))
+            samples = None
+        else:
+            with open(os.path.join(profile_dir(), data_file), 'w') as f:
+                f.write(profiler.collapsed())
+            samples = sum(profiler.stacks.values())
+
+        slowest = sorted(recorder.queries, key=lambda query: query[2], reverse=True)[:10]
+        metadata = {
+            'name': name,
+            'file': data_file,
+            'created': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': request.user.get_username(),
+            'status': response.status_code,
+            'mode': mode,
+            'duration_ms': round(duration * 1000, 1),
+            'samples': samples,
+            'templates': sorted(capture.templates.values(), key=lambda entry: entry['total_ms'], reverse=True),
+            'sql': {
+                'count': recorder.count,
+                'duration_ms': round(recorder.duration * 1000, 1),
+                'repeated': recorder.repeated(1),
+                'slowest': [{'sql': sql[:1000], 'ms': round(seconds * 1000, 2)} for sql, _, seconds in slowest],
+            },
+        }
+        with open(os.path.join(profile_dir(), name + '.json'), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        _prune(settings.PROFILE_KEEP)
+
+        response['X-Profile'] = reverse('main:profile_download', kwargs={'filename': data_file})
+        return response
+
+
+def _prune(keep):
+    """Deletes all but the newest `keep` captures."""
+    for metadata in recent_captures()[keep:]:
+        for filename in (metadata['file'], metadata['name'] + '.json'):
+            path = capture_path(filename)
+            if path:
+                os.remove(path)
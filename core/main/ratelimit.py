@@ -0,0 +1,166 @@
+"""
+Rate limits for the form posts worth abusing: login (each attempt costs a
+password hash), register, contact and payment (each one sends an STK push).
+
+settings.RATE_LIMITS gives each view its limits as {key: (requests,
+seconds)}, where the key is what requests are counted by: the client's
+ip, the posted username or the posted phone number. Each is a sliding
+window: the count in the current fixed window plus the previous window's
+count, weighted by how much of it still overlaps. That is two integers per
+key in the cache, and no burst at window edges.
+
+@rate_limit(name) checks before the view runs, so a throttled request
+gets its 429 without touching the session, the database or the password
+hasher. When the shared cache is unreachable, each process counts in its
+own memory for a while rather than letting everything through.
+"""
+import hashlib
+import ipaddress
+import logging
+import math
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds to count locally after the shared cache fails, before trying it again
+FALLBACK_SECONDS = 30
+
+_local_cache = LocMemCache('industrylink-ratelimit', {'OPTIONS': {'MAX_ENTRIES': 100000}})
+_shared_down_until = 0.0
+
+
+def client_ip(request):
+    if settings.RATE_LIMIT_IP_HEADER and request.META.get(settings.RATE_LIMIT_IP_HEADER):
+        # The last address is the one our own proxy added; earlier ones are the client's say-so
+        address = request.META[settings.RATE_LIMIT_IP_HEADER].split(',')[-1].strip()
+    else:
+        address = request.META.get('REMOTE_ADDR', '')
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return address
+    # One IPv6 host usually has a whole /64 to rotate through
+    return str(ipaddress.ip_network(f'{ip}/64', strict=False)) if ip.version == 6 else str(ip)
+
+
+# key name -> what a request is counted by (None or '' skips that limit)
+KEYS = {
+    'ip': client_ip,
+    'username': lambda request: request.POST.get('username', '').strip().lower(),
+    'phone': lambda request: request.POST.get('phone_number', '').strip(),
+}
+
+
+def check(request, name):
+    """Counts the request against the limits of `name`. Returns None, or the seconds to wait when over one."""
+    if not settings.RATE_LIMITS_ENABLED:
+        return None
+    now = time.time()
+    windows = []
+    for key, (limit, seconds) in settings.RATE_LIMITS.get(name, {}).items():
+        value = KEYS[key](request)
+        if not value:
+            continue
+        digest = hashlib.sha256(value.encode()).hexdigest()[:24]
+        current = int(now // seconds)
+        windows.append((f'ratelimit:{name}:{key}:{digest}', current, limit, seconds))
+
+    if not windows:
+        return None
+    try:
+        return _count(_cache(), windows, now)
+    except Exception as e:
+        _shared_failed(e)
+        return _count(_local_cache, windows, now)
+
+
+def _count(cache, windows, now):
+    keys = [f'{prefix}:{window}' for prefix, current, _, _ in windows for window in (current, current - 1)]
+    counts = cache.get_many(keys)
+    for prefix, current, limit, seconds in windows:
+        this, last = counts.get(f'{prefix}:{current}', 0), counts.get(f'{prefix}:{current - 1}', 0)
+        elapsed = now / seconds - current
+        # This request would make the estimate go over the limit
+        if this + last * (1 - elapsed) > limit - 1:
+            return _retry_after(this, last, elapsed, limit - 1, seconds)
+
+    # Refused requests are not counted, so a client that waits is let back in on time
+    for prefix, current, _, seconds in windows:
+        key = f'{prefix}:{current}'
+        cache.add(key, 0, 2 * seconds)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.set(key, 1, 2 * seconds)
+    return None
+
+
+def _retry_after(this, last, elapsed, room, seconds):
+    """Seconds until this + last * (1 - elapsed) is at most `room`."""
+    if this > room:
+        # Only once this window is the previous one can its weight fall far enough
+        wait = (1 - elapsed) + (1 - room / this)
+    else:
+        wait = (1 - (room - this) / last) - elapsed
+    return max(1, math.ceil(round(wait * seconds, 6)))
+
+
+def _cache():
+    if time.monotonic() < _shared_down_until:
+        return _local_cache
+    return caches[settings.RATE_LIMIT_CACHE]
+
+
+def _shared_failed(error):
+    global _shared_down_until
+    _shared_down_until = time.monotonic() + FALLBACK_SECONDS
+    logger.warning("Rate limit cache failed (%s); counting in process memory for %ss", error, FALLBACK_SECONDS)
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse(
+        f"Too many attempts. Please try again in {retry_after} seconds.\n",
+        status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(name, methods=('POST',)):
+    """
+    Rejects requests over settings.RATE_LIMITS[name] with 429 Too Many
+    Requests before the view runs. Only `methods` are counted, so viewing
+    a form is never limited. Works on async views too.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method in methods:
+                    retry_after = await sync_to_async(check)(request, name)
+                    if retry_after:
+                        return too_many_requests(retry_after)
+                return await view(request, *args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                retry_after = check(request, name)
+                if retry_after:
+                    return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
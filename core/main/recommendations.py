@@ -0,0 +1,414 @@
+"""
+Recommendations: the mentors, projects and freelancers whose skills best
+match each student, precomputed into the Recommendation table so the
+dashboard reads them with one indexed query.
+
+Everyone becomes a vector over the SkillTag vocabulary:
+- students: their skills, plus the skills their projects use at half weight
+- projects and freelancers: their skills
+- mentors: the skills named in their job title and bio and those of a
+  ROLE_SKILLS role their title names, plus the skills typical of their
+  expertise area at half weight
+
+Each weight is multiplied by the skill's inverse document frequency, so a
+shared niche skill counts for more than a shared Python, and vectors are
+scaled to unit length so a dot product is the cosine similarity. A batch
+of students is scored against every candidate with one matrix product.
+The vocabulary is small, so the matrices are dense NumPy arrays.
+
+Signals keep the table current through the background queue: a student's
+lists are recomputed when they or their projects change, and a changed
+candidate is merged into (or taken out of) the lists it affects. The IDF
+weights drift as data changes; recompute_recommendations rebuilds
+everything from scratch.
+"""
+import math
+import re
+from collections import defaultdict
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min, Q
+
+from .models import Freelancer, Mentor, Project, Recommendation, SkillTag, StudentProfile
+from .skills import ROLE_SKILLS, normalize_skill
+from .tasks import enqueue
+
+
+TOP_K = 5
+PROJECT_SKILL_WEIGHT = 0.5
+EXPERTISE_SKILL_WEIGHT = 0.5
+
+SKILL_SPACE_KEY = 'main:recommendation_skill_space'
+SKILL_SPACE_TTL = 3600
+
+# Students per matrix product and per DELETE/INSERT when rebuilding
+BATCH_SIZE = 256
+
+# Mentor expertise area -> the ROLE_SKILLS roles whose skills it implies
+EXPERTISE_ROLES = {
+    'technology': ['Full Stack Developer', 'Mobile Developer', 'DevOps Engineer', 'AI/ML Engineer', 'Data Analyst'],
+    'design': ['UI/UX Designer'],
+    'business': ['Finance', 'Data Analyst'],
+    'other': [],
+}
+
+KINDS = {
+    Mentor: 'mentor',
+    Project: 'project',
+    Freelancer: 'freelancer',
+}
+CANDIDATES = {kind: model for model, kind in KINDS.items()}
+LABEL_FIELDS = {'mentor': 'full_name', 'project': 'title', 'freelancer': 'full_name'}
+
+# Tag links of the candidates that have them: (through model, its foreign key to the candidate)
+TAG_LINKS = {
+    'project': (Project.skill_tags.through, 'project_id'),
+    'freelancer': (Freelancer.skill_tags.through, 'freelancer_id'),
+}
+
+
+def student_terms(students):
+    """{student id: {tag id: weight}} for a queryset of StudentProfile ids."""
+    terms = defaultdict(dict)
+    project_tags = (
+        Project.skill_tags.through.objects.filter(project__student_id__in=students)
+        .values_list('project__student_id', 'skilltag_id')
+    )
+    for student_id, tag_id in project_tags:
+        terms[student_id][tag_id] = PROJECT_SKILL_WEIGHT
+    own_tags = (
+        StudentProfile.skill_tags.through.objects.filter(studentprofile_id__in=students)
+        .values_list('studentprofile_id', 'skilltag_id')
+    )
+    for student_id, tag_id in own_tags:
+        terms[student_id][tag_id] = 1.0
+    return terms
+
+
+def candidate_terms(kind, vocabulary, ids=None, sharing=None):
+    """
+    {id: {tag id: weight}} for mentors, projects or freelancers: all of
+    them, those in `ids`, or those with at least one tag in `sharing`.
+    """
+    if kind == 'mentor':
+        terms = mentor_terms(vocabulary, ids)
+        if sharing is not None:
+            sharing = set(sharing)
+            terms = {pk: weights for pk, weights in terms.items() if sharing & weights.keys()}
+        return terms
+
+    through, column = TAG_LINKS[kind]
+    links = through.objects.all()
+    if ids is not None:
+        links = links.filter(**{f'{column}__in': ids})
+    if sharing is not None:
+        links = links.filter(**{f'{column}__in': _sharing(kind, sharing)})
+    terms = defaultdict(dict)
+    for pk, tag_id in links.values_list(column, 'skilltag_id'):
+        terms[pk][tag_id] = 1.0
+    return terms
+
+
+def _sharing(kind, tags):
+    """Subquery of the projects or freelancers tagged with any of `tags`."""
+    through, column = TAG_LINKS[kind]
+    return through.objects.filter(skilltag_id__in=tags).values(column)
+
+
+def mentor_terms(vocabulary, ids=None):
+    """{mentor id: {tag id: weight}}, read from job titles, bios and expertise areas."""
+    role_tags = {
+        role: [vocabulary[key] for key in map(normalize_skill, skills) if key in vocabulary]
+        for role, skills in ROLE_SKILLS.items()
+    }
+    mentions = _mention_pattern(vocabulary)
+    mentors = Mentor.objects.only('id', 'job_title', 'bio', 'expertise_area')
+    if ids is not None:
+        mentors = mentors.filter(pk__in=ids)
+
+    terms = {}
+    for mentor in mentors:
+        weights = {}
+        for role in EXPERTISE_ROLES.get(mentor.expertise_area, []):
+            weights.update(dict.fromkeys(role_tags[role], EXPERTISE_SKILL_WEIGHT))
+        title = normalize_skill(mentor.job_title)
+        for role, tags in role_tags.items():
+            if normalize_skill(role) in title:
+                weights.update(dict.fromkeys(tags, 1.0))
+        if mentions:
+            for name in mentions.findall(normalize_skill(f'{mentor.job_title} {mentor.bio}')):
+                weights[vocabulary[name]] = 1.0
+        if weights:
+            terms[mentor.pk] = weights
+    return terms
+
+
+def _mention_pattern(vocabulary):
+    if not vocabulary:
+        return None
+    # Longest first, so "react native" wins over "react"
+    names = sorted(vocabulary, key=len, reverse=True)
+    return re.compile(r'(?<!\w)(' + '|'.join(map(re.escape, names)) + r')(?!\w)')
+
+
+class SkillSpace:
+    """The skill vocabulary and its IDF weights: turns term weights into unit-length rows."""
+
+    def __init__(self, vocabulary, idf):
+        # vocabulary: {normalized name: tag id}; idf: {tag id: weight}
+        self.vocabulary = vocabulary
+        self.columns = {tag_id: column for column, tag_id in enumerate(idf)}
+        self.idf = np.array(list(idf.values()), dtype=np.float32)
+
+    @classmethod
+    def build(cls):
+        """Counts how many students, projects, freelancers and mentors have each skill. Cached."""
+        vocabulary = dict(SkillTag.objects.values_list('normalized', 'id'))
+        frequency = defaultdict(int)
+        documents = 0
+        for through, column in [(StudentProfile.skill_tags.through, 'studentprofile_id'), *TAG_LINKS.values()]:
+            documents += through.objects.values(column).distinct().count()
+            for tag_id, n in through.objects.order_by().values_list('skilltag_id').annotate(n=Count('pk')):
+                frequency[tag_id] += n
+        mentors = mentor_terms(vocabulary)
+        documents += len(mentors)
+        for weights in mentors.values():
+            for tag_id in weights:
+                frequency[tag_id] += 1
+
+        idf = {
+            tag_id: math.log((1 + documents) / (1 + frequency[tag_id])) + 1
+            for tag_id in sorted(vocabulary.values())
+        }
+        space = cls(vocabulary, idf)
+        cache.set(SKILL_SPACE_KEY, (vocabulary, idf), SKILL_SPACE_TTL)
+        return space
+
+    @classmethod
+    def load(cls, tag_ids=()):
+        """The cached space, rebuilt first if it is missing or lacks any of `tag_ids`."""
+        cached = cache.get(SKILL_SPACE_KEY)
+        space = cls(*cached) if cached else None
+        if space is None or not space.columns.keys() >= set(tag_ids):
+            space = cls.build()
+        return space
+
+    def vectors(self, terms):
+        """(ids, matrix): one unit-length float32 row per id in `terms`."""
+        ids = np.fromiter(terms, dtype=np.int64, count=len(terms))
+        matrix = np.zeros((len(terms), len(self.columns)), dtype=np.float32)
+        for row, weights in enumerate(terms.values()):
+            for tag_id, weight in weights.items():
+                column = self.columns.get(tag_id)
+                # Tags newer than the space are left out; load() rebuilds it for the refreshed rows
+                if column is not None:
+                    matrix[row, column] = weight * self.idf[column]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return ids, matrix
+
+
+class Candidates:
+    """The vectors, labels and (for projects) owners of some mentors, projects or freelancers."""
+
+    def __init__(self, kind, space, ids=None, sharing=None):
+        self.kind = kind
+        terms = candidate_terms(kind, space.vocabulary, ids, sharing)
+        self.ids, self.matrix = space.vectors(terms)
+        objects = CANDIDATES[kind].objects.all()
+        if ids is not None:
+            objects = objects.filter(pk__in=ids)
+        elif sharing is not None and kind in TAG_LINKS:
+            objects = objects.filter(pk__in=_sharing(kind, sharing))
+        fields = ['pk', LABEL_FIELDS[kind]] + (['student_id'] if kind == 'project' else [])
+        info = {row[0]: row[1:] for row in objects.values_list(*fields)}
+        self.labels = [info[pk][0][:255] for pk in terms]
+        # Students are never recommended their own projects
+        self.owners = np.array([info[pk][1] for pk in terms], dtype=np.int64) if kind == 'project' else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, student_ids, student_matrix):
+        """(students x candidates) cosine similarities, zero for a student's own projects."""
+        scores = student_matrix @ self.matrix.T
+        if self.owners is not None:
+            scores[self.owners[None, :] == student_ids[:, None]] = 0
+        return scores
+
+    def recommend(self, student_ids, student_matrix, k=TOP_K):
+        """Unsaved Recommendations: each student's best k candidates that share a skill with them."""
+        if not len(self) or not len(student_ids):
+            return []
+        scores = self.scores(student_ids, student_matrix)
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        rows = []
+        for student_id, columns, values in zip(student_ids.tolist(), top.tolist(), top_scores.tolist()):
+            rank = 0
+            for column, score in zip(columns, values):
+                if score <= 0:
+                    break
+                rows.append(Recommendation(
+                    student_id=student_id, kind=self.kind, object_id=int(self.ids[column]),
+                    label=self.labels[column], score=round(score, 4), rank=rank,
+                ))
+                rank += 1
+        return rows
+
+
+def _replace(student_ids, rows, kinds=None):
+    """Swaps the students' stored recommendations (of `kinds`, default all) for `rows`."""
+    stored = Recommendation.objects.filter(student_id__in=student_ids)
+    if kinds is not None:
+        stored = stored.filter(kind__in=kinds)
+    with transaction.atomic():
+        stored.delete()
+        Recommendation.objects.bulk_create(rows, batch_size=1000)
+
+
+def rebuild_recommendations(batch_size=BATCH_SIZE):
+    """Recomputes every student's recommendations, one batch of students at a time. Returns the rows stored."""
+    space = SkillSpace.build()
+    candidates = [Candidates(kind, space) for kind in CANDIDATES]
+    stored = 0
+    last_id = 0
+    while True:
+        ids = list(
+            StudentProfile.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return stored
+        last_id = ids[-1]
+        stored += _recommend(space, candidates, ids)
+
+
+def recommend_students(student_ids, batch_size=BATCH_SIZE):
+    """Recomputes the given students' recommendations, e.g. after a bulk_create that skipped signals."""
+    space = SkillSpace.build()
+    candidates = [Candidates(kind, space) for kind in CANDIDATES]
+    return sum(_recommend(space, candidates, ids) for ids in _chunks(list(student_ids), batch_size))
+
+
+def _recommend(space, candidates, ids):
+    student_ids, matrix = space.vectors(student_terms(ids))
+    rows = [row for group in candidates for row in group.recommend(student_ids, matrix)]
+    _replace(ids, rows)
+    return len(rows)
+
+
+def refresh_student(student_id):
+    """Recomputes one student's recommendations against the candidates that share a skill with them."""
+    terms = student_terms([student_id])
+    tags = list(terms.get(student_id, {}))
+    space = SkillSpace.load(tags)
+    student_ids, matrix = space.vectors(terms)
+    rows = []
+    if tags:
+        for kind in CANDIDATES:
+            rows += Candidates(kind, space, sharing=tags).recommend(student_ids, matrix)
+    _replace([student_id], rows)
+
+
+def refresh_candidate(kind, object_id):
+    """
+    Brings every list a changed (or deleted) mentor, project or freelancer
+    could enter or leave up to date. Students it now beats the last entry
+    of get it merged in; students who listed it but now score it lower
+    are recomputed for that kind, since their next best may have changed.
+    """
+    tags = []
+    if kind in TAG_LINKS:
+        through, column = TAG_LINKS[kind]
+        tags = through.objects.filter(**{column: object_id}).values_list('skilltag_id', flat=True)
+    space = SkillSpace.load(tags)
+    candidate = Candidates(kind, space, ids=[object_id])
+    listed = dict(Recommendation.objects.filter(kind=kind, object_id=object_id).values_list('student_id', 'score'))
+
+    scores = {}
+    if len(candidate):
+        tags = [tag_id for tag_id, column in space.columns.items() if candidate.matrix[0, column] > 0]
+        sharing = StudentProfile.objects.filter(
+            Q(skill_tags__in=tags) | Q(projects__skill_tags__in=tags)
+        ).values('pk')
+        student_ids, matrix = space.vectors(student_terms(sharing))
+        if len(student_ids):
+            values = candidate.scores(student_ids, matrix)[:, 0]
+            scores = {
+                student_id: round(score, 4)
+                for student_id, score in zip(student_ids.tolist(), values.tolist()) if score > 0
+            }
+
+    # Each student's list for this kind: its length and its lowest score
+    lists = {}
+    for chunk in _chunks(list(scores)):
+        lists.update(
+            (student_id, (n, lowest)) for student_id, n, lowest in
+            Recommendation.objects.filter(kind=kind, student_id__in=chunk).order_by().values('student_id')
+            .annotate(n=Count('pk'), lowest=Min('score')).values_list('student_id', 'n', 'lowest')
+        )
+
+    stale = [student_id for student_id, old in listed.items() if scores.get(student_id, 0) < old]
+    merge = {
+        student_id: score for student_id, score in scores.items()
+        if student_id not in stale and (
+            student_id in listed or lists.get(student_id, (0, 0))[0] < TOP_K
+            or score > lists[student_id][1]
+        )
+    }
+    label = candidate.labels[0] if len(candidate) else ''
+    for chunk in _chunks(list(merge)):
+        _merge(kind, object_id, label, {student_id: merge[student_id] for student_id in chunk})
+    for chunk in _chunks(stale):
+        terms = student_terms(chunk)
+        student_ids, matrix = space.vectors(terms)
+        tags = list({tag_id for weights in terms.values() for tag_id in weights})
+        rows = Candidates(kind, space, sharing=tags).recommend(student_ids, matrix) if tags else []
+        _replace(chunk, rows, kinds=[kind])
+
+
+def _merge(kind, object_id, label, scores):
+    """Puts one candidate into the given students' lists at its new score, keeping the best TOP_K."""
+    lists = defaultdict(list)
+    for row in Recommendation.objects.filter(kind=kind, student_id__in=list(scores)).exclude(object_id=object_id):
+        lists[row.student_id].append((row.score, -row.rank, row.object_id, row.label))
+    rows = []
+    for student_id, score in scores.items():
+        # Ties keep the entries already listed ahead of the newcomer
+        entries = sorted(lists[student_id] + [(score, -TOP_K, object_id, label)], reverse=True)[:TOP_K]
+        rows += [
+            Recommendation(student_id=student_id, kind=kind, object_id=pk, label=name, score=value, rank=rank)
+            for rank, (value, _, pk, name) in enumerate(entries)
+        ]
+    _replace(list(scores), rows, kinds=[kind])
+
+
+def _chunks(ids, size=BATCH_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def queue_refresh(instance):
+    """Queues the refreshes that saving or deleting a student, mentor, project or freelancer calls for."""
+    if isinstance(instance, StudentProfile):
+        enqueue(refresh_student, instance.pk)
+        return
+    enqueue(refresh_candidate, KINDS[type(instance)], instance.pk)
+    if isinstance(instance, Project):
+        # The owner's own vector includes the project's skills
+        enqueue(refresh_student, instance.student_id)
+
+
+def group_by_kind(recommendations):
+    """{'mentor': [...], 'project': [...], 'freelancer': [...]}, each best first."""
+    grouped = {kind: [] for kind in CANDIDATES}
+    for recommendation in recommendations:
+        grouped[recommendation.kind].append(recommendation)
+    return grouped
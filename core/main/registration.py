@@ -0,0 +1,240 @@
+"""
+Creating accounts: one from the register page, or a whole cohort of
+students from a CSV file.
+
+register() hashes the password before its transaction starts, then
+inserts the User, UserProfile and role profile in one transaction.atomic(),
+so a failure leaves no half-created account behind.
+
+register_cohort() works in batches. Hashing is nearly all the cost at
+PBKDF2's work factor, so passwords are checked against
+AUTH_PASSWORD_VALIDATORS and hashed across a process pool. Each batch is
+then one transaction of bulk_create INSERTs. bulk_create skips signals,
+so skill tags are linked here, and the caller refreshes the dashboard
+stats and the new students' recommendations at the end.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .models import Freelancer, Mentor, Organization, StudentProfile, UserProfile
+from .skills import get_or_create_tags, normalize_skill, parse_skills
+
+
+BATCH_SIZE = 500
+
+# Columns a cohort CSV may have; the first three are required
+COHORT_COLUMNS = [
+    'username', 'email', 'password', 'first_name', 'last_name', 'phone',
+    'institution', 'course', 'year_of_study', 'skills',
+]
+
+# Columns no two accounts may share, compared case-insensitively
+UNIQUE_COLUMNS = ['username', 'email']
+
+
+def _student(user, data):
+    return StudentProfile(
+        user=user,
+        institution=data.get('institution') or '',
+        course=data.get('course') or '',
+        year_of_study=data.get('year_of_study') or 1,
+        email=user.email,
+        bio='',
+        skills=data.get('skills') or '',
+    )
+
+
+def _mentor(user, data):
+    return Mentor(
+        user=user,
+        full_name=f"{user.first_name} {user.last_name}",
+        job_title=data.get('job_title') or '',
+        company=data.get('company') or '',
+        linkedin=data.get('linkedin') or '',
+        expertise_area=data.get('expertise_area') or 'technology',
+        years_of_experience=data.get('years_of_experience') or 0,
+        availability='Available',
+        bio='Mentor profile',
+        email=user.email,
+    )
+
+
+def _freelancer(user, data):
+    return Freelancer(
+        user=user,
+        full_name=f"{user.first_name} {user.last_name}",
+        profession=data.get('profession') or '',
+        specialization=data.get('specialization') or '',
+        years_of_experience=data.get('years_of_experience') or 0,
+        email=user.email,
+        bio='Freelancer profile',
+    )
+
+
+def _organization(user, data):
+    return Organization(
+        user=user,
+        organization_name=data.get('organization_name'),
+        organization_type=data.get('organization_type') or '',
+        industry=data.get('industry') or '',
+        website=data.get('website') or '',
+        email=user.email,
+        bio='Organization profile',
+    )
+
+
+# role -> builds the unsaved role profile of a new user from the registration data
+ROLE_PROFILES = {
+    'student': _student,
+    'mentor': _mentor,
+    'freelancer': _freelancer,
+    'organization': _organization,
+}
+
+
+def register(form, role):
+    """Creates the user of a valid RegisterForm with their UserProfile and `role` profile. Returns the user."""
+    if role not in ROLE_PROFILES:
+        raise ValueError(f"Unknown account type {role!r}")
+    data = form.cleaned_data
+    # Hashes the password; done first so the transaction is not held open for it
+    user = form.save(commit=False)
+    with transaction.atomic():
+        user.save()
+        UserProfile.objects.create(user=user, role=role, phone=data.get('phone', ''))
+        ROLE_PROFILES[role](user, data).save()
+    return user
+
+
+def register_cohort(rows, institution='', batch_size=BATCH_SIZE, workers=None, progress=None):
+    """
+    Creates a student account for each row (a dict with COHORT_COLUMNS keys, e.g. from
+    csv.DictReader) that is valid. Returns (ids of the new students, [(row number, error)]),
+    numbering rows from 1. `workers` processes hash passwords (default: one per CPU;
+    1 hashes in this process). `progress(created)` is called after each batch.
+    """
+    student_ids = []
+    errors = []
+    seen = {column: set() for column in UNIQUE_COLUMNS}
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(workers, initializer=django.setup) if workers > 1 else None
+    try:
+        batch = []
+        for number, row in enumerate(rows, 1):
+            row = {key: (value or '').strip() for key, value in row.items() if key in COHORT_COLUMNS}
+            error = _check_row(row, seen)
+            if error:
+                errors.append((number, error))
+                continue
+            batch.append((number, row))
+            if len(batch) == batch_size:
+                student_ids += _create_batch(batch, institution, pool, workers, errors)
+                batch = []
+                if progress:
+                    progress(len(student_ids))
+        if batch:
+            student_ids += _create_batch(batch, institution, pool, workers, errors)
+            if progress:
+                progress(len(student_ids))
+    finally:
+        if pool:
+            pool.shutdown()
+    errors.sort()
+    return student_ids, errors
+
+
+def _check_row(row, seen):
+    """The cheap checks, made before any hashing. Marks the username and email as seen."""
+    for column in COHORT_COLUMNS[:3]:
+        if not row.get(column):
+            return f"{column} is required"
+    username = row['username']
+    try:
+        User.username_validator(username)
+        validate_email(row['email'])
+    except ValidationError as e:
+        return ' '.join(e.messages)
+    if len(username) > 150:
+        return "username is longer than 150 characters"
+    if row.get('year_of_study') and not row['year_of_study'].isdigit():
+        return "year_of_study must be a whole number"
+    # Usernames that differ only in case are the same account, as on the register page; so are emails
+    for column in UNIQUE_COLUMNS:
+        if row[column].lower() in seen[column]:
+            return f"{column} {row[column]} appears more than once"
+    for column in UNIQUE_COLUMNS:
+        seen[column].add(row[column].lower())
+    return None
+
+
+def _hash_password(row):
+    """Runs in a worker process: (hash, None), or (None, error) when validation fails."""
+    password, username, email, first_name, last_name = row
+    user = User(username=username, email=email, first_name=first_name, last_name=last_name)
+    try:
+        validate_password(password, user)
+    except ValidationError as e:
+        return None, ' '.join(e.messages)
+    return make_password(password), None
+
+
+def _create_batch(batch, institution, pool, workers, errors):
+    for column in UNIQUE_COLUMNS:
+        taken = set(
+            User.objects.annotate(lower=Lower(column))
+            .filter(lower__in=[row[column].lower() for _, row in batch])
+            .values_list('lower', flat=True)
+        )
+        errors += [
+            (number, f"{column} {row[column]} is taken") for number, row in batch if row[column].lower() in taken
+        ]
+        batch = [(number, row) for number, row in batch if row[column].lower() not in taken]
+
+    work = [
+        (row['password'], row['username'], row['email'], row.get('first_name', ''), row.get('last_name', ''))
+        for _, row in batch
+    ]
+    if pool:
+        hashed = list(pool.map(_hash_password, work, chunksize=max(1, len(work) // (workers * 4))))
+    else:
+        hashed = [_hash_password(item) for item in work]
+
+    users, profiles = [], []
+    for (number, row), (password, error) in zip(batch, hashed):
+        if error:
+            errors.append((number, error))
+            continue
+        users.append(User(
+            username=row['username'], email=row['email'], password=password,
+            first_name=row.get('first_name', ''), last_name=row.get('last_name', ''),
+        ))
+        profiles.append(row)
+    if not users:
+        return []
+
+    skills = [parse_skills(row.get('skills')) for row in profiles]
+    with transaction.atomic():
+        tag_ids = {tag.normalized: tag.id for tag in get_or_create_tags([name for names in skills for name in names])}
+        users = User.objects.bulk_create(users)
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, role='student', phone=row.get('phone', '')) for user, row in zip(users, profiles)
+        ])
+        students = StudentProfile.objects.bulk_create([
+            _student(user, {**row, 'institution': row.get('institution') or institution})
+            for user, row in zip(users, profiles)
+        ])
+        Through = StudentProfile.skill_tags.through
+        Through.objects.bulk_create([
+            Through(studentprofile_id=student.id, skilltag_id=tag_ids[normalize_skill(name)[:100]])
+            for student, names in zip(students, skills) for name in names
+        ])
+    return [student.id for student in students]
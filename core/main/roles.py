@@ -0,0 +1,135 @@
+"""
+request.role_profile: the signed-in user's role and role profile,
+resolved once per session instead of once per view.
+
+Logging in reads the user with their UserProfile and all four role
+profiles joined in one query, and keeps the role and the two ids in the
+session, which login saves anyway. Requests take them from there and
+only read a row when a view asks for it, by primary key.
+
+Saving or deleting any of those profiles bumps a per-user version in
+the cache, and a session holding an older version resolves again.
+"""
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from .models import Freelancer, Mentor, Organization, StudentProfile, UserProfile
+
+
+SESSION_KEY = '_role_profile'
+VERSION_KEY = 'main:role_profile_version:{}'
+
+# role -> (role profile model, its related_name on User)
+ROLE_PROFILES = {
+    'student': (StudentProfile, 'student_profile'),
+    'mentor': (Mentor, 'mentor_profile'),
+    'freelancer': (Freelancer, 'freelancer_profile'),
+    'organization': (Organization, 'organization_profile'),
+}
+
+
+class RoleProfile:
+    """A user's role ('student', 'mentor', ... or None), UserProfile and role profile."""
+
+    def __init__(self, user, role=None, user_profile_id=None, profile_id=None):
+        self.user = user
+        self.role = role
+        self.user_profile_id = user_profile_id
+        self.profile_id = profile_id
+
+    @cached_property
+    def user_profile(self):
+        if self.user_profile_id is None:
+            return None
+        return self._attach(UserProfile.objects.filter(pk=self.user_profile_id).first())
+
+    @cached_property
+    def profile(self):
+        """The StudentProfile, Mentor, Freelancer or Organization of the user's role, if it exists."""
+        if self.profile_id is None:
+            return None
+        model, _ = ROLE_PROFILES[self.role]
+        # The UserProfile comes along in the same query, for views that use both
+        row = model.objects.select_related('user__profile').filter(pk=self.profile_id).first()
+        if row is not None and 'user_profile' not in self.__dict__:
+            self.user_profile = self._attach(getattr(row.user, 'profile', None))
+        return self._attach(row)
+
+    def _attach(self, row):
+        # Reuse the request's user instead of reading it again
+        if row is not None:
+            row.user = self.user
+        return row
+
+    def __repr__(self):
+        return f'<RoleProfile {self.role} user={self.user.pk}>'
+
+
+def resolve(user):
+    """Reads a user's role and profiles with one query."""
+    row = User.objects.select_related(
+        'profile', *(name for _, name in ROLE_PROFILES.values())
+    ).filter(pk=user.pk).first()
+    user_profile = getattr(row, 'profile', None)
+    if user_profile:
+        role = user_profile.role
+    else:
+        # Accounts from before UserProfile existed: go by the role profile they have
+        role = next((role for role, (_, name) in ROLE_PROFILES.items() if getattr(row, name, None)), None)
+    profile = getattr(row, ROLE_PROFILES[role][1], None) if role in ROLE_PROFILES else None
+
+    role_profile = RoleProfile(user, role, user_profile and user_profile.pk, profile and profile.pk)
+    # Both rows came with the query; keep them for the rest of this request
+    role_profile.user_profile = role_profile._attach(user_profile)
+    role_profile.profile = role_profile._attach(profile)
+    return role_profile
+
+
+def get_role_profile(request):
+    user = request.user
+    if not user.is_authenticated:
+        return RoleProfile(user)
+    version = cache.get(VERSION_KEY.format(user.pk))
+    stored = request.session.get(SESSION_KEY)
+    if stored and stored['user'] == user.pk and stored['version'] == version:
+        return RoleProfile(user, stored['role'], stored['user_profile'], stored['profile'])
+
+    return remember_role_profile(request, user, version)
+
+
+def remember_role_profile(request, user, version=None):
+    """Resolves the user's role and keeps it in their session. Also called on login."""
+    role_profile = resolve(user)
+    request.session[SESSION_KEY] = {
+        'user': user.pk,
+        'version': version if version is not None else cache.get(VERSION_KEY.format(user.pk)),
+        'role': role_profile.role,
+        'user_profile': role_profile.user_profile_id,
+        'profile': role_profile.profile_id,
+    }
+    return role_profile
+
+
+def invalidate_role_profile(user_id):
+    """Makes every session of this user resolve their role again."""
+    # Random rather than a counter, which could repeat an old value after an eviction
+    cache.set(VERSION_KEY.format(user_id), uuid.uuid4().hex, None)
+
+
+class RoleProfileMiddleware:
+    """Sets request.role_profile, resolved the first time it is used. Goes after AuthenticationMiddleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.role_profile = SimpleLazyObject(lambda: get_role_profile(request))
+        return self.get_response(request)
@@ -0,0 +1,143 @@
+import re
+from functools import reduce
+from operator import and_
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Project, Mentor, Freelancer, SearchDocument
+
+
+PAGE_SIZE = 20
+
+KINDS = {
+    Project: 'project',
+    Mentor: 'mentor',
+    Freelancer: 'freelancer',
+}
+
+
+def build_document(instance):
+    """Returns the (title, body, category) that make `instance` searchable."""
+    if isinstance(instance, Project):
+        return instance.title, f"{instance.description}\n{instance.skills_used}", instance.status
+    if isinstance(instance, Mentor):
+        return (
+            f"{instance.full_name} - {instance.job_title}",
+            f"{instance.job_title}\n{instance.company}\n{instance.bio}",
+            instance.expertise_area,
+        )
+    return (
+        f"{instance.full_name} - {instance.profession}",
+        f"{instance.profession}\n{instance.specialization}\n{instance.skills}",
+        '',
+    )
+
+
+def index_object(instance):
+    title, body, category = build_document(instance)
+    SearchDocument.objects.update_or_create(
+        kind=KINDS[type(instance)],
+        object_id=instance.pk,
+        defaults={'title': title[:255], 'body': body, 'category': category},
+    )
+
+
+def remove_object(instance):
+    SearchDocument.objects.filter(kind=KINDS[type(instance)], object_id=instance.pk).delete()
+
+
+def rebuild_index(batch_size=500):
+    """Drops and recreates every SearchDocument. The FTS5 triggers / generated column follow along."""
+    SearchDocument.objects.all().delete()
+    total = 0
+    for model, kind in KINDS.items():
+        batch = []
+        for instance in model.objects.iterator(chunk_size=batch_size):
+            title, body, category = build_document(instance)
+            batch.append(SearchDocument(kind=kind, object_id=instance.pk, title=title[:255], body=body, category=category))
+            if len(batch) >= batch_size:
+                total += len(SearchDocument.objects.bulk_create(batch))
+                batch = []
+        total += len(SearchDocument.objects.bulk_create(batch))
+    return total
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:10]
+
+
+_fts5_tables = {}
+
+
+def _fts5_available():
+    # Checked once per process; the table only appears when migration 0011 ran on SQLite
+    if connection.alias not in _fts5_tables:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'main_searchdocument_fts'")
+            _fts5_tables[connection.alias] = cursor.fetchone() is not None
+    return _fts5_tables[connection.alias]
+
+
+def _filters(kind, category, alias):
+    sql, params = [], []
+    if kind:
+        sql.append(f'{alias}.kind = %s')
+        params.append(kind)
+    if category:
+        sql.append(f'{alias}.category = %s')
+        params.append(category)
+    return ''.join(f' AND {clause}' for clause in sql), params
+
+
+def _search_sqlite(terms, kind, category, limit, offset):
+    # Quoted prefix terms, so user input can never be read as FTS5 syntax
+    match = ' '.join(f'"{term}"*' for term in terms)
+    where, params = _filters(kind, category, 'd')
+    return SearchDocument.objects.raw(
+        f"""SELECT d.*, bm25(main_searchdocument_fts, 10.0, 1.0) AS rank
+            FROM main_searchdocument_fts
+            JOIN main_searchdocument d ON d.id = main_searchdocument_fts.rowid
+            WHERE main_searchdocument_fts MATCH %s{where}
+            ORDER BY rank
+            LIMIT %s OFFSET %s""",
+        [match, *params, limit, offset],
+    )
+
+
+def _search_postgres(terms, kind, category, limit, offset):
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    where, params = _filters(kind, category, 'd')
+    return SearchDocument.objects.raw(
+        f"""SELECT d.*, ts_rank(d.search_vector, q) AS rank
+            FROM main_searchdocument d, to_tsquery('english', %s) q
+            WHERE d.search_vector @@ q{where}
+            ORDER BY rank DESC
+            LIMIT %s OFFSET %s""",
+        [tsquery, *params, limit, offset],
+    )
+
+
+def _search_fallback(terms, kind, category, limit, offset):
+    documents = SearchDocument.objects.filter(
+        reduce(and_, (Q(title__icontains=t) | Q(body__icontains=t) for t in terms))
+    )
+    if kind:
+        documents = documents.filter(kind=kind)
+    if category:
+        documents = documents.filter(category=category)
+    return documents.order_by('-updated_at')[offset:offset + limit]
+
+
+def search(query, kind=None, category=None, limit=PAGE_SIZE, offset=0):
+    """Ranked SearchDocuments matching every word of `query`, best first."""
+    terms = _terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'sqlite' and _fts5_available():
+        backend = _search_sqlite
+    elif connection.vendor == 'postgresql':
+        backend = _search_postgres
+    else:
+        backend = _search_fallback
+    return list(backend(terms, kind, category, limit, offset))
@@ -0,0 +1,38 @@
+"""
+Expired session cleanup.
+
+The db and cached_db session engines leave expired rows in django_session
+until something deletes them, and Django's clearsessions does that in one
+DELETE, which on a large table holds the write lock (SQLite) or bloats one
+transaction (Postgres) for as long as it runs. This deletes them a batch
+at a time instead. The cache engine needs none of it: the cache expires
+sessions by itself.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+
+BATCH_SIZE = 1000
+
+
+def uses_session_table():
+    return settings.SESSION_ENGINE.endswith(('.db', '.cached_db'))
+
+
+def clear_expired_sessions(batch_size=BATCH_SIZE, pause=0.0):
+    """Deletes sessions that expired before now, `batch_size` rows per DELETE. Returns how many."""
+    now = timezone.now()
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
+        # Gives requests waiting on the write lock a turn between batches
+        if pause:
+            time.sleep(pause)
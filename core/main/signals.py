@@ -0,0 +1,164 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .counters import adjust_project_counts, move_project_count
+from .mentors import invalidate_mentor_facets
+from .models import StudentProfile, Mentor, Freelancer, Organization, Project, UserProfile
+from .recommendations import queue_refresh
+from .roles import invalidate_role_profile, remember_role_profile
+from .search import index_object, remove_object
+from .skills import invalidate_skill_gap_summary, sync_skill_tags
+from .stats import invalidate_dashboard_stats
+
+
+# Model -> the comma-separated text field its skill_tags are derived from
+SKILL_TEXT_FIELDS = {
+    StudentProfile: 'skills',
+    Freelancer: 'skills',
+    Project: 'skills_used',
+}
+
+
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_save, sender=Freelancer)
+@receiver(post_save, sender=Project)
+def update_skill_tags(sender, instance, created, update_fields=None, **kwargs):
+    if kwargs.get('raw'):
+        return
+    field = SKILL_TEXT_FIELDS[sender]
+    if update_fields is not None and field not in update_fields:
+        return
+    sync_skill_tags(instance, getattr(instance, field), created=created)
+
+
+# The cohort skill gap summary changes with any student's tags, and with the number of students
+@receiver(m2m_changed, sender=StudentProfile.skill_tags.through)
+def refresh_skill_gap_on_tags(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_skill_gap_summary()
+
+
+@receiver(post_save, sender=StudentProfile)
+def refresh_skill_gap_on_create(sender, created, **kwargs):
+    if created:
+        invalidate_skill_gap_summary()
+
+
+@receiver(post_delete, sender=StudentProfile)
+def refresh_skill_gap_on_delete(sender, **kwargs):
+    invalidate_skill_gap_summary()
+
+
+# Only creates and deletes change the admin dashboard counts
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_save, sender=Mentor)
+@receiver(post_save, sender=Freelancer)
+@receiver(post_save, sender=Organization)
+@receiver(post_save, sender=Project)
+def refresh_stats_on_create(sender, created, **kwargs):
+    if created:
+        invalidate_dashboard_stats()
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_delete, sender=Mentor)
+@receiver(post_delete, sender=Freelancer)
+@receiver(post_delete, sender=Organization)
+@receiver(post_delete, sender=Project)
+def refresh_stats_on_delete(sender, **kwargs):
+    invalidate_dashboard_stats()
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Mentor)
+@receiver(post_save, sender=Freelancer)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_object(instance)
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Mentor)
+@receiver(post_delete, sender=Freelancer)
+def remove_from_search_index(sender, instance, **kwargs):
+    remove_object(instance)
+
+
+@receiver(pre_save, sender=Project)
+def remember_counted_project(sender, instance, raw=False, update_fields=None, **kwargs):
+    # The student and status the counters currently include this project under
+    instance._counted_as = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not {'student', 'status'} & set(update_fields):
+        return
+    instance._counted_as = Project.objects.filter(pk=instance.pk).values_list('student_id', 'status').first()
+
+
+@receiver(post_save, sender=Project)
+def update_project_counts(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_project_counts(instance.student_id, instance.status, 1)
+        return
+    counted_as = getattr(instance, '_counted_as', None)
+    if counted_as is None or counted_as == (instance.student_id, instance.status):
+        return
+    student_id, status = counted_as
+    if student_id == instance.student_id:
+        move_project_count(student_id, status, instance.status)
+    else:
+        adjust_project_counts(student_id, status, -1)
+        adjust_project_counts(instance.student_id, instance.status, 1)
+
+
+@receiver(post_delete, sender=Project)
+def decrement_project_counts(sender, instance, **kwargs):
+    adjust_project_counts(instance.student_id, instance.status, -1)
+
+
+@receiver(post_save, sender=Mentor)
+@receiver(post_delete, sender=Mentor)
+def refresh_mentor_facets(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate_mentor_facets()
+
+
+# Registered after update_skill_tags, so the refresh sees the new tags
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Mentor)
+@receiver(post_save, sender=Freelancer)
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Mentor)
+@receiver(post_delete, sender=Freelancer)
+def refresh_recommendations(sender, instance, raw=False, **kwargs):
+    if not raw:
+        queue_refresh(instance)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_save, sender=Mentor)
+@receiver(post_save, sender=Freelancer)
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_delete, sender=Mentor)
+@receiver(post_delete, sender=Freelancer)
+@receiver(post_delete, sender=Organization)
+def refresh_role_profile(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_role_profile(instance.user_id)
+
+
+@receiver(user_logged_in)
+def resolve_role_profile(sender, request, user, **kwargs):
+    # login() saves the session anyway, so the role rides along for free
+    if request is not None and hasattr(request, 'session'):
+        request.role_profile = remember_role_profile(request, user)
@@ -0,0 +1,198 @@
+from collections import Counter
+
+from django.core.cache import cache
+
+from .models import SkillTag, StudentProfile
+
+
+SKILL_GAP_SUMMARY_KEY = 'main:skill_gap_summary'
+SKILL_GAP_SUMMARY_TTL = 3600
+
+
+ROLE_SKILLS = {
+    'Full Stack Developer': ['Python', 'Django', 'JavaScript', 'React', 'SQL', 'Git', 'HTML/CSS'],
+    'Data Analyst': ['Python', 'SQL', 'Excel', 'Data Visualization'],
+    'UI/UX Designer': ['Figma', 'Adobe XD', 'User Research', 'HTML/CSS'],
+    'Mobile Developer': ['Java', 'Kotlin', 'API Integration'],
+    'DevOps Engineer': ['Linux', 'Docker', 'Kubernetes', 'AWS', 'CI/CD', 'Python', 'Git'],
+    'Finance' : ['Financial modelling', 'Accounting principles', 'Risk management', 'Proficiency in Tech'],
+    'AI/ML Engineer': ['Python', 'Tensorflow', 'PyTorch', 'Math', 'Statistics', 'Data Engineering', 'MLOps', 'Neural Networks'],
+}
+
+
+def normalize_skill(name):
+    """Case-folds a skill name and collapses inner whitespace, e.g. ' Machine  Learning' -> 'machine learning'."""
+    return ' '.join(name.split()).casefold()
+
+
+def parse_skills(text):
+    """Splits a comma-separated skills string into display names, dropping blanks and case-insensitive repeats."""
+    names = {}
+    for part in (text or '').split(','):
+        name = ' '.join(part.split())
+        # SkillTag.normalized holds 100 characters, so names alike up to there are one tag
+        key = normalize_skill(name)[:100]
+        if key and key not in names:
+            names[key] = name[:100]
+    return list(names.values())
+
+
+def get_or_create_tags(names):
+    """Returns the SkillTag rows for `names`, creating the missing ones in one INSERT."""
+    by_key = {}
+    for name in names:
+        by_key.setdefault(normalize_skill(name)[:100], name)
+
+    tags = {t.normalized: t for t in SkillTag.objects.filter(normalized__in=by_key)}
+    missing = [SkillTag(name=name, normalized=key) for key, name in by_key.items() if key not in tags]
+    if missing:
+        # ignore_conflicts covers a concurrent request creating the same tag
+        SkillTag.objects.bulk_create(missing, ignore_conflicts=True)
+        tags.update(
+            (t.normalized, t)
+            for t in SkillTag.objects.filter(normalized__in=[t.normalized for t in missing])
+        )
+    return list(tags.values())
+
+
+def sync_skill_tags(instance, text, created=False):
+    """Points `instance.skill_tags` at the tags parsed from its comma-separated text field."""
+    names = parse_skills(text)
+    if not names:
+        if not created:
+            instance.skill_tags.clear()
+        return
+    instance.skill_tags.set(get_or_create_tags(names))
+
+
+def with_skill(queryset, name):
+    """Filters students, freelancers or projects to those tagged with `name` (an index lookup, not a LIKE scan)."""
+    return queryset.filter(skill_tags__normalized=normalize_skill(name))
+
+
+class SkillGapMatrix:
+    """
+    Scores skill sets against every target role using bit vectors.
+
+    Each skill required by any role gets one bit, so a role is an int mask
+    and a student's skills collapse into a mask over the same bits. Matching
+    and missing skills are then a single AND / AND NOT per role, and every
+    student with the same relevant skills shares one cached result.
+    """
+
+    def __init__(self, roles=None):
+        self.roles = roles or ROLE_SKILLS
+        self.bits = {}
+        self.role_masks = {}
+        self._role_bits = {}
+        for role, required in self.roles.items():
+            mask = 0
+            pairs = []
+            for skill in required:
+                bit = self.bits.setdefault(normalize_skill(skill), len(self.bits))
+                mask |= 1 << bit
+                pairs.append((bit, skill))
+            self.role_masks[role] = mask
+            self._role_bits[role] = pairs
+        self._scores = {}
+
+    def encode(self, skill_names):
+        mask = 0
+        for name in skill_names:
+            bit = self.bits.get(normalize_skill(name))
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def _names(self, role, mask):
+        return [skill for bit, skill in self._role_bits[role] if mask >> bit & 1]
+
+    def score(self, mask):
+        """Returns {role: result} for a skills mask, in the shape skill.html renders."""
+        if mask not in self._scores:
+            results = {}
+            for role, role_mask in self.role_masks.items():
+                matched = mask & role_mask
+                results[role] = {
+                    'target_role': role,
+                    'matching_skills': self._names(role, matched),
+                    'missing_skills': self._names(role, role_mask & ~matched),
+                    'progress_percentage': _progress(matched, role_mask),
+                }
+            self._scores[mask] = results
+        return self._scores[mask]
+
+    def analyse(self, skill_names, role):
+        return self.score(self.encode(skill_names))[role]
+
+    def student_masks(self, students=None):
+        """
+        Returns {student_id: mask} for every student in `students` (default: all).
+
+        Reads only the tag links for skills some role requires, in one query
+        over the skill_tags join table.
+        """
+        students = StudentProfile.objects.all() if students is None else students
+        masks = dict.fromkeys(students.order_by('id').values_list('id', flat=True), 0)
+        links = StudentProfile.skill_tags.through.objects.filter(
+            studentprofile__in=students.values('id'),
+            skilltag__normalized__in=self.bits,
+        ).values_list('studentprofile_id', 'skilltag__normalized')
+        for student_id, normalized in links.iterator(chunk_size=5000):
+            masks[student_id] |= 1 << self.bits[normalized]
+        return masks
+
+    def summary(self, masks):
+        """Per-role cohort statistics, computed once per distinct mask without building skill lists."""
+        counts = Counter(masks.values())
+        total = sum(counts.values())
+        has_bit = [0] * len(self.bits)
+        progress_sum = dict.fromkeys(self.roles, 0)
+        ready = dict.fromkeys(self.roles, 0)
+        for mask, n in counts.items():
+            for bit in range(mask.bit_length()):
+                if mask >> bit & 1:
+                    has_bit[bit] += n
+            for role, role_mask in self.role_masks.items():
+                progress = _progress(mask & role_mask, role_mask)
+                progress_sum[role] += progress * n
+                if progress >= 70:
+                    ready[role] += n
+
+        report = {}
+        for role, required in self.roles.items():
+            missing = Counter({skill: total - has_bit[bit] for bit, skill in self._role_bits[role]})
+            report[role] = {
+                'required_skills': required,
+                'students': total,
+                'average_progress': round(progress_sum[role] / total, 1) if total else 0,
+                'ready': ready[role],
+                'most_missing': [(skill, n) for skill, n in missing.most_common() if n],
+            }
+        return report
+
+
+def _progress(matched_mask, role_mask):
+    return int(matched_mask.bit_count() / role_mask.bit_count() * 100)
+
+
+def get_skill_gap_summary():
+    """
+    SkillGapMatrix().summary() over every student, cached until a student's
+    skill tags change (or SKILL_GAP_SUMMARY_TTL, for bulk writes that skip signals).
+    """
+    summary = cache.get(SKILL_GAP_SUMMARY_KEY)
+    if summary is None:
+        matrix = SkillGapMatrix()
+        summary = matrix.summary(matrix.student_masks())
+        cache.set(SKILL_GAP_SUMMARY_KEY, summary, SKILL_GAP_SUMMARY_TTL)
+    return summary
+
+
+def invalidate_skill_gap_summary():
+    cache.delete(SKILL_GAP_SUMMARY_KEY)
+
+
+def analyse_skills(skill_names, role):
+    """Single-user skill gap for one role, as shown by the skill gap analyser."""
+    return SkillGapMatrix().analyse(skill_names, role)
@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+
+from .models import StudentProfile, Mentor, Freelancer, Organization, Project
+
+
+DASHBOARD_STATS_KEY = 'main:dashboard_stats'
+DASHBOARD_STATS_TTL = 60
+
+# Context name -> model counted for the admin dashboard
+COUNTED_MODELS = {
+    'total_users': User,
+    'total_students': StudentProfile,
+    'total_mentors': Mentor,
+    'total_freelancers': Freelancer,
+    'total_organizations': Organization,
+    'total_projects': Project,
+}
+
+
+def count_entities():
+    """Counts every model in COUNTED_MODELS in a single round trip (one scalar subquery per table)."""
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        f'(SELECT COUNT(*) FROM {quote(model._meta.db_table)})' for model in COUNTED_MODELS.values()
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {columns}')
+        row = cursor.fetchone()
+    return dict(zip(COUNTED_MODELS, row))
+
+
+def get_dashboard_stats():
+    """Entity counts for the admin dashboard, cached for DASHBOARD_STATS_TTL seconds."""
+    stats = cache.get(DASHBOARD_STATS_KEY)
+    if stats is None:
+        stats = count_entities()
+        cache.set(DASHBOARD_STATS_KEY, stats, DASHBOARD_STATS_TTL)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(DASHBOARD_STATS_KEY)
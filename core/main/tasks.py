@@ -0,0 +1,59 @@
+import atexit
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_WORKERS', 4),
+            thread_name_prefix='industrylink-worker',
+        )
+        atexit.register(_executor.shutdown, wait=True)
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", func.__name__)
+    finally:
+        # Worker threads keep their own DB connection; don't let it go stale
+        close_old_connections()
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Runs `func(*args, **kwargs)` on the background worker pool right away.
+
+    Safe to call from threads that are not serving a request; with
+    BACKGROUND_TASKS_EAGER set (tests), the task runs inline instead.
+    """
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        func(*args, **kwargs)
+    else:
+        _get_executor().submit(_run, func, args, kwargs)
+
+
+def enqueue(func, *args, **kwargs):
+    """
+    Runs `func(*args, **kwargs)` on the background worker pool once the
+    current transaction commits, so the task always sees the rows the
+    request just wrote.
+
+    Tasks still waiting when the process stops are lost. Each kind of task
+    has a management command that finds the work left undone and redoes
+    it (process_payments, reconcile_payments, make_thumbnails), so tasks
+    must be idempotent.
+    """
+    transaction.on_commit(lambda: run_in_background(func, *args, **kwargs))
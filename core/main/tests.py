@@ -1,3 +1,1769 @@
-from django.test import TestCase
+from datetime import date, timedelta
 
-# Create your tests here.
+import asyncio
+import importlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from core import urls as core_urls
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core import serializers
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from . import ratelimit, urls as main_urls
+from .avatars import thumbnail_names
+from .fake_daraja import callback_payload
+from .instrumentation import QueryRecorder
+from .models import (
+    Freelancer, Mentor, Organization, PaymentRequest, PaymentResult, Project, Recommendation, SearchDocument,
+    SkillTag, StudentProfile, UserProfile,
+)
+from .mentors import MENTOR_ORDERING
+from .mpesa import ACCESS_TOKEN_KEY, DarajaClient, MpesaRetryableError
+from .payments import record_results, reconcile_payments, send_stk_push, settle_payments
+from .pagination import _after, decode_cursor, paginate_keyset
+from .profiling import profile_dir, recent_captures
+from .recommendations import TOP_K, rebuild_recommendations
+from .registration import register_cohort
+from .roles import SESSION_KEY as ROLE_SESSION_KEY
+from .search import _fts5_available, search
+from .skills import SkillGapMatrix, analyse_skills, normalize_skill, with_skill
+from .stats import COUNTED_MODELS, get_dashboard_stats, invalidate_dashboard_stats
+from .transfer import MANIFEST, transfer_models
+from .counters import recount_project_counts
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    Asserts on the database's own query plan (EXPLAIN) rather than on
+    query counts, so a hot query that quietly falls back to a table scan
+    fails here first.
+    """
+
+    def setUp(self):
+        cache.clear()
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to scan; make the planner show what it would do at scale
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            used = f'INDEX {index_name}' in plan
+        else:
+            used = f' {index_name}' in plan and 'Index' in plan
+        self.assertTrue(used, f"Expected the plan to use {index_name}:\n{plan}")
+
+    def assertSeeksIndex(self, queryset, index_name):
+        """Like assertUsesIndex, but the index must also be searched with a condition, not read end to end."""
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            seeks = 'SEARCH' in plan and f'INDEX {index_name} (' in plan
+        else:
+            seeks = f' {index_name}' in plan and 'Index Cond' in plan
+        self.assertTrue(seeks, f"Expected the plan to search {index_name}:\n{plan}")
+
+    def assertNoSortStep(self, queryset):
+        plan = queryset.explain()
+        sorted_in_memory = 'TEMP B-TREE FOR ORDER BY' in plan if connection.vendor == 'sqlite' else 'Sort Key' in plan
+        self.assertFalse(sorted_in_memory, f"Expected rows to come back in index order:\n{plan}")
+
+
+class HotQueryIndexTests(QueryPlanTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('student', password='x')
+        cls.student = StudentProfile.objects.create(
+            user=user, course='Computer Science', institution='UoN', year_of_study=2,
+            email='student@example.com', skills='Python',
+        )
+        for i in range(3):
+            Project.objects.create(
+                student=cls.student, title=f'Project {i}', description='A project',
+                skills_used='Django', start_date=date(2025, 1, 1),
+            )
+
+    def test_projects_feed_first_page(self):
+        feed = Project.objects.order_by('-created_at', '-id')[:25]
+        self.assertUsesIndex(feed, 'project_created_idx')
+        self.assertNoSortStep(feed)
+
+    def test_projects_feed_next_page(self):
+        ordering = ('-created_at', '-id')
+        cursor = paginate_keyset(Project.objects.all(), ordering, page_size=1).next_cursor
+        # The filter paginate_keyset adds for a cursor
+        page = Project.objects.filter(_after(ordering, decode_cursor(cursor, 2))).order_by(*ordering)[:25]
+        self.assertSeeksIndex(page, 'project_created_idx')
+        self.assertNoSortStep(page)
+
+    def test_admin_dashboard_recent_projects(self):
+        recent = Project.objects.select_related('student__user').order_by('-created_at')[:5]
+        self.assertUsesIndex(recent, 'project_created_idx')
+
+    def test_student_dashboard_completed_count(self):
+        completed = Project.objects.filter(student=self.student, status='completed')
+        self.assertUsesIndex(completed, 'project_student_status_idx')
+
+    def test_admin_dashboard_recent_logins(self):
+        recent = User.objects.filter(last_login__isnull=False).order_by('-last_login')[:5]
+        self.assertUsesIndex(recent, 'auth_user_last_login_idx')
+        self.assertNoSortStep(recent)
+
+    def test_mentors_by_expertise(self):
+        mentors = Mentor.objects.filter(expertise_area='technology')
+        self.assertUsesIndex(mentors, 'mentor_expertise_name_idx')
+        self.assertNoSortStep(mentors)
+
+    def test_mentor_directory_pages(self):
+        first = Mentor.objects.order_by(*MENTOR_ORDERING)[:25]
+        self.assertUsesIndex(first, 'mentor_name_idx')
+        self.assertNoSortStep(first)
+        after = _after(MENTOR_ORDERING, ['M', 10])
+        for index, mentors in [
+            ('mentor_name_idx', Mentor.objects.all()),
+            ('mentor_expertise_name_idx', Mentor.objects.filter(expertise_area='design')),
+            ('mentor_availability_name_idx', Mentor.objects.filter(availability='Weekends')),
+        ]:
+            with self.subTest(index):
+                page = mentors.filter(after).order_by(*MENTOR_ORDERING)[:25]
+                self.assertSeeksIndex(page, index)
+                self.assertNoSortStep(page)
+
+
+def seed_dataset(students=40, projects_per_student=3, mentors=15, freelancers=10, organizations=5):
+    """
+    A dataset big enough that a per-row query shows up as dozens of queries, not one or two.
+    Users get no password (hashing dozens of them would dominate the run); tests use force_login.
+    """
+    skills = ['Python', 'Django', 'JavaScript', 'React', 'SQL', 'Figma', 'Excel', 'Docker']
+    for i in range(students):
+        user = User.objects.create_user(f'student{i}', first_name='Student', last_name=str(i))
+        UserProfile.objects.create(user=user, role='student')
+        student = StudentProfile.objects.create(
+            user=user, course='Computer Science', institution='UoN', year_of_study=i % 4 + 1,
+            email=f'student{i}@example.com', skills=', '.join(skills[i % 5:i % 5 + 3]),
+        )
+        for j in range(projects_per_student):
+            Project.objects.create(
+                student=student, title=f'Project {i}-{j}', description='A student project',
+                skills_used=', '.join(skills[j:j + 2]), start_date=date(2025, 1, 1),
+                status='completed' if j == 0 else 'ongoing',
+            )
+    for i in range(mentors):
+        user = User.objects.create_user(f'mentor{i}')
+        UserProfile.objects.create(user=user, role='mentor')
+        Mentor.objects.create(
+            user=user, full_name=f'Mentor {i}', job_title='Engineer', company='ACME',
+            expertise_area=Mentor.EXPERTISE_CHOICES[i % 4][0], years_of_experience=5,
+            availability='Available', hourly_rate=1000,
+        )
+    for i in range(freelancers):
+        user = User.objects.create_user(f'freelancer{i}')
+        UserProfile.objects.create(user=user, role='freelancer')
+        Freelancer.objects.create(
+            user=user, full_name=f'Freelancer {i}', profession='Web Developer',
+            specialization='Backend', email=f'freelancer{i}@example.com', skills='Python, Django',
+        )
+    for i in range(organizations):
+        user = User.objects.create_user(f'org{i}')
+        UserProfile.objects.create(user=user, role='organization')
+        Organization.objects.create(
+            user=user, organization_name=f'Org {i}', organization_type='Startup',
+            industry='Technology', email=f'org{i}@example.com',
+        )
+    User.objects.create_superuser('admin', 'admin@example.com', None)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Fails a test when a request runs more queries than its budget, or runs
+    the same SQL more than max_repeats times (an N+1).
+    """
+    max_repeats = 2
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        with QueryRecorder() as recorder:
+            result = func(*args, **kwargs)
+        self.assertLessEqual(recorder.count, budget, f"Over the query budget of {budget}: {recorder.summary()}")
+        self.assertFalse(
+            recorder.repeated(self.max_repeats),
+            f"The same SQL ran more than {self.max_repeats} times: {recorder.summary()}",
+        )
+        return result
+
+
+# url name -> (url kwargs, log in as, method, data, query budget)
+# Logged-in requests include the session and user lookups.
+QUERY_BUDGETS = {
+    'home': ({}, None, 'get', None, 0),
+    'contact': ({}, None, 'get', None, 0),
+    'projects': ({}, None, 'get', None, 2),
+    # The facet counts, on a cold cache, and one page of mentors
+    'mentor': ({}, None, 'get', None, 2),
+    'search': ({}, None, 'get', {'q': 'project'}, 3),
+    'skills': ({}, 'student0', 'get', None, 2),
+    'skill_gap_report': ({}, 'admin', 'get', None, 8),
+    'payment': ({}, None, 'get', None, 1),
+    'payment_status': ('payment', None, 'get', None, 1),
+    'mpesa_callback': ({'token': 'budget-token'}, None, 'post', 'callback', 3),
+    'api_projects': ({}, None, 'get', None, 3),
+    'api_mentors': ({}, None, 'get', None, 3),
+    'api_freelancers': ({}, None, 'get', None, 3),
+    'api_organizations': ({}, None, 'get', None, 2),
+    'avatar_file': ('avatar', None, 'get', None, 0),
+    'profiles': ({}, 'admin', 'get', None, 2),
+    'profile_download': ('capture', 'admin', 'get', None, 2),
+    'register': ({}, None, 'get', None, 0),
+    'login': ({}, None, 'get', None, 0),
+    'logout': ({}, 'student0', 'get', None, 4),
+    'dashboard': ({}, 'student0', 'get', None, 6),
+    'editProfile': ({}, 'student0', 'get', None, 3),
+    'add_project': ({}, 'student0', 'get', None, 2),
+    'view_project': ('project', 'student0', 'get', None, 3),
+    'edit_project': ('project', 'student0', 'get', None, 3),
+    'delete_project': ('project', 'student0', 'get', None, 3),
+}
+
+# The dashboard branches differ a lot, so each role gets its own budget
+DASHBOARD_BUDGETS = {
+    'student0': 6,
+    'mentor0': 5,
+    'freelancer0': 6,
+    'org0': 6,
+    'admin': 6,
+}
+
+
+class SkillTagTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=2, projects_per_student=1, mentors=0, freelancers=1, organizations=0)
+        cls.student = StudentProfile.objects.get(user__username='student0')
+
+    def tags(self, instance):
+        return sorted(instance.skill_tags.values_list('normalized', flat=True))
+
+    def test_backfill_migration_tags_existing_text(self):
+        backfill = importlib.import_module('main.migrations.0009_backfill_skill_tags').backfill_skill_tags
+        StudentProfile.objects.filter(pk=self.student.pk).update(skills=' machine   Learning, SQL,, sql ,Python')
+        SkillTag.objects.all().delete()
+
+        backfill(django_apps, None)
+        self.assertEqual(self.tags(self.student), ['machine learning', 'python', 'sql'])
+        self.assertEqual(SkillTag.objects.get(normalized='machine learning').name, 'machine Learning')
+        self.assertEqual(self.tags(Freelancer.objects.get()), ['django', 'python'])
+        self.assertEqual(self.tags(Project.objects.get(student=self.student)), ['django', 'python'])
+        self.assertEqual(SkillTag.objects.count(), 6)
+
+        # Running it again adds nothing
+        links = StudentProfile.skill_tags.through.objects.count()
+        backfill(django_apps, None)
+        self.assertEqual(StudentProfile.skill_tags.through.objects.count(), links)
+
+    def test_backfill_keys_tags_like_the_runtime(self):
+        backfill = importlib.import_module('main.migrations.0009_backfill_skill_tags').backfill_skill_tags
+        # 'ß' casefolds to 'ss', so truncating before casefolding would give a 120 character key
+        long_skill = 'ß' * 60
+        StudentProfile.objects.filter(pk=self.student.pk).update(skills=f'{long_skill}, {long_skill}x')
+        SkillTag.objects.all().delete()
+
+        backfill(django_apps, None)
+        self.assertEqual(self.tags(self.student), [normalize_skill(long_skill)[:100]])
+        tags = set(self.student.skill_tags.all())
+        self.student.refresh_from_db()
+        self.student.save()
+        self.assertEqual(set(self.student.skill_tags.all()), tags)
+
+    def test_editing_skills_adds_and_removes_links(self):
+        self.assertEqual(self.tags(self.student), ['django', 'javascript', 'python'])
+        self.student.skills = 'Python, Go ,  go'
+        self.student.save()
+        self.assertEqual(self.tags(self.student), ['go', 'python'])
+
+        # Saves that leave the skills out of update_fields keep the links
+        self.student.skills = ''
+        self.student.save(update_fields=['bio'])
+        self.assertEqual(self.tags(self.student), ['go', 'python'])
+        self.student.save()
+        self.assertEqual(self.tags(self.student), [])
+
+    def test_with_skill(self):
+        self.assertEqual(
+            list(with_skill(StudentProfile.objects.order_by('pk'), ' PYTHON ')), [self.student],
+        )
+        self.assertEqual(with_skill(StudentProfile.objects.all(), 'react').count(), 1)
+        self.assertEqual(with_skill(Freelancer.objects.all(), 'Django').count(), 1)
+        self.assertEqual(with_skill(Project.objects.all(), 'python').count(), 2)
+        self.assertFalse(with_skill(StudentProfile.objects.all(), 'Cobol').exists())
+
+
+class SkillGapTests(TestCase):
+    ROLES = {'Backend': ['Python', 'SQL', 'Docker'], 'Design': ['Figma', 'HTML/CSS']}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = {}
+        for username, skills in [('ada', 'python, SQL, Excel'), ('ben', 'Figma, html/css, Docker'), ('cy', '')]:
+            user = User.objects.create_user(username)
+            cls.students[username] = StudentProfile.objects.create(
+                user=user, course='CS', institution='UoN', year_of_study=1, email=f'{username}@example.com',
+                skills=skills,
+            )
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', None)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_scores_against_hand_computed_gaps(self):
+        matrix = SkillGapMatrix(self.ROLES)
+        masks = matrix.student_masks()
+        ada, ben = matrix.score(masks[self.students['ada'].pk]), matrix.score(masks[self.students['ben'].pk])
+        self.assertEqual(
+            (ada['Backend']['matching_skills'], ada['Backend']['missing_skills'], ada['Backend']['progress_percentage']),
+            (['Python', 'SQL'], ['Docker'], 66),
+        )
+        self.assertEqual((ada['Design']['missing_skills'], ada['Design']['progress_percentage']), (['Figma', 'HTML/CSS'], 0))
+        self.assertEqual((ben['Backend']['matching_skills'], ben['Design']['progress_percentage']), (['Docker'], 100))
+        self.assertEqual(matrix.score(masks[self.students['cy'].pk])['Backend']['missing_skills'], ['Python', 'SQL', 'Docker'])
+
+        summary = matrix.summary(masks)
+        self.assertEqual(
+            {role: (s['students'], s['average_progress'], s['ready'], s['most_missing']) for role, s in summary.items()},
+            {
+                'Backend': (3, 33.0, 0, [('Python', 2), ('SQL', 2), ('Docker', 2)]),
+                'Design': (3, 33.3, 1, [('Figma', 2), ('HTML/CSS', 2)]),
+            },
+        )
+        # The analyser page goes through the same matrix
+        self.assertEqual(analyse_skills(['Python', 'sql'], 'Data Analyst')['missing_skills'], ['Excel', 'Data Visualization'])
+
+    def test_report_pages_cover_every_student_once(self):
+        self.client.force_login(self.admin)
+        seen = []
+        after = 0
+        while after is not None:
+            response = self.client.get(reverse('main:skill_gap_report'), {'after': after, 'limit': 2})
+            seen += [student['student_id'] for student in response.json()['students']]
+            after = response.json()['next_after']
+        self.assertEqual(seen, sorted(student.pk for student in self.students.values()))
+        self.assertEqual(response.json()['summary']['Data Analyst']['students'], 3)
+
+    def test_report_summary_is_cached_until_skills_change(self):
+        self.client.force_login(self.admin)
+        url = reverse('main:skill_gap_report')
+        self.client.get(url, {'limit': 1})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'after': self.students['ada'].pk, 'limit': 1})
+        # The second page reads its own students' tags, not the whole cohort's
+        tag_reads = [q['sql'] for q in queries.captured_queries if 'main_studentprofile_skill_tags' in q['sql']]
+        self.assertEqual(len(tag_reads), 1)
+        self.assertIn(f"IN ({self.students['ben'].pk})", tag_reads[0])
+
+        cy = self.students['cy']
+        cy.skills = 'Excel'
+        cy.save()
+        summary = self.client.get(url, {'limit': 1}).json()['summary']
+        self.assertEqual(dict(summary['Data Analyst']['most_missing'])['Excel'], 1)
+
+    def test_report_rejects_bad_limits(self):
+        self.client.force_login(self.admin)
+        for limit in ['0', '-1', 'ten']:
+            with self.subTest(limit=limit):
+                response = self.client.get(reverse('main:skill_gap_report'), {'limit': limit})
+                self.assertEqual(response.status_code, 400)
+
+    def test_report_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'report')
+        call_command('skill_gap_report', role=['Data Analyst'], format='json', summary=True, output=path, stdout=StringIO())
+        with open(path) as f:
+            self.assertEqual(json.load(f)['Data Analyst']['most_missing'][0], ['Data Visualization', 3])
+        call_command('skill_gap_report', role=['Data Analyst'], output=path, stdout=StringIO())
+        with open(path) as f:
+            rows = f.read().splitlines()
+        self.assertEqual(len(rows), 4)
+        self.assertIn(f"{self.students['ada'].pk},ada,Data Analyst,75,Python; SQL; Excel,Data Visualization", rows)
+
+
+class DashboardStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=2, projects_per_student=1, mentors=1, freelancers=1, organizations=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_are_cached(self):
+        with self.assertNumQueries(1):
+            stats = get_dashboard_stats()
+        self.assertEqual(stats, {
+            'total_users': 6, 'total_students': 2, 'total_mentors': 1,
+            'total_freelancers': 1, 'total_organizations': 1, 'total_projects': 2,
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_stats(), stats)
+
+        # Edits leave the counts alone
+        project = Project.objects.first()
+        project.title = 'Renamed'
+        project.save()
+        with self.assertNumQueries(0):
+            get_dashboard_stats()
+
+        invalidate_dashboard_stats()
+        with self.assertNumQueries(1):
+            get_dashboard_stats()
+
+    def test_creating_or_deleting_a_counted_row_refreshes_the_counts(self):
+        user = User.objects.create_user('spare')
+        student = StudentProfile.objects.first()
+        create = {
+            'total_users': lambda: User.objects.create_user('extra'),
+            'total_students': lambda: StudentProfile.objects.create(
+                user=user, year_of_study=1, course='Law', institution='UoN', email='spare@example.com',
+            ),
+            'total_mentors': lambda: Mentor.objects.create(
+                user=user, full_name='Spare', job_title='Engineer', company='ACME', expertise_area='design',
+                years_of_experience=1, availability='Available',
+            ),
+            'total_freelancers': lambda: Freelancer.objects.create(
+                user=user, full_name='Spare', profession='Designer', specialization='UI', email='spare@example.com',
+            ),
+            'total_organizations': lambda: Organization.objects.create(
+                user=user, organization_name='Spare', organization_type='NGO', industry='Health',
+                email='spare@example.com',
+            ),
+            'total_projects': lambda: Project.objects.create(
+                student=student, title='Spare', description='A student project', skills_used='',
+                start_date=date(2025, 1, 1),
+            ),
+        }
+        self.assertEqual(set(create), set(COUNTED_MODELS))
+        for name, make in create.items():
+            with self.subTest(name):
+                before = get_dashboard_stats()[name]
+                instance = make()
+                self.assertEqual(get_dashboard_stats()[name], before + 1)
+                instance.delete()
+                self.assertEqual(get_dashboard_stats()[name], before)
+
+
+class ProjectCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=2, projects_per_student=3, mentors=0, freelancers=0, organizations=0)
+
+    def setUp(self):
+        cache.clear()
+        self.student = StudentProfile.objects.get(user__username='student0')
+
+    def assertCounts(self, student, total, ongoing, completed, paused):
+        student.refresh_from_db()
+        self.assertEqual(
+            (student.project_count, student.ongoing_project_count,
+             student.completed_project_count, student.paused_project_count),
+            (total, ongoing, completed, paused),
+        )
+
+    def test_counts_follow_creates_edits_and_deletes(self):
+        # seed_dataset: the first project is completed, the rest ongoing
+        self.assertCounts(self.student, 3, 2, 1, 0)
+        project = self.student.projects.filter(status='ongoing').first()
+        project.status = 'paused'
+        project.save()
+        self.assertCounts(self.student, 3, 1, 1, 1)
+        project.title = 'Renamed'
+        project.save(update_fields=['title'])
+        self.assertCounts(self.student, 3, 1, 1, 1)
+        project.delete()
+        self.assertCounts(self.student, 2, 1, 1, 0)
+
+    def test_moving_a_project_between_students(self):
+        other = StudentProfile.objects.get(user__username='student1')
+        project = self.student.projects.filter(status='completed').first()
+        project.student = other
+        project.save()
+        self.assertCounts(self.student, 2, 2, 0, 0)
+        self.assertCounts(other, 4, 2, 2, 0)
+
+    def test_recount_repairs_drift(self):
+        StudentProfile.objects.filter(pk=self.student.pk).update(project_count=0, completed_project_count=7)
+        self.assertEqual(recount_project_counts(batch_size=1), 1)
+        self.assertCounts(self.student, 3, 2, 1, 0)
+        self.assertEqual(recount_project_counts(), 0)
+
+    def test_dashboard_reads_the_counters(self):
+        StudentProfile.objects.filter(pk=self.student.pk).update(project_count=42)
+        self.client.force_login(self.student.user)
+        response = self.client.get(reverse('main:dashboard'))
+        self.assertEqual(response.context['project_count'], 42)
+        self.assertEqual(response.context['completed_projects'], 1)
+
+
+class RoleProfileTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=2, projects_per_student=1, mentors=1, freelancers=0, organizations=0)
+        cls.student = StudentProfile.objects.get(user__username='student0')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_login_keeps_the_role_in_the_session(self):
+        self.client.force_login(self.student.user)
+        stored = self.client.session[ROLE_SESSION_KEY]
+        self.assertEqual((stored['role'], stored['profile']), ('student', self.student.pk))
+
+        # Session, user, then the student with their UserProfile in one query
+        response = self.client.get(reverse('main:editProfile'))
+        self.assertEqual(response.wsgi_request.role_profile.profile, self.student)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('main:editProfile'))
+
+    def test_saving_a_profile_resolves_the_role_again(self):
+        self.client.force_login(self.student.user)
+        user_profile = UserProfile.objects.get(user=self.student.user)
+        user_profile.role = 'mentor'
+        user_profile.save()
+        response = self.client.get(reverse('main:dashboard'))
+        self.assertEqual(response.context['user_role'], 'mentor')
+        self.assertEqual(self.client.session[ROLE_SESSION_KEY]['role'], 'mentor')
+
+    def test_accounts_without_a_user_profile_go_by_their_role_profile(self):
+        UserProfile.objects.filter(user=self.student.user).delete()
+        self.client.force_login(self.student.user)
+        response = self.client.get(reverse('main:dashboard'))
+        self.assertEqual(response.context['student'], self.student)
+        self.assertRedirects(self.client.get(reverse('main:editProfile')), reverse('main:dashboard'))
+
+    def test_new_projects_are_attached_without_reading_the_profile(self):
+        self.client.force_login(self.student.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('main:add_project'), {
+                'title': 'Role project', 'description': 'A student project', 'skills_used': 'Python',
+                'status': 'ongoing', 'start_date': '2025-01-01',
+            })
+        self.assertEqual(Project.objects.get(title='Role project').student, self.student)
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'FROM "main_studentprofile"' in q['sql']])
+
+    def test_anonymous_requests_resolve_nothing(self):
+        response = self.client.get(reverse('main:projects'))
+        self.assertIsNone(response.wsgi_request.role_profile.role)
+
+
+class SessionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=1, projects_per_student=1, mentors=0, freelancers=0, organizations=0)
+        cls.student = StudentProfile.objects.get(user__username='student0')
+
+    def setUp(self):
+        cache.clear()
+        caches['sessions'].clear()
+
+    def test_clearing_expired_sessions_in_batches(self):
+        for _ in range(5):
+            SessionStore().create()
+        fresh = SessionStore()
+        fresh.create()
+        Session.objects.exclude(session_key=fresh.session_key).update(expire_date=timezone.now() - timedelta(days=1))
+        out = StringIO()
+        call_command('clear_expired_sessions', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [fresh.session_key])
+
+        for options in ({'batch_size': 0}, {'batch_size': -1}, {'pause': -1}):
+            with self.subTest(**options), self.assertRaises(CommandError):
+                call_command('clear_expired_sessions', stdout=out, **options)
+
+    def test_messages_travel_in_a_cookie(self):
+        self.client.force_login(self.student.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('main:delete_project', args=[self.student.projects.get().pk]))
+        self.assertIn('messages', response.cookies)
+        self.assertFalse([q for q in queries if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')])
+        self.assertContains(self.client.get(response.url), 'deleted successfully')
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_cache_sessions_never_touch_the_session_table(self):
+        self.client.force_login(self.student.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('main:dashboard'))
+        self.assertEqual(response.context['student'], self.student)
+        self.assertFalse([q for q in queries if 'django_session' in q['sql']])
+        self.assertFalse(Session.objects.exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RateLimitTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('member', password='right')
+
+    def setUp(self):
+        cache.clear()
+        ratelimit._local_cache.clear()
+
+    @override_settings(RATE_LIMITS={'login': {'ip': (100, 60), 'username': (2, 300)}})
+    def test_login_is_refused_before_any_work(self):
+        self.client.get(reverse('main:login'))
+        for _ in range(2):
+            response = self.client.post(reverse('main:login'), {'username': 'Member', 'password': 'wrong'})
+            self.assertContains(response, 'Incorrect username or password')
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('main:login'), {'username': 'member', 'password': 'right'})
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 600)
+        # Other accounts are counted separately
+        response = self.client.post(reverse('main:login'), {'username': 'nobody', 'password': 'x'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_usernames_cost_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('main:login'), {'username': 'nobody', 'password': 'x'})
+        self.assertContains(response, 'Incorrect username or password')
+
+    @override_settings(RATE_LIMITS={'contact': {'ip': (2, 60)}})
+    def test_windows_slide(self):
+        request = RequestFactory().post('/contact/')
+        for now, expected in [(0, None), (10, None), (30, 60), (60, 30), (89, 1), (90, None)]:
+            with self.subTest(now=now), mock.patch.object(ratelimit.time, 'time', return_value=1200 + now):
+                self.assertEqual(ratelimit.check(request, 'contact'), expected)
+
+    @override_settings(RATE_LIMITS={'contact': {'ip': (1, 60)}})
+    def test_counts_in_memory_when_the_cache_is_down(self):
+        broken = mock.Mock(**{'get_many.side_effect': ConnectionError})
+        with mock.patch.object(ratelimit, '_cache', return_value=broken), self.assertLogs('main.ratelimit', 'WARNING'):
+            self.assertEqual(self.client.post(reverse('main:contact'), {'name': 'A'}).status_code, 302)
+            self.assertEqual(self.client.post(reverse('main:contact'), {'name': 'A'}).status_code, 429)
+        self.assertEqual(self.client.get(reverse('main:contact')).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RegistrationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def register(self, **data):
+        return self.client.post(reverse('main:register'), {
+            'username': 'newcomer', 'first_name': 'New', 'last_name': 'Comer', 'email': 'new@example.com',
+            'password1': 'Tall-Giraffe-42', 'password2': 'Tall-Giraffe-42', 'phone': '0712345678', **data,
+        })
+
+    def test_an_account_is_three_inserts_in_one_transaction(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.register(user_type='student', institution='UoN', course='Computer Science')
+        self.assertRedirects(response, reverse('main:dashboard'), fetch_redirect_response=False)
+        student = StudentProfile.objects.get(user__username='newcomer')
+        self.assertEqual((student.institution, student.year_of_study, student.user.profile.role), ('UoN', 1, 'student'))
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT')]
+        self.assertEqual([sql.split('"')[1] for sql in inserts[:3]], ['auth_user', 'main_userprofile', 'main_studentprofile'])
+
+        # One transaction: a failure on the second insert leaves no user behind
+        with mock.patch.object(UserProfile.objects, 'create', side_effect=IntegrityError('no room')):
+            response = self.register(username='second', email='second@example.com', user_type='student')
+        self.assertContains(response, 'Registration failed')
+        self.assertFalse(User.objects.filter(username='second').exists())
+
+    def test_a_failed_registration_leaves_nothing_behind(self):
+        # The role profile is the last of the three rows
+        with mock.patch.object(StudentProfile, 'save', side_effect=IntegrityError('no room')):
+            response = self.register(user_type='student')
+        self.assertContains(response, 'Registration failed')
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+        self.assertFalse(UserProfile.objects.exists())
+
+    def test_importing_a_cohort(self):
+        User.objects.create_user('Taken')
+        rows = [
+            'username,email,password,first_name,course,year_of_study,skills',
+            'amina,amina@example.com,Tall-Giraffe-42,Amina,Statistics,2,"Python, SQL"',
+            'brian,brian@example.com,Quiet-Otter-77,Brian,Finance,,',
+            'AMINA,other@example.com,Tall-Giraffe-42,Amina,Statistics,2,',
+            'taken,taken@example.com,Tall-Giraffe-42,,,,',
+            'carol,carol@example.com,password,Carol,,,',
+            'dan,,Tall-Giraffe-42,Dan,,,',
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('\n'.join(rows))
+        self.addCleanup(os.remove, f.name)
+        out, err = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_cohort', f.name, institution='JKUAT', workers=2, batch_size=2, stdout=out, stderr=err)
+
+        self.assertIn('Created 2 accounts, skipped 4 rows', out.getvalue())
+        for line in ['Line 4: username AMINA appears more than once', 'Line 5: username taken is taken',
+                     'Line 6: This password is too common.', 'Line 7: email is required']:
+            self.assertIn(line, err.getvalue())
+        amina = StudentProfile.objects.get(user__username='amina')
+        self.assertEqual((amina.institution, amina.year_of_study, amina.user.profile.role), ('JKUAT', 2, 'student'))
+        self.assertEqual(sorted(amina.skill_tags.values_list('normalized', flat=True)), ['python', 'sql'])
+        self.assertTrue(amina.user.check_password('Tall-Giraffe-42'))
+        self.assertEqual(StudentProfile.objects.get(user__username='brian').year_of_study, 1)
+
+    def test_a_cohort_batch_is_one_transaction(self):
+        rows = [
+            {'username': name, 'email': f'{name}@example.com', 'password': 'Tall-Giraffe-42'}
+            for name in ('amina', 'brian')
+        ]
+        with mock.patch.object(StudentProfile.objects, 'bulk_create', side_effect=IntegrityError('no room')):
+            with self.assertRaises(IntegrityError):
+                register_cohort(rows, workers=1)
+        self.assertFalse(User.objects.filter(username__in=['amina', 'brian']).exists())
+        self.assertFalse(UserProfile.objects.exists())
+
+    def test_cohort_emails_are_unique(self):
+        User.objects.create_user('elder', 'Elder@Example.com')
+        rows = [
+            {'username': 'amina', 'email': 'amina@example.com', 'password': 'Tall-Giraffe-42'},
+            {'username': 'brian', 'email': 'AMINA@example.com', 'password': 'Tall-Giraffe-42'},
+            {'username': 'carol', 'email': 'elder@example.com', 'password': 'Tall-Giraffe-42'},
+        ]
+        student_ids, errors = register_cohort(rows, workers=1)
+        self.assertEqual(errors, [(2, 'email AMINA@example.com appears more than once'),
+                                  (3, 'email elder@example.com is taken')])
+        self.assertEqual(list(StudentProfile.objects.filter(pk__in=student_ids).values_list('email', flat=True)),
+                         ['amina@example.com'])
+
+    def test_skills_alike_up_to_the_tag_length_are_one_tag(self):
+        long_skill = 'Distributed ' + 'x' * 100
+        rows = [{
+            'username': 'amina', 'email': 'amina@example.com', 'password': 'Tall-Giraffe-42',
+            'skills': f'{long_skill} one, {long_skill.upper()} two, Python',
+        }]
+        student_ids, errors = register_cohort(rows, workers=1)
+        self.assertEqual(errors, [])
+        student = StudentProfile.objects.get(pk__in=student_ids)
+        self.assertEqual(sorted(student.skill_tags.values_list('normalized', flat=True)),
+                         sorted([long_skill.casefold()[:100], 'python']))
+
+
+@override_settings(MPESA_CALLBACK_TOKEN='s3cret')
+class PaymentTests(TestCase):
+
+    def payment(self, checkout_request_id, status='sent'):
+        return PaymentRequest.objects.create(
+            payment_type='donation', phone_number='254712345678', amount=50, description='Donation',
+            status=status, checkout_request_id=checkout_request_id,
+        )
+
+    def callback(self, token, payload):
+        url = reverse('main:mpesa_callback', kwargs={'token': token} if token else None)
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_callbacks_need_the_token(self):
+        payment = self.payment('ws_CO_1')
+        self.assertEqual(self.callback(None, callback_payload('ws_CO_1')).status_code, 404)
+        self.assertEqual(self.callback('wrong', callback_payload('ws_CO_1')).status_code, 404)
+        self.assertFalse(PaymentResult.objects.exists())
+
+        self.assertEqual(self.callback('s3cret', callback_payload('ws_CO_1')).status_code, 200)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+
+    def test_callbacks_are_refused_without_a_token_configured(self):
+        self.payment('ws_CO_1')
+        with override_settings(MPESA_CALLBACK_TOKEN=''):
+            self.assertEqual(self.callback(None, callback_payload('ws_CO_1')).status_code, 404)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.callback(None, callback_payload('ws_CO_1')).status_code, 200)
+
+    def test_duplicate_deliveries_are_recorded_once(self):
+        payment = self.payment('ws_CO_1')
+        for result_code in (1032, 0):
+            self.assertEqual(self.callback('s3cret', callback_payload('ws_CO_1', result_code)).status_code, 200)
+        result = PaymentResult.objects.get()
+        self.assertEqual((result.checkout_request_id, result.result_code), ('ws_CO_1', 1032))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'cancelled')
+
+        self.assertEqual(self.callback('s3cret', {'Body': {}}).status_code, 400)
+
+    def test_settling_only_moves_payments_still_sent(self):
+        sent, failed, completed = self.payment('ws_CO_1'), self.payment('ws_CO_2'), self.payment('ws_CO_3', 'completed')
+        PaymentResult.objects.bulk_create([
+            PaymentResult(checkout_request_id='ws_CO_1', result_code=0, result_desc='Paid'),
+            PaymentResult(checkout_request_id='ws_CO_2', result_code=2001, result_desc='Wrong PIN'),
+            PaymentResult(checkout_request_id='ws_CO_3', result_code=1032, result_desc='Cancelled'),
+        ])
+        self.assertEqual(settle_payments(['ws_CO_1', 'ws_CO_2', 'ws_CO_3', 'ws_CO_1']), 2)
+        self.assertEqual(settle_payments(['ws_CO_1', 'ws_CO_2', 'ws_CO_3']), 0)
+        for payment, status, description in [
+            (sent, 'completed', 'Paid'), (failed, 'failed', 'Wrong PIN'), (completed, 'completed', ''),
+        ]:
+            payment.refresh_from_db()
+            self.assertEqual((payment.status, payment.response_description), (status, description))
+
+    def test_reconcile_applies_stored_results_then_queries_daraja(self):
+        stored, answered, pending = self.payment('ws_CO_1'), self.payment('ws_CO_2'), self.payment('ws_CO_3')
+        self.payment('', 'queued')
+        record_results([PaymentResult(checkout_request_id='ws_CO_1', result_code=0, result_desc='Paid')])
+        PaymentRequest.objects.filter(pk=stored.pk).update(status='sent')
+
+        def stk_query(checkout_request_id):
+            if checkout_request_id == 'ws_CO_3':
+                raise MpesaRetryableError('The transaction is being processed')
+            return {'ResultCode': '1032', 'ResultDesc': 'Request cancelled by user'}
+
+        client = mock.Mock(stk_query=mock.Mock(side_effect=stk_query))
+        with mock.patch('main.payments.get_client', return_value=client):
+            self.assertEqual(reconcile_payments(older_than=0, batch_size=1), (2, 1))
+        self.assertEqual([c.args[0] for c in client.stk_query.call_args_list], ['ws_CO_2', 'ws_CO_3'])
+        for payment, status in [(stored, 'completed'), (answered, 'cancelled'), (pending, 'sent')]:
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, status)
+        self.assertEqual(PaymentResult.objects.get(checkout_request_id='ws_CO_2').source, 'query')
+
+        # The customer has answered by the next run
+        client.stk_query.side_effect = lambda checkout_request_id: {'ResultCode': '0', 'ResultDesc': 'Paid'}
+        out = StringIO()
+        with mock.patch('main.payments.get_client', return_value=client):
+            call_command('reconcile_payments', older_than=0, stdout=out)
+        self.assertIn('Queried 1 pending payments, settled 1', out.getvalue())
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'completed')
+
+    @override_settings(MPESA_PENDING_TIMEOUT=600)
+    def test_pending_payments_are_matched_to_their_callback(self):
+        answered, other_amount, expired, waiting = [self.payment('', 'pending') for _ in range(4)]
+        PaymentRequest.objects.filter(pk=other_amount.pk).update(amount=80)
+        PaymentRequest.objects.filter(pk=expired.pk).update(updated_at=timezone.now() - timedelta(seconds=601))
+        self.payment('ws_CO_known')
+        for checkout_request_id in ('ws_CO_known', 'ws_CO_lost'):
+            self.callback('s3cret', callback_payload(checkout_request_id, amount=50, phone_number=254712345678))
+
+        client = mock.Mock(stk_query=mock.Mock(side_effect=MpesaRetryableError('busy')))
+        with mock.patch('main.payments.get_client', return_value=client):
+            reconcile_payments(older_than=0)
+        for payment, status, checkout_request_id in [
+            (answered, 'completed', 'ws_CO_lost'), (other_amount, 'pending', ''),
+            (expired, 'failed', ''), (waiting, 'pending', ''),
+        ]:
+            payment.refresh_from_db()
+            self.assertEqual((payment.status, payment.checkout_request_id), (status, checkout_request_id))
+        self.assertEqual(expired.response_description, 'M-Pesa never confirmed this payment')
+
+
+def daraja_response(status, data):
+    return mock.Mock(status_code=status, json=mock.Mock(return_value=data))
+
+
+ACCESS_TOKEN = daraja_response(200, {'access_token': 'token-1', 'expires_in': '3599'})
+ACCEPTED = daraja_response(200, {
+    'MerchantRequestID': 'm-1', 'CheckoutRequestID': 'ws_CO_1', 'ResponseCode': '0',
+    'ResponseDescription': 'Success. Request accepted for processing',
+})
+
+
+@override_settings(
+    MPESA_CONSUMER_KEY='key', MPESA_CONSUMER_SECRET='secret', MPESA_EXPRESS_SHORTCODE='174379',
+    MPESA_PASSKEY='passkey', MPESA_MAX_ATTEMPTS=4, MPESA_RETRY_BACKOFF=0.5,
+    MPESA_CALLBACK_URL='https://example.com/payment/callback/s3cret/',
+)
+class DarajaTests(TestCase):
+    """send_stk_push against a mocked Daraja: every HTTP call goes through the client's session."""
+
+    def setUp(self):
+        cache.clear()
+        self.daraja = DarajaClient(base_url='https://daraja.test')
+        self.http = mock.patch.object(self.daraja.session, 'request').start()
+        self.sleep = mock.patch('main.payments.time.sleep').start()
+        mock.patch('main.payments.get_client', return_value=self.daraja).start()
+        self.addCleanup(mock.patch.stopall)
+        self.payment = PaymentRequest.objects.create(
+            payment_type='donation', phone_number='254712345678', amount=50, description='Donation',
+        )
+
+    def push(self):
+        send_stk_push(self.payment.pk)
+        self.payment.refresh_from_db()
+        return self.payment
+
+    def status(self):
+        return self.client.get(reverse('main:payment_status', args=[self.payment.reference])).json()
+
+    def test_accepted_push(self):
+        self.http.side_effect = [ACCESS_TOKEN, ACCEPTED]
+        payment = self.push()
+        self.assertEqual((payment.status, payment.checkout_request_id, payment.attempts), ('sent', 'ws_CO_1', 1))
+
+        token_call, push_call = self.http.call_args_list
+        self.assertEqual(token_call.args, ('get', 'https://daraja.test/oauth/v1/generate?grant_type=client_credentials'))
+        self.assertEqual(token_call.kwargs['auth'], ('key', 'secret'))
+        self.assertEqual(push_call.args, ('post', 'https://daraja.test/mpesa/stkpush/v1/processrequest'))
+        self.assertEqual(push_call.kwargs['headers'], {'Authorization': 'Bearer token-1'})
+        sent = push_call.kwargs['json']
+        self.assertEqual((sent['PhoneNumber'], sent['Amount'], sent['CallBackURL']),
+                         ('254712345678', 50, 'https://example.com/payment/callback/s3cret/'))
+        self.sleep.assert_not_called()
+
+        self.assertEqual(self.status(), {
+            'reference': str(payment.reference), 'status': 'sent', 'status_display': 'Sent to phone',
+            'message': 'Success. Request accepted for processing',
+        })
+        self.assertEqual(self.client.get(reverse('main:payment_status', args=[uuid.uuid4()])).status_code, 404)
+
+    def test_unsent_requests_are_retried_with_backoff(self):
+        refused = requests.ConnectionError(MaxRetryError(None, '/', NewConnectionError(None, 'Connection refused')))
+        self.http.side_effect = [
+            daraja_response(503, {}), ACCESS_TOKEN, daraja_response(429, {}), refused, ACCEPTED,
+        ]
+        with self.assertLogs('main.payments', 'WARNING'):
+            payment = self.push()
+        self.assertEqual((payment.status, payment.attempts), ('sent', 4))
+        self.assertEqual([c.args for c in self.sleep.call_args_list], [(0.5,), (1.0,), (2.0,)])
+
+    @override_settings(MPESA_MAX_ATTEMPTS=4)
+    def test_connect_timeouts_are_retried(self):
+        self.http.side_effect = [ACCESS_TOKEN, requests.ConnectTimeout('timed out'), ACCEPTED]
+        with self.assertLogs('main.payments', 'WARNING'):
+            payment = self.push()
+        self.assertEqual((payment.status, payment.attempts), ('sent', 2))
+
+    def test_pushes_that_may_have_been_sent_are_not_repeated(self):
+        for failure in (daraja_response(503, {}), requests.ReadTimeout('read timed out'),
+                        requests.ConnectionError('Connection aborted')):
+            with self.subTest(failure):
+                cache.clear()
+                self.daraja._token = None
+                PaymentRequest.objects.filter(pk=self.payment.pk).update(status='queued', attempts=0)
+                self.http.reset_mock()
+                self.http.side_effect = [ACCESS_TOKEN, failure]
+                with self.assertLogs('main.payments', 'WARNING'):
+                    payment = self.push()
+                self.assertEqual((payment.status, payment.attempts), ('pending', 1))
+                self.assertEqual(self.http.call_count, 2)
+                self.sleep.assert_not_called()
+                self.assertEqual(self.status()['status_display'], 'Awaiting confirmation')
+
+                out = StringIO()
+                call_command('process_payments', older_than=0, stdout=out)
+                self.assertEqual(out.getvalue(), '')
+                self.push()
+                self.assertEqual(self.http.call_count, 2)
+
+    def test_giving_up_after_the_last_attempt(self):
+        self.http.side_effect = [ACCESS_TOKEN] + [daraja_response(429, {})] * 4
+        with self.assertLogs('main.payments', 'WARNING'):
+            payment = self.push()
+        self.assertEqual((payment.status, payment.attempts, payment.last_error), ('failed', 4, 'Daraja returned HTTP 429'))
+        self.assertEqual(self.sleep.call_count, 3)
+
+    def test_permanent_failures_are_not_retried(self):
+        self.http.side_effect = [ACCESS_TOKEN, daraja_response(400, {'errorMessage': 'Bad Request - Invalid PhoneNumber'})]
+        payment = self.push()
+        self.assertEqual((payment.status, payment.attempts), ('failed', 1))
+        self.sleep.assert_not_called()
+        self.assertEqual(self.status()['message'], 'Bad Request - Invalid PhoneNumber')
+
+        # The row is settled, so running it again sends nothing
+        self.push()
+        self.assertEqual(self.http.call_count, 2)
+
+    def test_access_token_is_cached(self):
+        self.http.side_effect = [ACCESS_TOKEN, ACCEPTED, ACCEPTED]
+        self.push()
+        self.daraja.stk_push('0712345678', 1, 'ref', 'desc', 'https://example.com/')
+        self.assertEqual([c.args[0] for c in self.http.call_args_list], ['get', 'post', 'post'])
+        self.assertEqual(cache.get(ACCESS_TOKEN_KEY), 'token-1')
+
+        # Another worker process reads it from the shared cache
+        other = DarajaClient(base_url='https://daraja.test')
+        with mock.patch.object(other.session, 'request', side_effect=[ACCEPTED]) as other_http:
+            other.stk_push('0712345678', 1, 'ref', 'desc', 'https://example.com/')
+        self.assertEqual(other_http.call_args.kwargs['headers'], {'Authorization': 'Bearer token-1'})
+
+    def test_rejected_token_is_fetched_again(self):
+        self.http.side_effect = [
+            ACCESS_TOKEN, daraja_response(401, {}),
+            daraja_response(200, {'access_token': 'token-2', 'expires_in': '3599'}), ACCEPTED,
+        ]
+        with self.assertLogs('main.payments', 'WARNING'):
+            payment = self.push()
+        self.assertEqual((payment.status, payment.attempts), ('sent', 2))
+        self.assertEqual(self.http.call_args.kwargs['headers'], {'Authorization': 'Bearer token-2'})
+        self.assertEqual(cache.get(ACCESS_TOKEN_KEY), 'token-2')
+
+    @override_settings(MPESA_PROCESSING_LEASE=60)
+    def test_claims_left_by_a_crashed_worker_expire(self):
+        live, crashed = [
+            PaymentRequest.objects.create(
+                payment_type='donation', phone_number='254712345679', amount=50, description='Donation',
+                status='processing', attempts=attempts,
+            )
+            for attempts in (0, 1)
+        ]
+        PaymentRequest.objects.filter(pk__in=[self.payment.pk, crashed.pk]).update(
+            status='processing', updated_at=timezone.now() - timedelta(seconds=61),
+        )
+        self.http.side_effect = [ACCESS_TOKEN, ACCEPTED]
+        out = StringIO()
+        call_command('process_payments', older_than=0, stdout=out)
+        self.assertIn('Processed 1 payments', out.getvalue())
+        send_stk_push(live.pk)
+        send_stk_push(crashed.pk)
+        self.assertEqual(self.http.call_count, 2)
+
+        # The crashed worker may have sent its push, so it waits for word from Daraja instead
+        reconcile_payments()
+        for payment, status in [(self.payment, 'sent'), (live, 'processing'), (crashed, 'pending')]:
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, status)
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=1, projects_per_student=1, mentors=2, freelancers=1, organizations=0)
+        cls.mentor = Mentor.objects.get(full_name='Mentor 0')
+        cls.mentor.job_title = 'Python Engineer'
+        cls.mentor.save()
+        cls.project = Project.objects.get()
+        cls.freelancer = Freelancer.objects.get()
+
+    def kinds(self, query, **kwargs):
+        return [(document.kind, document.object_id) for document in search(query, **kwargs)]
+
+    def test_title_matches_rank_first(self):
+        self.assertTrue(_fts5_available())
+        results = self.kinds('python')
+        self.assertEqual(results[0], ('mentor', self.mentor.pk))
+        self.assertEqual(set(results[1:]), {('project', self.project.pk), ('freelancer', self.freelancer.pk)})
+        self.assertEqual(self.kinds('pyth eng'), [('mentor', self.mentor.pk)])
+        # Quotes and operators are dropped, never read as FTS5 syntax
+        self.assertEqual(self.kinds('"python*" -'), results)
+
+    def test_type_filter(self):
+        self.assertEqual(self.kinds('python', kind='freelancer'), [('freelancer', self.freelancer.pk)])
+        response = self.client.get(reverse('main:search'), {'q': 'python', 'type': 'mentor', 'format': 'json'})
+        self.assertEqual([(r['type'], r['id']) for r in response.json()['results']], [('mentor', self.mentor.pk)])
+        response = self.client.get(reverse('main:search'), {'q': 'python', 'type': 'bogus', 'format': 'json'})
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_fallback_without_fts5(self):
+        with mock.patch('main.search._fts5_available', return_value=False):
+            self.assertEqual(self.kinds('pyth eng'), [('mentor', self.mentor.pk)])
+            self.assertEqual(len(self.kinds('PYTHON')), 3)
+            self.assertEqual(self.kinds('python', kind='project'), [('project', self.project.pk)])
+            self.assertEqual(self.kinds('python', category='design'), [])
+
+    def test_migration_skips_fts5_when_sqlite_lacks_it(self):
+        migration = importlib.import_module('main.migrations.0011_search_index')
+        self.assertTrue(migration._sqlite_has_fts5(connection))
+        schema_editor = mock.Mock(connection=connection)
+        with mock.patch.object(migration, '_sqlite_has_fts5', return_value=False):
+            migration.create_fulltext_index(django_apps, schema_editor)
+        schema_editor.execute.assert_not_called()
+        # Reversing a migration that skipped the table must not fail either
+        self.assertTrue(all('IF EXISTS' in sql for sql in migration.SQLITE_BACKWARDS))
+
+    def test_saving_updates_the_index(self):
+        self.freelancer.profession = 'Golang Developer'
+        self.freelancer.save()
+        self.project.title = 'Kotlin app'
+        self.project.save()
+        self.assertEqual(self.kinds('golang'), [('freelancer', self.freelancer.pk)])
+        self.assertEqual(self.kinds('kotlin'), [('project', self.project.pk)])
+        self.assertEqual(SearchDocument.objects.get(kind='freelancer').title, 'Freelancer 0 - Golang Developer')
+
+    def test_deleting_removes_from_the_index(self):
+        for instance in (self.mentor, self.project, self.freelancer):
+            instance.delete()
+        self.assertEqual(self.kinds('python'), [])
+        self.assertEqual(SearchDocument.objects.filter(kind__in=['project', 'freelancer']).count(), 0)
+        self.assertEqual(SearchDocument.objects.count(), 1)
+
+    def test_fixtures_are_not_indexed(self):
+        data = serializers.serialize('json', [self.mentor])
+        SearchDocument.objects.all().delete()
+        for obj in serializers.deserialize('json', data):
+            obj.save()
+        self.assertFalse(SearchDocument.objects.exists())
+
+
+class TransferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=5, projects_per_student=2, mentors=2, freelancers=2, organizations=1)
+        project = Project.objects.get(title='Project 0-1')
+        project.freelancer = Freelancer.objects.get(full_name='Freelancer 1')
+        project.save()
+        PaymentRequest.objects.create(
+            user=User.objects.get(username='student0'), mentor=Mentor.objects.get(full_name='Mentor 1'),
+            payment_type='mentor_session', phone_number='254712345678', amount=500, description='Session',
+            status='completed', checkout_request_id='ws_CO_1',
+        )
+        PaymentResult.objects.create(checkout_request_id='ws_CO_1', result_code=0, amount=500)
+        # Backdated, so a timestamp stamped on import would show
+        Project.objects.update(created_at=timezone.now() - timedelta(days=30))
+
+    def snapshot(self):
+        """The dataset described by natural keys only, so it compares equal across new ids."""
+        return {
+            'counts': {model._meta.label: model._default_manager.count() for model in transfer_models()},
+            'users': sorted(User.objects.values_list('username', 'email', 'date_joined', 'is_superuser')),
+            'roles': sorted(UserProfile.objects.values_list('user__username', 'role', 'created_at')),
+            'students': sorted(
+                (s.user.username, s.year_of_study, s.created_at, s.project_count,
+                 sorted(s.skill_tags.values_list('normalized', flat=True)))
+                for s in StudentProfile.objects.select_related('user')
+            ),
+            'projects': sorted(
+                (p.student.user.username, p.title, getattr(p.freelancer, 'full_name', None), p.created_at,
+                 p.updated_at, sorted(p.skill_tags.values_list('normalized', flat=True)))
+                for p in Project.objects.select_related('student__user', 'freelancer')
+            ),
+            'freelancers': sorted(
+                (f.user.username, f.created_at, sorted(f.skill_tags.values_list('normalized', flat=True)))
+                for f in Freelancer.objects.select_related('user')
+            ),
+            'mentors': sorted(Mentor.objects.values_list('user__username', 'full_name', 'created_at')),
+            'organizations': sorted(Organization.objects.values_list('user__username', 'organization_name')),
+            'payments': sorted(PaymentRequest.objects.values_list(
+                'reference', 'user__username', 'mentor__full_name', 'status', 'created_at',
+            )),
+            'results': sorted(PaymentResult.objects.values_list('checkout_request_id', 'amount', 'received_at')),
+        }
+
+    def test_round_trip_into_an_empty_database(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        before = self.snapshot()
+        old_ids = set(User.objects.values_list('pk', flat=True))
+
+        call_command('export_data', directory, chunk_size=7, batch_size=3, gzip=True, stdout=StringIO())
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.assertEqual({entry['model']: entry['rows'] for entry in manifest['models']}, before['counts'])
+        self.assertTrue(all(name.endswith('.ndjson.gz') for entry in manifest['models'] for name in entry['files']))
+
+        for model in (PaymentResult, PaymentRequest, User, SkillTag):
+            model.objects.all().delete()
+        self.assertFalse(Project.objects.exists())
+
+        out = StringIO()
+        call_command('import_data', directory, batch_size=4, no_recommendations=True, stdout=out)
+        self.assertIn(f"Imported {sum(before['counts'].values())} new rows", out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+        self.assertFalse(old_ids & set(User.objects.values_list('pk', flat=True)))
+        self.assertEqual(SearchDocument.objects.count(), before['counts']['main.Project'] + 4)
+
+
+class MentorDirectoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            user = User.objects.create_user(f'mentor{i}')
+            Mentor.objects.create(
+                user=user, full_name=f'Mentor {i:02d}', job_title='Engineer', company='ACME',
+                expertise_area='technology' if i % 3 else 'design', years_of_experience=i,
+                availability='Weekends' if i % 2 else 'Evenings', hourly_rate=1000 + i * 100,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def _names(self, **params):
+        data = self.client.get(reverse('main:mentor'), {'format': 'json', **params}).json()
+        return [mentor['full_name'] for mentor in data['results']], data
+
+    def test_pages_cover_every_mentor_in_name_order(self):
+        names, data = self._names()
+        while data['next_cursor']:
+            more, data = self._names(cursor=data['next_cursor'])
+            names += more
+        self.assertEqual(names, [f'Mentor {i:02d}' for i in range(30)])
+
+    def test_filters(self):
+        names, _ = self._names(expertise='design', availability='Evenings', min_years=6, max_years=20)
+        self.assertEqual(names, ['Mentor 06', 'Mentor 12', 'Mentor 18'])
+        names, _ = self._names(min_rate='3500', max_rate='3800')
+        self.assertEqual(names, ['Mentor 25', 'Mentor 26', 'Mentor 27', 'Mentor 28'])
+
+    def test_invalid_filters_are_reported_and_ignored(self):
+        names, data = self._names(expertise='cooking', min_years='lots', max_years=1)
+        self.assertEqual(names, ['Mentor 00', 'Mentor 01'])
+        self.assertEqual(set(data['errors']), {'expertise', 'min_years'})
+
+    def test_facets_are_cached_until_a_mentor_changes(self):
+        _, data = self._names()
+        self.assertEqual(data['facets']['expertise'], {'design': 10, 'technology': 20})
+        self.assertEqual(data['facets']['availability'], {'Evenings': 15, 'Weekends': 15})
+        # A different query string misses the public page cache but not the facets
+        with self.assertNumQueries(1):
+            self._names(expertise='design')
+
+        mentor = Mentor.objects.get(full_name='Mentor 01')
+        mentor.expertise_area = 'business'
+        mentor.save()
+        _, data = self._names(expertise='business')
+        self.assertEqual(data['facets']['expertise'], {'business': 1, 'design': 10, 'technology': 19})
+
+    def test_page_keeps_filters_in_the_next_link(self):
+        response = self.client.get(reverse('main:mentor'), {'availability': 'Weekends'})
+        self.assertEqual(len(response.context['mentors']), 15)
+        response = self.client.get(reverse('main:mentor'))
+        self.assertContains(response, 'Technology (20)')
+        self.assertContains(response, f"?cursor={response.context['page'].next_cursor}")
+
+
+class ReadOnlyAPITests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=4, projects_per_student=2, mentors=3, freelancers=2, organizations=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_cover_the_collection(self):
+        url = reverse('main:api_projects')
+        ids = []
+        data = self.client.get(url, {'limit': 3, 'fields': 'id'}).json()
+        ids += [row['id'] for row in data['results']]
+        while data['next_cursor']:
+            data = self.client.get(url, {'limit': 3, 'fields': 'id', 'cursor': data['next_cursor']}).json()
+            ids += [row['id'] for row in data['results']]
+        self.assertEqual(ids, list(Project.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_field_selection(self):
+        data = self.client.get(reverse('main:api_freelancers'), {'fields': 'full_name,skills'}).json()
+        self.assertEqual(data['results'][0], {'full_name': 'Freelancer 0', 'skills': ['Django', 'Python']})
+        response = self.client.get(reverse('main:api_freelancers'), {'fields': 'full_name,email'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json()['error'])
+
+    def test_not_modified_without_loading_rows(self):
+        url = reverse('main:api_projects')
+        first = self.client.get(url, {'limit': 5})
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('"'))
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        # Only the (id, updated_at) validator query runs
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(url, {'limit': 5}, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_the_page(self):
+        url = reverse('main:api_projects')
+        etag = self.client.get(url, {'limit': 5})['ETag']
+        self.assertNotEqual(self.client.get(url, {'limit': 4})['ETag'], etag)
+
+        project = Project.objects.order_by('-created_at', '-id').first()
+        project.title = 'Changed'
+        project.save()
+        response = self.client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['title'], 'Changed')
+
+        etag = response['ETag']
+        project.delete()
+        self.assertEqual(self.client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_filters_and_bad_requests(self):
+        data = self.client.get(reverse('main:api_mentors'), {'expertise': 'design'}).json()
+        self.assertEqual([row['full_name'] for row in data['results']], ['Mentor 1'])
+        data = self.client.get(reverse('main:api_projects'), {'status': 'completed', 'fields': 'status'}).json()
+        self.assertEqual({row['status'] for row in data['results']}, {'completed'})
+        for url, params in [
+            (reverse('main:api_projects'), {'status': 'lost'}),
+            (reverse('main:api_mentors'), {'min_years': 'many'}),
+            (reverse('main:api_organizations'), {'limit': 1000}),
+        ]:
+            with self.subTest(url=url, params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+        self.assertEqual(self.client.post(reverse('main:api_projects')).status_code, 405)
+
+
+class PublicPageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=2, projects_per_student=1, mentors=2, freelancers=0, organizations=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_visitors_share_one_render(self):
+        first = self.client.get(reverse('main:projects'))
+        self.assertIn('private', first['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.assertEqual(Client().get(reverse('main:projects')).content, first.content)
+
+        self.client.force_login(User.objects.get(username='student0'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('main:projects'))
+        self.assertTrue(queries)
+
+    def test_every_visitor_can_post_the_contact_form(self):
+        visitors = [Client(enforce_csrf_checks=True) for _ in range(2)]
+        pages = [visitor.get(reverse('main:contact')) for visitor in visitors]
+        for visitor, page in zip(visitors, pages):
+            token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page.content.decode())[1]
+            response = visitor.post(reverse('main:contact'), {'name': 'Wanjiru', 'csrfmiddlewaretoken': token})
+            self.assertRedirects(response, reverse('main:contact'), fetch_redirect_response=False)
+
+        # The pages that are cached carry no form to post
+        for name in ('home', 'projects', 'mentor', 'search'):
+            with self.subTest(name):
+                self.assertNotContains(self.client.get(reverse(f'main:{name}')), 'csrfmiddlewaretoken')
+
+
+class FragmentCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=2, mentors=2, freelancers=0, organizations=0)
+        cls.project = Project.objects.filter(student__user__username='student0').first()
+        cls.mentor = Mentor.objects.get(user__username='mentor0')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.get(username='student0'))
+
+    def test_project_card_is_cached_until_the_project_changes(self):
+        self.assertContains(self.client.get(reverse('main:projects')), self.project.title)
+        # update() leaves updated_at alone, so the cached card is still served
+        Project.objects.filter(pk=self.project.pk).update(title='Renamed quietly')
+        self.assertNotContains(self.client.get(reverse('main:projects')), 'Renamed quietly')
+
+        self.project.title = 'Renamed'
+        self.project.save()
+        for name in ('projects', 'dashboard'):
+            with self.subTest(name):
+                self.assertContains(self.client.get(reverse(f'main:{name}')), 'Renamed')
+
+    def test_mentor_card_is_cached_until_the_mentor_changes(self):
+        self.client.get(reverse('main:mentor'))
+        Mentor.objects.filter(pk=self.mentor.pk).update(company='Quiet Ltd')
+        self.assertNotContains(self.client.get(reverse('main:mentor')), 'Quiet Ltd')
+
+        self.mentor.company = 'Loud Ltd'
+        self.mentor.save()
+        self.assertContains(self.client.get(reverse('main:mentor')), 'Loud Ltd')
+
+
+class RecommendationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=6, projects_per_student=2, mentors=4, freelancers=2, organizations=0)
+        cls.student = StudentProfile.objects.get(user__username='student0')
+
+    def setUp(self):
+        cache.clear()
+        rebuild_recommendations()
+
+    def test_rebuild_ranks_candidates_that_share_skills(self):
+        # student0 knows Python, Django and JavaScript; the freelancers know Python and Django
+        freelancers = list(self.student.recommendations.filter(kind='freelancer'))
+        self.assertEqual(len(freelancers), 2)
+        self.assertEqual([row.rank for row in freelancers], [0, 1])
+        for kind in ('mentor', 'project', 'freelancer'):
+            with self.subTest(kind):
+                rows = list(Recommendation.objects.filter(kind=kind, student=self.student))
+                self.assertLessEqual(len(rows), TOP_K)
+                self.assertEqual([row.score for row in rows], sorted((row.score for row in rows), reverse=True))
+                self.assertTrue(all(0 < row.score <= 1 for row in rows))
+
+    def test_own_projects_are_never_recommended(self):
+        owners = dict(Project.objects.values_list('pk', 'student_id'))
+        rows = Recommendation.objects.filter(kind='project')
+        self.assertTrue(rows.exists())
+        for row in rows:
+            self.assertNotEqual(owners[row.object_id], row.student_id)
+
+    def test_changes_reach_the_lists_they_affect(self):
+        student = StudentProfile.objects.get(user__username='student2')
+        with self.captureOnCommitCallbacks(execute=True):
+            student.skills = 'Svelte'
+            student.save()
+        self.assertEqual(list(student.skill_tags.values_list('name', flat=True)), ['Svelte'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project = Project.objects.create(
+                student=StudentProfile.objects.get(user__username='student3'), title='Svelte rewrite',
+                description='A student project', skills_used='Svelte', start_date=date(2025, 1, 1),
+            )
+        # A rare skill they share outweighs the common ones on their own projects
+        best = student.recommendations.filter(kind='project').first()
+        self.assertEqual((best.object_id, best.label, best.rank), (project.pk, 'Svelte rewrite', 0))
+        self.assertFalse(Recommendation.objects.filter(kind='project', object_id=project.pk, student__user__username='student3').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            project.delete()
+        self.assertFalse(Recommendation.objects.filter(kind='project', object_id=project.pk).exists())
+
+        # Python and Django now only come from their projects, at half weight
+        before = self.student.recommendations.get(kind='freelancer', rank=0).score
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.skills = 'Figma'
+            self.student.save()
+        self.assertLess(self.student.recommendations.get(kind='freelancer', rank=0).score, before)
+
+    def test_dashboard_shows_recommendations(self):
+        self.client.force_login(self.student.user)
+        response = self.client.get(reverse('main:dashboard'))
+        self.assertContains(response, 'Recommended for you')
+        self.assertContains(response, 'Freelancer 0')
+        self.assertEqual(len(response.context['recommendations']['freelancer']), 2)
+
+
+class TemporaryMediaMixin:
+    """Points MEDIA_ROOT at a temporary directory for the whole test class."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media = tempfile.TemporaryDirectory()
+        cls._media_settings = override_settings(MEDIA_ROOT=cls._media.name)
+        cls._media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_settings.disable()
+        cls._media.cleanup()
+
+
+class AvatarTests(TemporaryMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=1, projects_per_student=0, mentors=2, freelancers=0, organizations=0)
+        cls.mentor = Mentor.objects.get(user__username='mentor0')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.mentor.user)
+
+    def upload(self, color, size=(400, 300), image_format='PNG', execute=True):
+        data = BytesIO()
+        Image.new('RGBA', size, color).save(data, image_format)
+        with self.captureOnCommitCallbacks(execute=execute):
+            return self.client.post(reverse('main:editProfile'), {
+                'job_title': 'Engineer', 'company': 'ACME', 'expertise_area': 'technology',
+                'years_of_experience': 5, 'bio': '', 'linkedin': '', 'phone': '0712345678',
+                'avatar': SimpleUploadedFile(f'me.{image_format.lower()}', data.getvalue()),
+            })
+
+    def test_upload_is_resized_into_hashed_thumbnails(self):
+        self.assertRedirects(self.upload('red'), reverse('main:dashboard'), fetch_redirect_response=False)
+        profile = UserProfile.objects.get(user=self.mentor.user)
+        self.assertRegex(profile.avatar.name, r'^avatars/[0-9a-f]{32}\.png$')
+        self.assertEqual(set(profile.avatar_thumbnails), {'webp', 'jpeg'})
+        for image_format, sizes in profile.avatar_thumbnails.items():
+            for size, url in sizes.items():
+                with self.subTest(image_format=image_format, size=size):
+                    self.assertTrue(url.startswith(settings.MEDIA_URL))
+                    with Image.open(os.path.join(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):])) as thumb:
+                        self.assertEqual((thumb.format.lower(), thumb.size), (image_format, (int(size), int(size))))
+        # Cached cards and API validators see the change
+        self.assertGreater(Mentor.objects.get(pk=self.mentor.pk).updated_at, self.mentor.updated_at)
+
+        response = self.client.get(profile.avatar_thumbnails['webp']['96'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={settings.AVATAR_CACHE_SECONDS}', response['Cache-Control'])
+
+    def test_lost_thumbnail_jobs_are_redone(self):
+        # The process stops before the job runs
+        self.upload('green', execute=False)
+        UserProfile.objects.filter(user__username='mentor1').update(avatar='avatars/missing.png')
+        self.assertEqual(UserProfile.objects.get(user=self.mentor.user).avatar_thumbnails, {})
+
+        out, err = StringIO(), StringIO()
+        call_command('make_thumbnails', stdout=out, stderr=err)
+        self.assertIn('Made thumbnails for 1 avatars', out.getvalue())
+        self.assertIn('avatars/missing.png', err.getvalue())
+        self.assertEqual(set(UserProfile.objects.get(user=self.mentor.user).avatar_thumbnails), {'webp', 'jpeg'})
+
+        out = StringIO()
+        call_command('make_thumbnails', stdout=out, stderr=StringIO())
+        self.assertIn('Made thumbnails for 0 avatars', out.getvalue())
+
+    def test_cards_read_thumbnails_from_the_same_query(self):
+        self.upload('blue')
+        self.client.logout()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('main:mentor'))
+        thumbs = UserProfile.objects.get(user=self.mentor.user).avatar_thumbnails
+        self.assertContains(response, f'src="{thumbs["jpeg"]["96"]}"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertEqual(self.client.get(reverse('main:api_mentors')).json()['results'][0]['avatar'], thumbs)
+
+    def test_replacing_an_avatar_removes_unused_files(self):
+        self.upload('red')
+        old = UserProfile.objects.get(user=self.mentor.user).avatar.name
+        self.upload('green')
+        new = UserProfile.objects.get(user=self.mentor.user).avatar.name
+        for name, exists in [(old, False), (new, True)]:
+            paths = [name] + [path for sizes in thumbnail_names(name).values() for path in sizes.values()]
+            self.assertEqual([os.path.exists(os.path.join(settings.MEDIA_ROOT, path)) for path in paths], [exists] * 7)
+
+    @override_settings(AVATAR_MAX_BYTES=100)
+    def test_oversized_uploads_are_rejected(self):
+        response = self.upload('red')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Images must be smaller than')
+        self.assertFalse(UserProfile.objects.get(user=self.mentor.user).avatar)
+
+
+@override_settings(MPESA_CALLBACK_TOKEN='budget-token')
+class ViewQueryBudgetTests(TemporaryMediaMixin, QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset()
+        cls.project = Project.objects.filter(student__user__username='student0').first()
+        cls.payment = PaymentRequest.objects.create(
+            payment_type='donation', phone_number='254712345678', amount=50, description='Donation',
+            status='sent', checkout_request_id='ws_CO_budget',
+        )
+
+    def _request(self, name, url_kwargs, username, method, data):
+        if url_kwargs == 'project':
+            url_kwargs = {'project_id': self.project.id}
+        elif url_kwargs == 'payment':
+            url_kwargs = {'reference': self.payment.reference}
+        elif url_kwargs == 'avatar':
+            os.makedirs(os.path.join(settings.MEDIA_ROOT, settings.AVATAR_DIR), exist_ok=True)
+            with open(os.path.join(settings.MEDIA_ROOT, settings.AVATAR_DIR, 'budget-48.webp'), 'wb') as f:
+                f.write(b'RIFF')
+            url_kwargs = {'name': 'budget-48.webp'}
+        elif url_kwargs == 'capture':
+            os.makedirs(profile_dir(), exist_ok=True)
+            with open(os.path.join(profile_dir(), 'budget.folded'), 'w') as f:
+                f.write('main 1\n')
+            url_kwargs = {'filename': 'budget.folded'}
+        if username:
+            self.client.force_login(User.objects.get(username=username))
+        url = reverse(f'main:{name}', kwargs=url_kwargs)
+        if data == 'callback':
+            return self.assertQueryBudget(
+                QUERY_BUDGETS[name][-1], self.client.post, url,
+                json.dumps(callback_payload('ws_CO_budget')), content_type='application/json',
+            )
+        return self.assertQueryBudget(QUERY_BUDGETS[name][-1], getattr(self.client, method), url, data)
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in main_urls.urlpatterns}
+        self.assertEqual(names - set(QUERY_BUDGETS), set())
+
+    def test_views_stay_within_budget(self):
+        for name, (url_kwargs, username, method, data, budget) in QUERY_BUDGETS.items():
+            with self.subTest(name):
+                cache.clear()
+                self.client.logout()
+                response = self._request(name, url_kwargs, username, method, data)
+                self.assertLess(response.status_code, 400)
+
+    def test_dashboards_stay_within_budget(self):
+        for username, budget in DASHBOARD_BUDGETS.items():
+            with self.subTest(username):
+                cache.clear()
+                self.client.force_login(User.objects.get(username=username))
+                response = self.assertQueryBudget(budget, self.client.get, reverse('main:dashboard'))
+                self.assertEqual(response.status_code, 200)
+
+    def test_projects_next_page_within_budget(self):
+        first = self.client.get(reverse('main:projects'))
+        cache.clear()
+        self.assertQueryBudget(2, self.client.get, reverse('main:projects'), {'cursor': first.context['page'].next_cursor})
+
+
+class ProfilingTests(TemporaryMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=3, mentors=2, freelancers=1, organizations=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(User.objects.get(username='admin'))
+        response = self.client.get(reverse('main:dashboard'), {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+
+        download = self.client.get(response['X-Profile'])
+        self.assertEqual(download.status_code, 200)
+        # Collapsed stacks: "frame;frame;frame count"
+        for line in b''.join(download.streaming_content).decode().splitlines():
+            self.assertRegex(line, r'^\S.* \d+$')
+
+        listing = self.client.get(reverse('main:profiles'))
+        self.assertContains(listing, '/dashboard/?profile=1')
+        capture = recent_captures()[0]
+        self.assertEqual(capture['mode'], 'sample')
+        self.assertEqual(capture['path'], '/dashboard/?profile=1')
+        templates = {template['name'] for template in capture['templates']}
+        self.assertEqual(templates, {'main/admin_dashboard.html', 'base.html'})
+        self.assertGreater(capture['sql']['count'], 0)
+
+    def test_cprofile_mode_from_header(self):
+        self.client.force_login(User.objects.get(username='admin'))
+        response = self.client.get(reverse('main:projects'), HTTP_X_PROFILE='cprofile')
+        self.assertTrue(response['X-Profile'].endswith('.prof'))
+        self.assertEqual(recent_captures()[0]['mode'], 'cprofile')
+
+    def test_non_staff_flag_is_ignored(self):
+        self.client.force_login(User.objects.get(username='student0'))
+        before = recent_captures()
+        response = self.client.get(reverse('main:dashboard'), {'profile': '1'})
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(recent_captures(), before)
+        self.assertEqual(self.client.get(reverse('main:profiles')).status_code, 302)
+
+    def test_download_rejects_paths(self):
+        self.client.force_login(User.objects.get(username='admin'))
+        for filename in ('..%2Fsettings.py', 'missing.folded', 'notes.txt'):
+            with self.subTest(filename):
+                self.assertEqual(self.client.get(f'/profiles/{filename}').status_code, 404)
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_old_captures_are_pruned(self):
+        self.client.force_login(User.objects.get(username='admin'))
+        for _ in range(3):
+            self.client.get(reverse('main:home'), {'profile': '1'})
+        self.assertEqual(len(recent_captures()), 2)
+        self.assertEqual(len(os.listdir(profile_dir())), 4)
+
+
+class AsyncViewTests(TemporaryMediaMixin, QueryBudgetTestCase):
+    """The async views main.urls serves under ASGI, driven through the ASGI handler."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._async_settings = override_settings(ASYNC_VIEWS=True)
+        cls._async_settings.enable()
+        _reload_urls()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._async_settings.disable()
+        _reload_urls()
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=3, mentors=2, freelancers=1, organizations=1)
+        cls.payment = PaymentRequest.objects.create(
+            payment_type='donation', phone_number='254712345678', amount=50, description='Donation', status='sent',
+        )
+
+    def get(self, *args, **kwargs):
+        return async_to_sync(self.async_client.get)(*args, **kwargs)
+
+    def post(self, *args, **kwargs):
+        return async_to_sync(self.async_client.post)(*args, **kwargs)
+
+    def test_urls_serve_async_views(self):
+        for path in ('/dashboard/', '/contact/', '/payment/', reverse('main:payment_status', args=[self.payment.reference])):
+            with self.subTest(path):
+                self.assertTrue(iscoroutinefunction(resolve(path).func))
+
+    def test_dashboards_stay_within_budget(self):
+        for username, budget in DASHBOARD_BUDGETS.items():
+            with self.subTest(username):
+                cache.clear()
+                self.async_client.force_login(User.objects.get(username=username))
+                response = self.assertQueryBudget(budget, self.get, reverse('main:dashboard'))
+                self.assertEqual(response.status_code, 200)
+
+    def test_student_dashboard_lists_projects(self):
+        self.async_client.force_login(User.objects.get(username='student1'))
+        response = self.get(reverse('main:dashboard'))
+        self.assertContains(response, 'Project 1-2')
+        self.assertEqual(response.context['project_count'], 3)
+
+    def test_contact_and_payment_forms(self):
+        response = self.post(reverse('main:contact'), {'name': 'Wanjiru'}, follow=True)
+        self.assertContains(response, 'Thanks Wanjiru!')
+        self.assertContains(self.get(reverse('main:payment')), 'Mentor 1')
+
+        response = self.post(reverse('main:payment'), {'payment_type': 'donation', 'amount': '0'}, follow=True)
+        self.assertContains(response, 'Please choose a payment type')
+        response = self.post(reverse('main:payment'), {
+            'payment_type': 'mentor_session', 'amount': '100', 'phone_number': '0712345678', 'mentor_id': '0',
+        }, follow=True)
+        self.assertContains(response, 'Mentor not found.')
+
+    @override_settings(PAYMENT_STATUS_WAIT=5)
+    def test_payment_status_waits_for_a_change(self):
+        url = reverse('main:payment_status', args=[self.payment.reference])
+        self.assertEqual(self.get(url, {'wait': 'queued'}).json()['status'], 'sent')
+
+        async def poll_while_settling():
+            async def settle():
+                await asyncio.sleep(0.2)
+                await PaymentRequest.objects.filter(pk=self.payment.pk).aupdate(status='completed')
+            response, _ = await asyncio.gather(self.async_client.get(url, {'wait': 'sent'}), settle())
+            return response
+
+        self.assertEqual(async_to_sync(poll_while_settling)().json()['status'], 'completed')
+
+    @override_settings(PAYMENT_STATUS_WAIT=0.1)
+    def test_payment_status_wait_times_out(self):
+        url = reverse('main:payment_status', args=[self.payment.reference])
+        self.assertEqual(self.get(url, {'wait': 'sent'}).json()['status'], 'sent')
+
+    @override_settings(QUERY_INSTRUMENTATION=True)
+    def test_middleware_runs_async(self):
+        self.async_client.force_login(User.objects.get(username='admin'))
+        response = self.get(reverse('main:dashboard'))
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+
+        response = self.get(reverse('main:dashboard'), {'profile': '1'})
+        self.assertIn('X-Profile', response)
+        capture = recent_captures()[0]
+        self.assertIn('main/admin_dashboard.html', {template['name'] for template in capture['templates']})
+        self.assertGreater(capture['sql']['count'], 0)
+
+
+def _reload_urls():
+    # main.urls picks its views from ASYNC_VIEWS when it is imported
+    importlib.reload(main_urls)
+    importlib.reload(core_urls)
+    clear_url_caches()
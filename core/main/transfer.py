@@ -0,0 +1,325 @@
+"""
+Streaming export and import of the platform's data, for datasets too big
+for dumpdata/loaddata.
+
+An export is a directory of NDJSON chunk files (optionally gzipped), one
+JSON object per row keyed by column name, plus a manifest.json listing
+the chunks in dependency order. Rows are read with keyset-paginated
+iterators, so memory stays flat however large the tables are.
+
+Import inserts rows with batched bulk_create and gives them new primary
+keys, remapping foreign keys as it goes. The old -> new id map lives in
+a SQLite file next to the data rather than in memory, and it doubles as
+the checkpoint: an interrupted import picks up after the last committed
+batch.
+"""
+import gzip
+import json
+import os
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    Freelancer, Mentor, Organization, PaymentRequest, PaymentResult, Project, SkillTag,
+    StudentProfile, UserProfile,
+)
+
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+EXPORT_CHECKPOINT = 'export-checkpoint.json'
+IMPORT_STATE = 'import-state.sqlite3'
+
+# SQLite caps bound parameters per statement; stay well under it
+LOOKUP_CHUNK = 500
+
+# Rows matched on these fields are reused instead of inserted again, so
+# importing into a database that already has (some of) them is safe.
+NATURAL_KEYS = {
+    User: 'username',
+    SkillTag: 'normalized',
+    UserProfile: 'user',
+    StudentProfile: 'user',
+    Mentor: 'user',
+    Organization: 'user',
+    Freelancer: 'user',
+    PaymentRequest: 'reference',
+    PaymentResult: 'checkout_request_id',
+}
+
+
+def transfer_models():
+    """Every model exported, parents before the rows that point at them."""
+    return [
+        User, SkillTag, UserProfile, StudentProfile, Mentor, Organization, Freelancer,
+        Project, PaymentRequest, PaymentResult,
+        StudentProfile.skill_tags.through,
+        Project.skill_tags.through,
+        Freelancer.skill_tags.through,
+    ]
+
+
+class TransferError(Exception):
+    pass
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _open(path, mode, compressed):
+    if compressed:
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _load_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_json(path, data):
+    # Write then rename, so a crash never leaves half a checkpoint behind
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def export_data(directory, chunk_size=100000, compress=False, batch_size=2000, progress=None):
+    """
+    Writes every transfer model to `directory` in chunks of `chunk_size`
+    rows. Re-running an interrupted export resumes after the last
+    complete chunk. Returns the manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    checkpoint_path = os.path.join(directory, EXPORT_CHECKPOINT)
+    state = _load_json(checkpoint_path) or {'compress': compress, 'models': {}}
+    extension = '.ndjson.gz' if state['compress'] else '.ndjson'
+
+    for model in transfer_models():
+        label = model._meta.label
+        entry = state['models'].setdefault(label, {'files': [], 'rows': 0, 'last_pk': None, 'done': False})
+        if entry['done']:
+            continue
+        columns = [field.attname for field in model._meta.concrete_fields]
+        pk_index = columns.index(model._meta.pk.attname)
+        rows = model._default_manager.order_by('pk').values_list(*columns)
+
+        while True:
+            page = rows if entry['last_pk'] is None else rows.filter(pk__gt=entry['last_pk'])
+            name = f"{label.lower()}-{len(entry['files']):05d}{extension}"
+            path = os.path.join(directory, name)
+            count = 0
+            last_pk = None
+            with _open(path + '.part', 'wt', state['compress']) as f:
+                for row in page[:chunk_size].iterator(chunk_size=batch_size):
+                    f.write(json.dumps(dict(zip(columns, row)), default=_json_default))
+                    f.write('\n')
+                    count += 1
+                    last_pk = row[pk_index]
+            if not count:
+                os.remove(path + '.part')
+                break
+            os.replace(path + '.part', path)
+            entry['files'].append(name)
+            entry['rows'] += count
+            entry['last_pk'] = last_pk
+            _save_json(checkpoint_path, state)
+            if progress:
+                progress(f"{label}: {entry['rows']} rows")
+            if count < chunk_size:
+                break
+
+        entry['done'] = True
+        _save_json(checkpoint_path, state)
+
+    manifest = {
+        'version': FORMAT_VERSION,
+        'created': timezone.now().isoformat(),
+        'models': [
+            {'model': label, 'rows': entry['rows'], 'files': entry['files']}
+            for label, entry in state['models'].items()
+        ],
+    }
+    _save_json(os.path.join(directory, MANIFEST), manifest)
+    os.remove(checkpoint_path)
+    return manifest
+
+
+class ImportState:
+    """The on-disk old -> new primary key map and per-file progress of one import."""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS idmap ('
+            'model TEXT NOT NULL, old INTEGER NOT NULL, new INTEGER NOT NULL, PRIMARY KEY (model, old)'
+            ') WITHOUT ROWID'
+        )
+        self.db.execute('CREATE TABLE IF NOT EXISTS progress (file TEXT PRIMARY KEY, lines INTEGER NOT NULL)')
+        self.db.commit()
+
+    def lines_done(self, name):
+        row = self.db.execute('SELECT lines FROM progress WHERE file = ?', (name,)).fetchone()
+        return row[0] if row else 0
+
+    def lookup(self, label, old_ids):
+        old_ids = list(old_ids)
+        mapping = {}
+        for start in range(0, len(old_ids), LOOKUP_CHUNK):
+            chunk = old_ids[start:start + LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            mapping.update(self.db.execute(
+                f'SELECT old, new FROM idmap WHERE model = ? AND old IN ({placeholders})', [label, *chunk],
+            ))
+        return mapping
+
+    def commit_batch(self, label, pairs, name, lines):
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO idmap (model, old, new) VALUES (?, ?, ?)',
+                ((label, old, new) for old, new in pairs),
+            )
+            self.db.execute('INSERT OR REPLACE INTO progress (file, lines) VALUES (?, ?)', (name, lines))
+
+    def close(self):
+        self.db.close()
+
+
+@contextmanager
+def _keep_timestamps(model):
+    # bulk_create would stamp auto_now/auto_now_add fields with the import time
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _read_batches(path, batch_size, skip):
+    """Yields (lines read so far, rows) from an NDJSON file, after skipping `skip` lines."""
+    batch = []
+    line_number = 0
+    with _open(path, 'rt', path.endswith('.gz')) as f:
+        for line in f:
+            line_number += 1
+            if line_number <= skip:
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield line_number, batch
+                batch = []
+    if batch:
+        yield line_number, batch
+
+
+def import_data(directory, batch_size=500, state_path=None, progress=None):
+    """
+    Imports an export directory. Each batch is committed with its id map
+    entries and progress, so re-running after an interruption resumes
+    where it stopped. Returns {model label: rows inserted}.
+
+    The id map is written just after the database commit. If the process
+    dies between the two, the resumed import reuses the rows that have a
+    natural key. Only a batch of projects could be inserted twice.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        raise TransferError("Importing needs a database that returns ids from bulk inserts (Postgres, SQLite 3.35+)")
+    manifest = _load_json(os.path.join(directory, MANIFEST))
+    if manifest is None:
+        raise TransferError(f"No {MANIFEST} in {directory}; was the export finished?")
+    if manifest.get('version') != FORMAT_VERSION:
+        raise TransferError(f"Unsupported export format version {manifest.get('version')}")
+
+    models = {model._meta.label: model for model in transfer_models()}
+    state = ImportState(state_path or os.path.join(directory, IMPORT_STATE))
+    inserted = {}
+    try:
+        for entry in manifest['models']:
+            model = models.get(entry['model'])
+            if model is None:
+                raise TransferError(f"Unknown model {entry['model']}")
+            inserted[entry['model']] = 0
+            with _keep_timestamps(model):
+                for name in entry['files']:
+                    path = os.path.join(directory, name)
+                    for lines, rows in _read_batches(path, batch_size, state.lines_done(name)):
+                        inserted[entry['model']] += _import_batch(model, rows, models, state, name, lines)
+                    if progress:
+                        progress(f"{entry['model']}: {name} done")
+    finally:
+        state.close()
+    return inserted
+
+
+def _import_batch(model, rows, models, state, name, lines):
+    label = model._meta.label
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    pk_name = model._meta.pk.attname
+
+    # Point foreign keys at the ids their targets were given on import
+    for field in fields.values():
+        if not field.is_relation or field.related_model._meta.label not in models:
+            continue
+        target = field.related_model._meta.label
+        old_ids = {row[field.attname] for row in rows if row.get(field.attname) is not None}
+        mapping = state.lookup(target, old_ids)
+        missing = old_ids - mapping.keys()
+        if missing:
+            raise TransferError(f"{label} rows refer to {target} ids that were never imported: {sorted(missing)[:10]}")
+        for row in rows:
+            if row.get(field.attname) is not None:
+                row[field.attname] = mapping[row[field.attname]]
+
+    old_pks = [row.pop(pk_name) for row in rows]
+    objs = [
+        model(**{attname: fields[attname].to_python(value) for attname, value in row.items() if attname in fields})
+        for row in rows
+    ]
+
+    existing = {}
+    natural_key = NATURAL_KEYS.get(model)
+    if natural_key:
+        key = model._meta.get_field(natural_key).attname
+        keys = [getattr(obj, key) for obj in objs]
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            existing.update(
+                model._default_manager.filter(**{f'{key}__in': keys[start:start + LOOKUP_CHUNK]}).values_list(key, 'pk')
+            )
+        new_objs = [obj for obj in objs if getattr(obj, key) not in existing]
+    else:
+        new_objs = objs
+
+    is_through = model._meta.auto_created
+    with transaction.atomic():
+        # Link rows are referenced by nothing, so they skip the id map; a repeat is simply ignored
+        model._default_manager.bulk_create(new_objs, ignore_conflicts=is_through)
+
+    if is_through:
+        pairs = []
+    elif natural_key:
+        pairs = [(old, existing.get(getattr(obj, key), obj.pk)) for old, obj in zip(old_pks, objs)]
+    else:
+        pairs = list(zip(old_pks, (obj.pk for obj in objs)))
+    state.commit_batch(label, pairs, name, lines)
+    return len(new_objs)
@@ -1,16 +1,38 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Under ASGI (ASYNC_VIEWS) the I/O-bound pages are served by coroutines
+io_views = async_views if settings.ASYNC_VIEWS else views
 
 app_name = 'main'
 
 urlpatterns = [
     # Public pages
     path('', views.home, name='home'),
-    path('contact/', views.contact, name='contact'),
+    path('contact/', io_views.contact, name='contact'),
     path('projects/', views.projects, name='projects'),
     path('mentors/', views.mentor_list, name='mentor'),
+    path('search/', views.search, name='search'),
     path('skills/', views.skill_gap_analyser, name='skills'),
-    path('payment/', views.MpesaPayment, name='payment'),
+    path('skills/report/', views.skill_gap_report, name='skill_gap_report'),
+    path('payment/', io_views.MpesaPayment, name='payment'),
+    path('payment/<uuid:reference>/status/', io_views.payment_status, name='payment_status'),
+    path('payment/callback/', views.mpesa_callback, name='mpesa_callback'),
+    path('payment/callback/<str:token>/', views.mpesa_callback, name='mpesa_callback'),
+
+    # Read-only JSON API
+    path('api/v1/projects/', views.api_list, {'resource': 'projects'}, name='api_projects'),
+    path('api/v1/mentors/', views.api_list, {'resource': 'mentors'}, name='api_mentors'),
+    path('api/v1/freelancers/', views.api_list, {'resource': 'freelancers'}, name='api_freelancers'),
+    path('api/v1/organizations/', views.api_list, {'resource': 'organizations'}, name='api_organizations'),
+
+    # Profile pictures, with long cache headers (MEDIA_URL/AVATAR_DIR)
+    path(f'{settings.MEDIA_URL.strip("/")}/{settings.AVATAR_DIR}/<path:name>', views.avatar_file, name='avatar_file'),
+
+    # Request profiles (staff only)
+    path('profiles/', views.profile_list, name='profiles'),
+    path('profiles/<str:filename>', views.profile_download, name='profile_download'),
     
     # Authentication
     path('register/', views.registerUser, name='register'),
@@ -18,7 +40,7 @@ urlpatterns = [
     path('logout/', views.logoutUser, name='logout'),
     
     # Dashboard (One dynamic dashboard for all users)
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', io_views.dashboard, name='dashboard'),
     
     # Profile CRUD
     path('profile/edit/', views.editProfile, name='editProfile'),
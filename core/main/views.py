@@ -1,18 +1,42 @@
+import json
+import os
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import FileResponse, Http404, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+from django.views.static import serve
+from django.urls import reverse
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from .forms import RegisterForm, ProjectForm, ProfileEditForm
+from .forms import MentorFilterForm, RegisterForm, ProjectForm, ProfileEditForm
 from .models import StudentProfile, Project, Mentor, Freelancer, Organization
 from django.contrib.auth.models import User
-from .models import UserProfile
-from django_daraja.mpesa.core import MpesaClient
-
-
+from .models import UserProfile, SearchDocument, PaymentRequest
+from . import api
+from .caching import cache_public_page
+from .mentors import MENTOR_ORDERING, filter_mentors, get_mentor_facets, mentor_json
+from .pagination import paginate_keyset
+from .profiling import capture_path, recent_captures
+from .ratelimit import rate_limit
+from .recommendations import group_by_kind
+from .registration import register
+from .payments import parse_callback, queue_payment, read_payment_form, result_writer
+from .search import PAGE_SIZE as SEARCH_PAGE_SIZE, search as search_index
+from .stats import get_dashboard_stats
+from .skills import ROLE_SKILLS, SkillGapMatrix, analyse_skills, get_skill_gap_summary, with_skill
+
+
+@cache_public_page
 def home(request):
     return render(request, 'main/home.html')
 
+@rate_limit('register')
 def registerUser(request):
     if request.method == 'POST':
         form = RegisterForm(request.POST)
@@ -20,78 +44,15 @@ def registerUser(request):
         
         if form.is_valid():
             try:
-                # 1. Creates the User (Username, Email, Password)
-                user = form.save(commit=False)
-                user.save()
-                
-                # 2. Creates the UserProfile (Role + Phone)
-                phone = form.cleaned_data.get('phone', '')
-                UserProfile.objects.create(
-                    user=user,
-                    role=user_type,
-                    phone=phone
-                )
-                
-                email = form.cleaned_data['email']
-                
-                # 3. Creates the Specific Profile based on Role
-                if user_type == 'student':
-                    StudentProfile.objects.create(
-                        user=user,
-                        institution=form.cleaned_data.get('institution', ''),
-                        course=form.cleaned_data.get('course', ''),
-                        year_of_study=form.cleaned_data.get('year_of_study', 1),
-                        email=email,
-                        bio='',
-                        skills=''
-                    )
-                
-                elif user_type == 'mentor':
-                    Mentor.objects.create(
-                        user=user,
-                        full_name=f"{user.first_name} {user.last_name}",
-                        job_title=form.cleaned_data.get('job_title', ''),
-                        company=form.cleaned_data.get('company', ''),
-                        linkedin=form.cleaned_data.get('linkedin', ''),
-                        expertise_area=form.cleaned_data.get('expertise_area', 'technology'),
-                        years_of_experience=form.cleaned_data.get('years_of_experience', 0),
-                        availability='Available',
-                        bio='Mentor profile',
-                        email=email
-                    )
-                
-                elif user_type == 'freelancer':
-                    Freelancer.objects.create(
-                        user=user,
-                        full_name=f"{user.first_name} {user.last_name}",
-                        profession=form.cleaned_data.get('profession', ''),
-                        specialization=form.cleaned_data.get('specialization', ''),
-                        years_of_experience=form.cleaned_data.get('years_of_experience', 0),
-                        email=email,
-                        bio='Freelancer profile'
-                    )
-                
-                elif user_type == 'organization':
-                    Organization.objects.create(
-                        user=user,
-                        organization_name=form.cleaned_data.get('organization_name'),
-                        organization_type=form.cleaned_data.get('organization_type', ''),
-                        industry=form.cleaned_data.get('industry', ''),
-                        website=form.cleaned_data.get('website', ''),
-                        email=email,
-                        bio='Organization profile'
-                    )
-                
-                # 4. Logs them in and redirects
-                login(request, user, backend='django.contrib.auth.backends.ModelBackend')
-                messages.success(request, f'Welcome {user.first_name}! Account created.')
-                return redirect('main:dashboard')
-                
+                # User, UserProfile and role profile, all or nothing
+                user = register(form, user_type)
             except Exception as e:
-                user.delete()
-                print(f"Error: {e}")
                 messages.error(request, f"Registration failed: {str(e)}")
                 return render(request, 'main/register.html', {'form': form})
+
+            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+            messages.success(request, f'Welcome {user.first_name}! Account created.')
+            return redirect('main:dashboard')
         
         else:
             messages.error(request, 'Please correct the errors below.')
@@ -103,17 +64,13 @@ def registerUser(request):
     return render(request, 'main/register.html', {'form': form})
 
 
+@rate_limit('login')
 def loginUser(request):
     if request.method == 'POST':
         username = request.POST.get('username')
         password = request.POST.get('password')
 
-        try:
-            check_user = User.objects.get(username=username)
-        except User.DoesNotExist:
-            messages.error(request, "User does not exist!")
-            return render(request, 'main/login.html')
-        
+        # authenticate() looks the user up itself (and hashes even when there is none)
         user = authenticate(request, username=username, password=password)
 
         if user is not None:
@@ -135,93 +92,68 @@ def logoutUser(request):
 def dashboard(request):
     # --- CHECKS IF USER IS ADMIN ---
     if request.user.is_staff or request.user.is_superuser:
-        # 1. Gathers Counts
-        context = {
-            'total_users': User.objects.count(),
-            'total_students': StudentProfile.objects.count(),
-            'total_mentors': Mentor.objects.count(),
-            'total_freelancers': Freelancer.objects.count(),
-            'total_organizations': Organization.objects.count(),
-            'total_projects': Project.objects.count(),
-            
+        # 1. Gathers Counts (one query, cached between saves)
+        context = dict(get_dashboard_stats())
+        context.update({
             # 2. Recent Activity - Who logged in recently?
             # Filter for users who have a last_login date set
             'recent_logins': User.objects.filter(last_login__isnull=False).order_by('-last_login')[:5],
             
             # 3. Recent Activity - Who added a project?
             'recent_projects': Project.objects.select_related('student__user').order_by('-created_at')[:5],
-        }
+        })
         # RenderS the dedicated Admin Dashboard template
         return render(request, 'main/admin_dashboard.html', context)
 
     # --- LOGIC FOR NORMAL USERS (Students, Mentors, freelancers.) ---
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
-        user_role = user_profile.role
-    except UserProfile.DoesNotExist:
-        user_role = 'student'
-    
+    # Resolved once per session by main.roles
+    user_role = request.role_profile.role or 'student'
+    profile = request.role_profile.profile
     context = {'user_role': user_role}
 
-    if user_role == 'student':
-        try:
-            student = StudentProfile.objects.get(user=request.user)
-            projects = student.projects.all()
-            skills_list = [s.strip() for s in student.skills.split(',') if s.strip()]
-            context.update({
-                'student': student,
-                'projects': projects,
-                'skills': skills_list,
-                'project_count': projects.count(),
-                'completed_projects': projects.filter(status='completed').count(),
-            })
-        except StudentProfile.DoesNotExist:
-            pass
-            
-    elif user_role == 'mentor':
-        try:
-            mentor = Mentor.objects.get(user=request.user)
-            context.update({
-                'mentor': mentor,
-                'total_students': StudentProfile.objects.count(),
-                'total_projects': Project.objects.count(),
-            })
-        except Mentor.DoesNotExist:
-            pass
-
-    elif user_role in ['freelancer', 'organization']:
-        try:
-            profile = StudentProfile.objects.get(user=request.user) 
-            context.update({
-                'available_projects': Project.objects.all()[:10],
-                'total_students': StudentProfile.objects.count(),
-            })
-        except StudentProfile.DoesNotExist:
-            pass
+    if user_role == 'student' and profile:
+        student = profile
+        context.update({
+            'student': student,
+            'projects': student.projects.all(),
+            'skills': list(student.skill_tags.values_list('name', flat=True)),
+            'project_count': student.project_count,
+            'completed_projects': student.completed_project_count,
+            # Precomputed by main.recommendations; one indexed read
+            'recommendations': group_by_kind(student.recommendations.all()),
+        })
+
+    elif user_role == 'mentor' and profile:
+        context.update({
+            'mentor': profile,
+            'total_students': StudentProfile.objects.count(),
+            'total_projects': Project.objects.count(),
+        })
+
+    elif user_role in ['freelancer', 'organization'] and profile:
+        context.update({
+            'profile': profile,
+            # The list shows each project's student, so join them in
+            'available_projects': Project.objects.select_related('student__user')[:10],
+            'total_students': StudentProfile.objects.count(),
+        })
 
     return render(request, 'main/dashboard.html', context)
 
 
 @login_required
 def add_project(request):
-    user = request.user
-    
     if request.method == 'POST':
         form = ProjectForm(request.POST)
         if form.is_valid():
             project = form.save(commit=False)
             
-            # ATTACHES TO CORRECT PROFILE
+            # ATTACHES TO CORRECT PROFILE (only its id is needed, so the row is never read)
+            # Admins can also post, but won't be linked to a profile field
             try:
-                if hasattr(user, 'student_profile'):
-                    project.student = user.student_profile
-                elif hasattr(user, 'freelancer_profile'):
-                    project.freelancer = user.freelancer_profile
-                elif hasattr(user, 'organization_profile'):
-                    project.organization = user.organization_profile
-                elif user.is_staff:
-                    # Admins can also post, but won't be linked to a profile field
-                    pass 
+                role_profile = request.role_profile
+                if role_profile.role in ('student', 'freelancer', 'organization') and role_profile.profile_id:
+                    setattr(project, f'{role_profile.role}_id', role_profile.profile_id)
                 
                 project.save()
                 messages.success(request, 'Project created successfully!')
@@ -239,15 +171,15 @@ def add_project(request):
 @login_required
 def view_project(request, project_id):
     """READ operation for single project"""
-    project = get_object_or_404(Project, id=project_id)
+    project = get_object_or_404(Project.objects.select_related('student__user'), id=project_id)
     return render(request, 'projects/view_project.html', {'project': project})
 
 @login_required
 def edit_project(request, project_id):
-    project = get_object_or_404(Project, id=project_id)
+    project = get_object_or_404(Project.objects.select_related('student'), id=project_id)
     
     # Check if user owns this project
-    if project.student.user != request.user:
+    if project.student.user_id != request.user.id:
         messages.error(request, 'You can only edit your own projects!')
         return redirect('main:dashboard')
     
@@ -265,10 +197,10 @@ def edit_project(request, project_id):
 
 @login_required
 def delete_project(request, project_id):
-    project = get_object_or_404(Project, id=project_id)
+    project = get_object_or_404(Project.objects.select_related('student'), id=project_id)
     
     # Checks if user owns this project
-    if project.student.user != request.user:
+    if project.student.user_id != request.user.id:
         messages.error(request, 'You can only delete your own projects!')
         return redirect('main:dashboard')
     
@@ -289,65 +221,72 @@ from .forms import (
 
 @login_required
 def editProfile(request):
-    try:
-        user_profile = request.user.profile
-        role = user_profile.role
-    except Exception:
+    role = request.role_profile.role
+    if request.role_profile.user_profile_id is None:
         if request.user.is_staff:
             messages.info(request, "Admin settings are in the Admin Panel.")
         else:
             messages.error(request, "User profile data is missing.")
         return redirect('main:dashboard')
 
-    profile_instance = None
+    # Found by main.roles; created here if the user never had one
+    profile_instance = request.role_profile.profile
     FormClass = None
     template_name = 'main/editProfile.html'
 
     if role == 'student':
-        profile_instance, created = StudentProfile.objects.get_or_create(
-            user=request.user,
-            defaults={
-                'year_of_study': 1,
-                'email': request.user.email
-            }
-        )
+        if profile_instance is None:
+            profile_instance, created = StudentProfile.objects.get_or_create(
+                user=request.user,
+                defaults={
+                    'year_of_study': 1,
+                    'email': request.user.email
+                }
+            )
         FormClass = ProfileEditForm
 
     elif role == 'mentor':
-        profile_instance, created = Mentor.objects.get_or_create(
-            user=request.user,
-            defaults={
-                'full_name': f"{request.user.first_name} {request.user.last_name}",
-                'email': request.user.email,
-                'expertise_area': 'technology', 
-                'years_of_experience': 0,       
-                'availability': 'Available'
-            }
-        )
+        if profile_instance is None:
+            profile_instance, created = Mentor.objects.get_or_create(
+                user=request.user,
+                defaults={
+                    'full_name': f"{request.user.first_name} {request.user.last_name}",
+                    'email': request.user.email,
+                    'expertise_area': 'technology', 
+                    'years_of_experience': 0,       
+                    'availability': 'Available'
+                }
+            )
         FormClass = MentorProfileEditForm
 
     elif role == 'freelancer':
-        profile_instance, created = Freelancer.objects.get_or_create(
-            user=request.user,
-            defaults={
-                'full_name': f"{request.user.first_name} {request.user.last_name}",
-                'email': request.user.email,
-                'years_of_experience': 0
-            }
-        )
+        if profile_instance is None:
+            profile_instance, created = Freelancer.objects.get_or_create(
+                user=request.user,
+                defaults={
+                    'full_name': f"{request.user.first_name} {request.user.last_name}",
+                    'email': request.user.email,
+                    'years_of_experience': 0
+                }
+            )
         FormClass = FreelancerProfileEditForm
 
     elif role == 'organization':
-        profile_instance, created = Organization.objects.get_or_create(
-            user=request.user,
-            defaults={
-                'organization_name': request.user.username, 
-                'email': request.user.email,
-                'organization_type': 'Startup' 
-            }
-        )
+        if profile_instance is None:
+            profile_instance, created = Organization.objects.get_or_create(
+                user=request.user,
+                defaults={
+                    'organization_name': request.user.username, 
+                    'email': request.user.email,
+                    'organization_type': 'Startup' 
+                }
+            )
         FormClass = OrganizationProfileEditForm
 
+    # The forms read profile_instance.user.profile; reuse the user and UserProfile already loaded
+    profile_instance.user = request.user
+    request.user.profile = request.role_profile.user_profile
+
     # 4. Handles the Form Logic
     if request.method == 'POST':
         form = FormClass(request.POST, request.FILES, instance=profile_instance)
@@ -363,61 +302,166 @@ def editProfile(request):
     return render(request, template_name, {'form': form, 'user_role': role})
 
 
+@cache_public_page
 def projects(request):
-    all_projects = Project.objects.all().order_by('-created_at')
-    is_mentor = request.user.is_authenticated and hasattr(request.user, 'mentor')
-    
+    # Only the columns the project cards render, with owners joined in the same query
+    feed = Project.objects.select_related(
+        'student__user__profile', 'freelancer__user__profile', 'organization'
+    ).prefetch_related('skill_tags').only(
+        'id', 'title', 'description', 'status', 'created_at', 'updated_at',
+        'student__id', 'student__user__id', 'student__user__username',
+        'student__user__profile__id', 'student__user__profile__avatar_thumbnails',
+        'freelancer__id', 'freelancer__user__id', 'freelancer__user__username',
+        'freelancer__user__profile__id', 'freelancer__user__profile__avatar_thumbnails',
+        'organization__id', 'organization__organization_name',
+    )
+    skill = request.GET.get('skill', '').strip()
+    if skill:
+        feed = with_skill(feed, skill)
+    page = paginate_keyset(feed, ('-created_at', '-id'), request.GET.get('cursor'))
+    is_mentor = request.role_profile.role == 'mentor'
+
     return render(request, 'main/projects.html', {
-        'projects': all_projects,
+        'projects': page.object_list,
+        'page': page,
+        'skill': skill,
         'is_mentor': is_mentor
     })
 
 
+@cache_public_page
 def mentor_list(request):
-    all_mentors = Mentor.objects.all()
-    return render(request, 'main/mentor.html', {'mentors': all_mentors})
+    """The mentor directory, one page at a time in name order. ?format=json returns the page as JSON."""
+    facets = get_mentor_facets()
+    form = MentorFilterForm(request.GET, facets=facets)
+    # Invalid filters are dropped from cleaned_data, so the valid ones still apply
+    form.is_valid()
+    # The cards read mentor.user.profile; join both in instead of two queries per mentor
+    mentors = filter_mentors(Mentor.objects.select_related('user__profile'), form.cleaned_data)
+    page = paginate_keyset(mentors, MENTOR_ORDERING, request.GET.get('cursor'))
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [mentor_json(mentor) for mentor in page],
+            'next_cursor': page.next_cursor,
+            'facets': facets,
+            'errors': form.errors,
+        })
+    return render(request, 'main/mentor.html', {
+        'mentors': page.object_list,
+        'page': page,
+        'form': form,
+        'total': facets['total'],
+    })
+
+
+@cache_public_page
+def search(request):
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type', '')
+    category = request.GET.get('category', '')
+    if kind not in dict(SearchDocument.KIND_CHOICES):
+        kind = ''
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    # Fetches one extra result to know whether there is a next page
+    results = search_index(query, kind=kind, category=category,
+                           limit=SEARCH_PAGE_SIZE + 1, offset=(page - 1) * SEARCH_PAGE_SIZE)
+    has_next = len(results) > SEARCH_PAGE_SIZE
+    results = results[:SEARCH_PAGE_SIZE]
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'query': query,
+            'page': page,
+            'has_next': has_next,
+            'results': [
+                {'type': d.kind, 'id': d.object_id, 'title': d.title, 'category': d.category}
+                for d in results
+            ],
+        })
+
+    return render(request, 'main/search.html', {
+        'query': query,
+        'kind': kind,
+        'category': category,
+        'results': results,
+        'page': page,
+        'has_next': has_next,
+        'kinds': SearchDocument.KIND_CHOICES,
+        'categories': Project.STATUS_CHOICES + Mentor.EXPERTISE_CHOICES,
+    })
 
 
 @login_required(login_url='main:login')
 def skill_gap_analyser(request):
     results = None
     
-    role_skills = {
-        'Full Stack Developer': ['Python', 'Django', 'JavaScript', 'React', 'SQL', 'Git', 'HTML/CSS'],
-        'Data Analyst': ['Python', 'SQL', 'Excel', 'Data Visualization'],
-        'UI/UX Designer': ['Figma', 'Adobe XD', 'User Research', 'HTML/CSS'],
-        'Mobile Developer': ['Java', 'Kotlin', 'API Integration'],
-        'DevOps Engineer': ['Linux', 'Docker', 'Kubernetes', 'AWS', 'CI/CD', 'Python', 'Git'],
-        'Finance' : ['Financial modelling', 'Accounting principles', 'Risk management', 'Proficiency in Tech'],
-        'AI/ML Engineer': ['Python', 'Tensorflow', 'PyTorch', 'Math', 'Statistics', 'Data Engineering', 'MLOps', 'Neural Networks'],
-
-    }
-    
     if request.method == 'POST':
         target_role = request.POST.get('target_role')
         user_skills_input = request.POST.get('user_skills', '')
         user_skills = [skill.strip() for skill in user_skills_input.split(',') if skill.strip()]
         
-        if target_role in role_skills:
-            required_skills = role_skills[target_role]
-            user_skills_lower = [skill.lower() for skill in user_skills]
-            
-            matching_skills = [s for s in required_skills if s.lower() in user_skills_lower]
-            missing_skills = [s for s in required_skills if s.lower() not in user_skills_lower]
-            
-            results = {
-                'target_role': target_role,
-                'matching_skills': matching_skills,
-                'missing_skills': missing_skills,
-                'progress_percentage': int((len(matching_skills) / len(required_skills)) * 100),
-            }
+        if target_role in ROLE_SKILLS:
+            results = analyse_skills(user_skills, target_role)
     
     return render(request, 'main/skill.html', {
-        'roles': role_skills.keys(),
+        'roles': ROLE_SKILLS.keys(),
         'results': results
     })
 
 
+@staff_member_required
+def skill_gap_report(request):
+    """Cohort skill gap report as JSON: a per-role summary and one page of per-student results."""
+    try:
+        after = int(request.GET.get('after', 0))
+        limit = int(request.GET.get('limit', 500))
+    except ValueError:
+        return JsonResponse({'error': 'after and limit must be integers'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'limit must be at least 1'}, status=400)
+    limit = min(limit, 5000)
+
+    page = list(
+        StudentProfile.objects.filter(id__gt=after).order_by('id').values_list('id', 'user__username')[:limit + 1]
+    )
+    has_next = len(page) > limit
+    page = page[:limit]
+    page_ids = [student_id for student_id, _ in page]
+    usernames = dict(page)
+    # Only this page's masks; the cohort summary comes from the cache
+    matrix = SkillGapMatrix()
+    masks = matrix.student_masks(StudentProfile.objects.filter(id__in=page_ids))
+
+    students = []
+    for student_id in page_ids:
+        scores = matrix.score(masks[student_id])
+        students.append({
+            'student_id': student_id,
+            'username': usernames.get(student_id),
+            'roles': {
+                role: {
+                    'progress_percentage': result['progress_percentage'],
+                    'matching_skills': result['matching_skills'],
+                    'missing_skills': result['missing_skills'],
+                }
+                for role, result in scores.items()
+            },
+        })
+
+    return JsonResponse({
+        'summary': get_skill_gap_summary(),
+        'students': students,
+        'next_after': page_ids[-1] if has_next else None,
+    })
+
+
+# Not cached: the form's CSRF token must match each visitor's own cookie
+@rate_limit('contact')
 def contact(request):
     if request.method == 'POST':
         name = request.POST.get('name')
@@ -427,43 +471,108 @@ def contact(request):
     return render(request, 'main/contact.html')
 
 
+@rate_limit('payment')
 def MpesaPayment(request):
-    mentors = Mentor.objects.all()
+    # Only what the mentor menu shows
+    mentors = Mentor.objects.only('id', 'full_name', 'hourly_rate')
     
     if request.method == 'POST':
-        payment_type = request.POST.get('payment_type')
-        amount = int(float(request.POST.get('amount')))
-        phone_number = request.POST.get('phone_number')
-        phone_number = request.POST.get('phone_number')
-        if phone_number.startswith('0'):
-            phone_number = '+254' + phone_number[1:]
-        elif phone_number.startswith('+254'):
-            phone_number = phone_number[1:]
-
-        cl = MpesaClient()
-        account_reference = 'IndustryLink'
-        callback_url = 'https://api.darajambili.com/express-payment'
-        
+        form = read_payment_form(request.POST)
+        if form is None:
+            messages.error(request, 'Please choose a payment type and enter a valid amount and phone number.')
+            return redirect('main:payment')
+        payment_type, phone_number, amount = form
+
+        mentor = None
         if payment_type == 'mentor_session':
-            mentor_id = request.POST.get('mentor_id')
             try:
-                mentor = Mentor.objects.get(id=mentor_id)
-                transaction_desc = f'Mentorship with {mentor.full_name}'
-                response = cl.stk_push(phone_number, amount, account_reference, transaction_desc, callback_url)
-                messages.success(request, f'Payment initiated! Check your phone.')
-            except Mentor.DoesNotExist:
+                mentor = Mentor.objects.get(id=request.POST.get('mentor_id'))
+            except (Mentor.DoesNotExist, ValueError):
                 messages.error(request, 'Mentor not found.')
-        
+                return redirect('main:payment')
+            transaction_desc = f'Mentorship with {mentor.full_name}'
         elif payment_type == 'tip_student':
             transaction_desc = 'Student Tip'
-            response = cl.stk_push(phone_number, amount, account_reference, transaction_desc, callback_url)
-            messages.success(request, f'Tip sent!')
-        
-        elif payment_type == 'donation':
+        else:
             transaction_desc = 'Donation'
-            response = cl.stk_push(phone_number, amount, account_reference, transaction_desc, callback_url)
-            messages.success(request, 'Thank you for donating!')
-        
-        return redirect('main:payment')
+
+        # The STK push itself is sent by a background worker; the page polls payment_status
+        payment = queue_payment(
+            user=request.user if request.user.is_authenticated else None,
+            mentor=mentor,
+            payment_type=payment_type,
+            phone_number=phone_number,
+            amount=amount,
+            description=transaction_desc[:100],
+        )
+        messages.success(request, 'Payment initiated! Check your phone.')
+        return redirect(f"{reverse('main:payment')}?ref={payment.reference}")
     
-    return render(request, 'main/payment.html', {'mentors': mentors})
\ No newline at end of file
+    return render(request, 'main/payment.html', {
+        'mentors': mentors,
+        'payment_ref': request.GET.get('ref', ''),
+    })
+
+
+def payment_status(request, reference):
+    """Polled by the payment page while a queued STK push is being sent."""
+    payment = get_object_or_404(PaymentRequest, reference=reference)
+    return JsonResponse({
+        'reference': str(payment.reference),
+        'status': payment.status,
+        'status_display': payment.get_status_display(),
+        'message': payment.response_description or payment.last_error,
+    })
+
+
+@csrf_exempt
+@require_POST
+def mpesa_callback(request, token=''):
+    """
+    Where Daraja posts STK push results (MPESA_CALLBACK_URL).
+
+    Results are handed to the buffered writer and acknowledged straight
+    away; duplicates are dropped when the batch is written. Posts without
+    the MPESA_CALLBACK_TOKEN path segment are refused, and with no token
+    configured every callback is, unless DEBUG is on.
+    """
+    expected = getattr(settings, 'MPESA_CALLBACK_TOKEN', '')
+    if not expected and not settings.DEBUG:
+        raise Http404
+    if expected and not constant_time_compare(token, expected):
+        raise Http404
+    try:
+        result = parse_callback(json.loads(request.body))
+    except ValueError:
+        return JsonResponse({'ResultCode': 1, 'ResultDesc': 'Rejected'}, status=400)
+    result_writer.add(result)
+    return JsonResponse({'ResultCode': 0, 'ResultDesc': 'Accepted'})
+
+
+@staff_member_required
+def profile_list(request):
+    """Recent request profiles captured with ?profile=1, newest first."""
+    return render(request, 'main/profiles.html', {'captures': recent_captures()})
+
+
+@staff_member_required
+def profile_download(request, filename):
+    path = capture_path(filename)
+    if path is None:
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+
+
+@require_safe
+def avatar_file(request, name):
+    """A profile picture or one of its thumbnails (see main.avatars)."""
+    response = serve(request, name, document_root=os.path.join(settings.MEDIA_ROOT, settings.AVATAR_DIR))
+    # Names are content hashes: a URL's bytes never change, so browsers and proxies can keep them
+    patch_cache_control(response, public=True, max_age=settings.AVATAR_CACHE_SECONDS, immutable=True)
+    return response
+
+
+@require_safe
+def api_list(request, resource):
+    """Read-only JSON API: one page of projects, mentors, freelancers or organizations (see main.api)."""
+    return api.list_resource(request, resource)